@@ -0,0 +1,274 @@
+"""
+HUST Solar Car Alert Engine
+===========================
+Server-side evaluation of the BWSC alert rules.
+
+Rules are loaded from ALERT_RULES_FILE (JSON) and reloaded when the file
+changes, so thresholds can be tuned without rebuilding the frontend. Each new
+telemetry row is evaluated incrementally with hysteresis and debounce, and
+`alert_raised` / `alert_cleared` are emitted only on state changes. Every
+transition is recorded in the alert history table. A rule that disappears from
+the file while raised (removed or renamed) is cleared on the next evaluation,
+so clients and the history never keep an alert no rule can clear.
+"""
+
+import json
+import logging
+import operator
+import os
+import time
+from datetime import datetime
+from threading import Lock
+from backend.helpers import get_db_connection
+from backend.db_executor import run_in_lane, LaneBusy, INTERACTIVE
+from backend.config import ALERT_RULES_FILE
+
+logger = logging.getLogger(__name__)
+
+ALERT_HISTORY_TABLE = 'alert_history'
+
+# How often (seconds) the rules file is checked for changes
+RULES_RELOAD_CHECK_SECONDS = 10
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+
+class AlertRule:
+    """A threshold rule with hysteresis and debounce state"""
+
+    def __init__(self, spec, defaults):
+        self.id = spec['id']
+        self.table = spec['table']
+        self.field = spec['field']
+        self.op = spec['op']
+        self.compare = OPERATORS[self.op]
+        self.threshold = float(spec['threshold'])
+        self.hysteresis = float(spec.get('hysteresis', defaults.get('hysteresis', 0)))
+        self.debounce = int(spec.get('debounce_samples', defaults.get('debounce_samples', 1)))
+        self.use_abs = bool(spec.get('abs', False))
+        self.severity = spec.get('severity', 'warning')
+        self.icon = spec.get('icon', '⚠️')
+        self.message = spec.get('message', self.id)
+        self.group = spec.get('group', self.id)
+
+        self.active = False
+        self.streak = 0
+        self.value = None
+        self.since = None
+
+    def _clear_threshold(self):
+        # Clear only once the value is back past the threshold by the hysteresis band
+        if self.op in ('>', '>='):
+            return self.threshold - self.hysteresis
+        return self.threshold + self.hysteresis
+
+    def evaluate(self, value):
+        """
+        Feed one sample; return 'raised', 'cleared' or None
+
+        The state flips only after `debounce` consecutive samples agree.
+        """
+        if self.use_abs:
+            value = abs(value)
+        self.value = value
+
+        if self.active:
+            clear_at = self._clear_threshold()
+            wants_change = value < clear_at if self.op in ('>', '>=') else value > clear_at
+        else:
+            wants_change = self.compare(value, self.threshold)
+
+        if not wants_change:
+            self.streak = 0
+            return None
+
+        self.streak += 1
+        if self.streak < self.debounce:
+            return None
+
+        self.streak = 0
+        self.active = not self.active
+        self.since = datetime.now()
+        return 'raised' if self.active else 'cleared'
+
+    def to_alert(self):
+        value = round(self.value, 2) if self.value is not None else None
+        try:
+            message = self.message.format(value=value)
+        except (KeyError, IndexError, ValueError):
+            message = self.message
+        return {
+            'id': self.id,
+            'group': self.group,
+            'severity': self.severity,
+            'icon': self.icon,
+            'message': message,
+            'value': value,
+            'since': self.since.isoformat() if self.since else None
+        }
+
+
+class AlertEngine:
+    """Evaluates alert rules over new telemetry rows and emits transitions"""
+
+    def __init__(self, rules_file=ALERT_RULES_FILE):
+        self.rules_file = rules_file
+        self.rules = []
+        self.rules_mtime = None
+        self.last_reload_check = 0
+        self.last_ids = {}
+        self.lock = Lock()
+        self.history_ready = False
+        # 'cleared' transitions of raised rules dropped by a reload, emitted by ingest
+        self.retired = []
+        self.load_rules()
+
+    def load_rules(self):
+        """(Re)load rules from the JSON file, keeping state of rules that still exist"""
+        try:
+            mtime = os.path.getmtime(self.rules_file)
+            with open(self.rules_file, encoding='utf-8') as f:
+                config = json.load(f)
+
+            defaults = config.get('defaults', {})
+            previous = {rule.id: rule for rule in self.rules}
+            rules = []
+            for spec in config.get('rules', []):
+                rule = AlertRule(spec, defaults)
+                old = previous.get(rule.id)
+                if old is not None:
+                    rule.active, rule.value, rule.since = old.active, old.value, old.since
+                rules.append(rule)
+
+            kept = {rule.id for rule in rules}
+            with self.lock:
+                for old in previous.values():
+                    if old.active and old.id not in kept:
+                        old.active = False
+                        old.since = datetime.now()
+                        self.retired.append(('cleared', old.to_alert()))
+                self.rules = rules
+                self.rules_mtime = mtime
+            logger.info(f"Loaded {len(rules)} alert rules from {self.rules_file}")
+        except Exception as e:
+            logger.error(f"Failed to load alert rules from {self.rules_file}: {e}")
+
+    def _reload_if_changed(self):
+        now = time.time()
+        if now - self.last_reload_check < RULES_RELOAD_CHECK_SECONDS:
+            return
+        self.last_reload_check = now
+        try:
+            if os.path.getmtime(self.rules_file) != self.rules_mtime:
+                self.load_rules()
+        except OSError:
+            pass
+
+    def ingest(self, new_by_table, socketio=None):
+        """
+        Evaluate rules over new rows and emit transitions
+
+        Args:
+            new_by_table (dict): {payload key: rows oldest first}
+            socketio: SocketIO instance to emit alert_raised/alert_cleared on
+        """
+        self._reload_if_changed()
+        with self.lock:
+            transitions, self.retired = self.retired, []
+
+        try:
+            with self.lock:
+                for key, rows in new_by_table.items():
+                    table_rules = [rule for rule in self.rules if rule.table == key]
+                    last_id = self.last_ids.get(key)
+                    for row in rows:
+                        if last_id is not None and row['id'] <= last_id:
+                            continue
+                        last_id = row['id']
+                        for rule in table_rules:
+                            value = row.get(rule.field)
+                            if value is None:
+                                continue
+                            event = rule.evaluate(float(value))
+                            if event:
+                                transitions.append((event, rule.to_alert()))
+                    self.last_ids[key] = last_id
+        except Exception as e:
+            logger.error(f"Alert evaluation failed: {e}")
+
+        for event, alert in transitions:
+            logger.info(f"Alert {event}: {alert['id']} ({alert['message']})")
+            if socketio is not None:
+                socketio.emit(f"alert_{event}", alert)
+        if transitions:
+            try:
+                run_in_lane(INTERACTIVE, self._record_history, transitions)
+            except LaneBusy as e:
+                logger.warning(f"Alert history not recorded: {e}")
+
+    def active_alerts(self):
+        with self.lock:
+            return [rule.to_alert() for rule in self.rules if rule.active]
+
+    def _ensure_history_table(self, cursor):
+        if self.history_ready:
+            return
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{ALERT_HISTORY_TABLE}` (
+                id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                rule_id VARCHAR(64) NOT NULL,
+                event VARCHAR(16) NOT NULL,
+                severity VARCHAR(16) NOT NULL,
+                value DOUBLE NULL,
+                message VARCHAR(255) NOT NULL,
+                created_at DATETIME NOT NULL,
+                INDEX idx_created_at (created_at)
+            )
+        """)
+        self.history_ready = True
+
+    def _record_history(self, transitions):
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._ensure_history_table(cursor)
+                    cursor.executemany(
+                        f"INSERT INTO `{ALERT_HISTORY_TABLE}` "
+                        f"(rule_id, event, severity, value, message, created_at) VALUES (%s, %s, %s, %s, %s, %s)",
+                        [(alert['id'], event, alert['severity'], alert['value'], alert['message'][:255], datetime.now())
+                         for event, alert in transitions]
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to record alert history: {e}")
+
+    def get_history(self, limit=100):
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._ensure_history_table(cursor)
+                    cursor.execute(f"""
+                        SELECT id, rule_id, event, severity, value, message, created_at
+                        FROM `{ALERT_HISTORY_TABLE}` ORDER BY id DESC LIMIT %s
+                    """, (limit,))
+                    rows = cursor.fetchall()
+            for row in rows:
+                row['created_at'] = row['created_at'].isoformat()
+            return rows
+        except LaneBusy:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to read alert history: {e}")
+            return []
+
+
+# Global instance fed by the background fetcher
+alert_engine = AlertEngine()
+
+def get_active_alerts():
+    """Get currently raised alerts"""
+    return alert_engine.active_alerts()
+
+def get_alert_history(limit=100):
+    """Get the most recent alert transitions"""
+    return alert_engine.get_history(limit=limit)
@@ -6,10 +6,18 @@ import atexit
 from backend.routes import main, routes
 from backend.tasks import background_data_fetcher, thread_stop_event
 from backend.socket_events import register_socketio_events
-from backend.config import SECRET_KEY, FLASK_ENV, ENABLE_AUTO_CLEANUP
-from backend.helpers import initialize_connection_pool
+from backend.config import SECRET_KEY, FLASK_ENV, ENABLE_AUTO_CLEANUP, SOCKETIO_MESSAGE_QUEUE, SERVER_PORT, COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE
+from backend.config import configure_logging, validate_config
+from backend.leader import run_leader_election
+from backend.compression import init_compression
+from backend.static_assets import init_static_assets
+from backend.sessions import run_session_indexer
+from backend.helpers import warm_connection_pool
 from backend.database_cleanup import start_automated_cleanup, stop_automated_cleanup
 
+configure_logging()
+validate_config()
+
 logger = logging.getLogger(__name__)
 
 # Flask + SocketIO setup
@@ -17,20 +25,22 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
 app.register_blueprint(routes)
 app.register_blueprint(main)
-
-# Initialize database connection pool
-try:
-    initialize_connection_pool()
-    logger.info("Application initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize application: {e}")
-    raise
+init_compression(app)
+init_static_assets(app)
 
 #socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet")
+# With a message queue, emits from the polling leader reach clients of every worker
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="eventlet",
+                    message_queue=SOCKETIO_MESSAGE_QUEUE,
+                    http_compression=COMPRESSION_ENABLED,
+                    compression_threshold=COMPRESSION_MIN_SIZE)
 
 register_socketio_events(socketio)
 
+# The pool warms up in the background so the UI is served while MySQL is still coming up
+socketio.start_background_task(warm_connection_pool, socketio, thread_stop_event)
+logger.info("Application initialized, database pool warming up in the background")
+
 def cleanup_on_exit():
     """Cleanup function to run on application exit"""
     logger.info("Application shutting down...")
@@ -49,15 +59,17 @@ atexit.register(cleanup_on_exit)
 if __name__ == "__main__":
     logger.info("Starting HUST Solar Car Dashboard...")
     
-    # 1) Start your real-time fetcher
+    # 1) Start your real-time fetcher (polls only while this worker is the leader)
+    socketio.start_background_task(run_leader_election, socketio, thread_stop_event)
     socketio.start_background_task(background_data_fetcher, socketio)
     logger.info("Background data fetcher started")
+    socketio.start_background_task(run_session_indexer, socketio, thread_stop_event)
     
     # 2) Start automated database cleanup if enabled
     if ENABLE_AUTO_CLEANUP:
         try:
             start_automated_cleanup()
-            logger.info("🤖 Automated database cleanup scheduler started (every 7 days at 3:00 AM)")
+            logger.info("🤖 Automated database cleanup scheduler started (waits for a parked car and quiet ingest)")
         except Exception as e:
             logger.error(f"Failed to start automated cleanup: {e}")
     else:
@@ -66,7 +78,7 @@ if __name__ == "__main__":
     try:
         is_debug = FLASK_ENV == 'development'
         logger.info(f"Starting server in {'debug' if is_debug else 'production'} mode")
-        socketio.run(app, host="0.0.0.0", port=5000, debug=is_debug)
+        socketio.run(app, host="0.0.0.0", port=SERVER_PORT, debug=is_debug)
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     except Exception as e:
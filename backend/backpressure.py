@@ -0,0 +1,175 @@
+"""
+HUST Solar Car Socket.IO Backpressure
+=====================================
+Per-client flow control for the live telemetry stream.
+
+A room broadcast queues every frame for every client, so a tablet on a
+degraded link builds an unbounded outbound queue on the server and receives
+frames long after they are stale. Clients that opt in with `set_flow_control`
+are instead sent `new_data` individually with an acknowledgement callback:
+
+- at most BACKPRESSURE_MAX_IN_FLIGHT frames may be unacknowledged per client
+- while a client is at that depth, newer frames are coalesced into a single
+  pending frame holding the newest state (each `new_data` carries the full
+  recent window per table, so the newest frame supersedes older ones); the
+  superseded frames are dropped and counted
+- the pending frame is sent as soon as an acknowledgement arrives; if frames
+  were dropped for it, it is preceded by `frames_coalesced`, and the client
+  fetches the rows it skipped with `resume`
+- if nothing is acknowledged for BACKPRESSURE_STALL_SECONDS the in-flight
+  count is reset, so lost acknowledgements cannot stall a client forever
+
+Send counts, coalesced/dropped frames, round-trip times and current lag are
+kept per client and reported on /admin/clients.
+"""
+
+import logging
+import time
+from threading import Lock
+from backend.config import BACKPRESSURE_MAX_IN_FLIGHT, BACKPRESSURE_STALL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the round-trip average
+RTT_SMOOTHING = 0.2
+
+
+class ClientChannel:
+    """Flow-control state of one client"""
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.connected_at = time.time()
+        self.in_flight = []  # send times of unacknowledged frames, oldest first
+        self.pending = None  # (event, data, created_at, frames dropped for it) of the newest coalesced frame
+        self.sent = 0
+        self.acked = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.stalls = 0
+        self.rtt_ms = None
+        self.last_ack_at = None
+
+    def lag_ms(self, now):
+        """Age of the oldest frame the client has not acknowledged or received yet"""
+        oldest = []
+        if self.in_flight:
+            oldest.append(self.in_flight[0])
+        if self.pending:
+            oldest.append(self.pending[2])
+        return round((now - min(oldest)) * 1000, 1) if oldest else 0.0
+
+    def to_dict(self, now):
+        return {
+            'sid': self.sid,
+            'connected_seconds': round(now - self.connected_at, 1),
+            'in_flight': len(self.in_flight),
+            'pending': self.pending is not None,
+            'sent': self.sent,
+            'acked': self.acked,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'stalls': self.stalls,
+            'rtt_ms': round(self.rtt_ms, 1) if self.rtt_ms is not None else None,
+            'lag_ms': self.lag_ms(now),
+            'behind': len(self.in_flight) >= BACKPRESSURE_MAX_IN_FLIGHT
+        }
+
+
+class FlowController:
+    """Tracks flow-controlled clients and paces frames to each of them"""
+
+    def __init__(self, max_in_flight=BACKPRESSURE_MAX_IN_FLIGHT, stall_seconds=BACKPRESSURE_STALL_SECONDS):
+        self.max_in_flight = max(1, max_in_flight)
+        self.stall_seconds = stall_seconds
+        self.channels = {}
+        self.lock = Lock()
+
+    def register(self, sid):
+        with self.lock:
+            self.channels.setdefault(sid, ClientChannel(sid))
+
+    def unregister(self, sid):
+        with self.lock:
+            self.channels.pop(sid, None)
+
+    def controlled_sids(self):
+        with self.lock:
+            return list(self.channels)
+
+    def send(self, socketio, sid, event, data):
+        """Send a frame now if the client has room, otherwise coalesce it"""
+        now = time.time()
+        with self.lock:
+            channel = self.channels.get(sid)
+            if channel is None:
+                return False
+            if channel.in_flight and now - channel.in_flight[0] > self.stall_seconds:
+                logger.warning(f"Client {sid} acknowledged nothing for {self.stall_seconds}s, "
+                               f"resetting {len(channel.in_flight)} in-flight frame(s)")
+                channel.stalls += 1
+                channel.in_flight = []
+            if len(channel.in_flight) >= self.max_in_flight:
+                if channel.pending is not None:
+                    channel.dropped += 1
+                    created_at, gap = channel.pending[2], channel.pending[3] + 1
+                else:
+                    created_at, gap = now, 0
+                channel.pending = (event, data, created_at, gap)
+                channel.coalesced += 1
+                return False
+            channel.in_flight.append(now)
+            channel.sent += 1
+
+        self._emit(socketio, sid, event, data, now)
+        return True
+
+    def _emit(self, socketio, sid, event, data, sent_at):
+        socketio.emit(event, data, to=sid, callback=lambda *args: self._acknowledged(socketio, sid, sent_at))
+
+    def _acknowledged(self, socketio, sid, sent_at):
+        now = time.time()
+        with self.lock:
+            channel = self.channels.get(sid)
+            if channel is None:
+                return
+            if sent_at in channel.in_flight:
+                channel.in_flight.remove(sent_at)
+            channel.acked += 1
+            channel.last_ack_at = now
+            rtt = (now - sent_at) * 1000
+            channel.rtt_ms = rtt if channel.rtt_ms is None else (
+                RTT_SMOOTHING * rtt + (1 - RTT_SMOOTHING) * channel.rtt_ms)
+
+            pending = channel.pending
+            if pending is None or len(channel.in_flight) >= self.max_in_flight:
+                return
+            channel.pending = None
+            channel.in_flight.append(now)
+            channel.sent += 1
+
+        if pending[3]:
+            # Rows of the dropped frames may be older than the pending window
+            socketio.emit("frames_coalesced", {'dropped': pending[3]}, to=sid)
+        self._emit(socketio, sid, pending[0], pending[1], now)
+
+    def get_stats(self):
+        """Per-client lag metrics and totals"""
+        now = time.time()
+        with self.lock:
+            clients = [channel.to_dict(now) for channel in self.channels.values()]
+        return {
+            'max_in_flight': self.max_in_flight,
+            'clients': clients,
+            'behind': sum(1 for c in clients if c['behind']),
+            'max_lag_ms': max((c['lag_ms'] for c in clients), default=0.0),
+            'dropped': sum(c['dropped'] for c in clients)
+        }
+
+
+# Global instance used by the broadcaster and the Socket.IO handlers
+flow_controller = FlowController()
+
+def get_backpressure_stats():
+    """Per-client send-queue and lag metrics"""
+    return flow_controller.get_stats()
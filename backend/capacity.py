@@ -0,0 +1,318 @@
+"""
+HUST Solar Car Storage Capacity Planning
+========================================
+Storage-budget retention driven by measured growth instead of a calendar.
+
+Snapshots of every telemetry table's row count and size are recorded
+periodically. Rows come from the id span (two index lookups, ids grow with
+time); size is rows times the table's bytes per row from information_schema
+(data + indexes over TABLE_ROWS). information_schema figures are cached for
+up to information_schema_stats_expiry and do not shrink after a DELETE, so
+only their ratio is used and a trim refreshes it with ANALYZE TABLE.
+
+A least-squares growth rate over the recent snapshots projects when the
+database will cross STORAGE_BUDGET_MB. With RETENTION_MODE=budget the cleanup
+scheduler trims the oldest rows back to CAPACITY_TARGET_PERCENT of the budget
+whenever the budget is already exceeded or projected to be crossed within
+CAPACITY_LEAD_HOURS, and not again until a measurement shows the previous trim
+took effect.
+
+Usage:
+    python -m backend.capacity --snapshot
+    python -m backend.capacity --forecast
+    python -m backend.capacity --enforce [--dry-run]
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+from backend.helpers import get_db_connection
+from backend.config import (DB_NAME, STORAGE_BUDGET_MB, CAPACITY_FORECAST_HOURS, CAPACITY_LEAD_HOURS,
+                            CAPACITY_TARGET_PERCENT)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS_TABLE = 'table_size_snapshots'
+
+# Snapshots older than this are pruned
+SNAPSHOT_RETENTION_DAYS = 30
+
+MB = 1024 * 1024
+
+
+def _growth_per_hour(points):
+    """
+    Least-squares slope (units per hour) of [(datetime, value)] oldest first
+
+    Only points since the last drop are used, so a cleanup does not read as
+    negative growth.
+    """
+    for i in range(len(points) - 1, 0, -1):
+        if points[i][1] < points[i - 1][1]:
+            points = points[i:]
+            break
+    if len(points) < 2:
+        return None
+
+    t0 = points[0][0]
+    xs = [(t - t0).total_seconds() / 3600 for t, _ in points]
+    ys = [value for _, value in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+class CapacityPlanner:
+    """Records table size snapshots, forecasts growth and enforces the storage budget"""
+
+    def __init__(self, budget_mb=STORAGE_BUDGET_MB):
+        self.budget_bytes = budget_mb * MB
+        self.table_ready = False
+        # Time and measured use of the last live trim, until a later measurement shows it
+        self.last_trim = None
+
+    def _tables(self):
+        from backend.database_cleanup import get_database_cleaner
+        return list(get_database_cleaner().retention_days.keys())
+
+    def _ensure_table(self, cursor):
+        if self.table_ready:
+            return
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{SNAPSHOTS_TABLE}` (
+                id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                taken_at DATETIME NOT NULL,
+                table_name VARCHAR(64) NOT NULL,
+                row_count BIGINT NOT NULL,
+                size_bytes BIGINT NOT NULL,
+                INDEX idx_taken_at (taken_at)
+            )
+        """)
+        self.table_ready = True
+
+    def _current_sizes(self, cursor):
+        """{table: {'rows': n, 'bytes': n, 'bytes_per_row': n}} measured now"""
+        tables = self._tables()
+        placeholders = ','.join(['%s'] * len(tables))
+        cursor.execute(f"""
+            SELECT TABLE_NAME AS table_name, DATA_LENGTH + INDEX_LENGTH AS size_bytes, TABLE_ROWS AS table_rows
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})
+        """, (DB_NAME, *tables))
+        # Size and row estimate come from the same statistics, so their ratio holds even when both are stale
+        bytes_per_row = {row['table_name']: int(row['size_bytes'] or 0) / int(row['table_rows'])
+                         for row in cursor.fetchall() if row['table_rows']}
+
+        current = {}
+        for table in tables:
+            cursor.execute(f"SELECT MIN(id) AS min_id, MAX(id) AS max_id FROM `{table}`")
+            bounds = cursor.fetchone()
+            rows = bounds['max_id'] - bounds['min_id'] + 1 if bounds['min_id'] is not None else 0
+            per_row = bytes_per_row.get(table, 0.0)
+            current[table] = {'rows': rows, 'bytes': round(rows * per_row), 'bytes_per_row': per_row}
+        return current
+
+    def _awaiting_measurement(self, used):
+        """True while the last trim has not shown up as lower measured use"""
+        if self.last_trim is None:
+            return False
+        if used < self.last_trim['used']:
+            self.last_trim = None
+            return False
+        logger.warning(f"Storage budget: {used / MB:.1f} MB used, the trim at "
+                       f"{self.last_trim['at']:%Y-%m-%d %H:%M} has not shown up in a measurement yet")
+        return True
+
+    def _refresh_statistics(self, tables):
+        """ANALYZE trimmed tables so information_schema reflects the trim"""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for table in tables:
+                    cursor.execute(f"ANALYZE TABLE `{table}`")
+                    cursor.fetchall()
+
+    def take_snapshot(self):
+        """Record the current row count and size of every telemetry table"""
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._ensure_table(cursor)
+                    current = self._current_sizes(cursor)
+                    now = datetime.now()
+                    cursor.executemany(
+                        f"INSERT INTO `{SNAPSHOTS_TABLE}` (taken_at, table_name, row_count, size_bytes) "
+                        f"VALUES (%s, %s, %s, %s)",
+                        [(now, table, size['rows'], size['bytes']) for table, size in current.items()]
+                    )
+                    cursor.execute(f"DELETE FROM `{SNAPSHOTS_TABLE}` WHERE taken_at < %s",
+                                   (now - timedelta(days=SNAPSHOT_RETENTION_DAYS),))
+                conn.commit()
+            total_mb = sum(size['bytes'] for size in current.values()) / MB
+            logger.info(f"Capacity snapshot: {total_mb:.1f} MB of {self.budget_bytes / MB:.0f} MB budget")
+            return current
+        except Exception as e:
+            logger.error(f"Failed to take capacity snapshot: {e}")
+            return {}
+
+    def forecast(self):
+        """
+        Growth rates and projected time until the storage budget is full
+
+        Returns:
+            dict: Budget, current use, growth per hour and time-to-full, overall and per table
+        """
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._ensure_table(cursor)
+                    current = self._current_sizes(cursor)
+                    cursor.execute(f"""
+                        SELECT taken_at, table_name, row_count, size_bytes
+                        FROM `{SNAPSHOTS_TABLE}` WHERE taken_at >= %s ORDER BY taken_at
+                    """, (datetime.now() - timedelta(hours=CAPACITY_FORECAST_HOURS),))
+                    snapshots = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to forecast capacity: {e}")
+            return {'error': str(e)}
+
+        now = datetime.now()
+        by_table = {}
+        totals = {}
+        for snap in snapshots:
+            by_table.setdefault(snap['table_name'], []).append(snap)
+            totals[snap['taken_at']] = totals.get(snap['taken_at'], 0) + snap['size_bytes']
+
+        tables = {}
+        for table, size in current.items():
+            history = by_table.get(table, [])
+            bytes_per_hour = _growth_per_hour([(s['taken_at'], s['size_bytes']) for s in history] + [(now, size['bytes'])])
+            rows_per_hour = _growth_per_hour([(s['taken_at'], s['row_count']) for s in history] + [(now, size['rows'])])
+            tables[table] = {
+                'rows': size['rows'],
+                'size_mb': round(size['bytes'] / MB, 2),
+                'growth_mb_per_day': round(bytes_per_hour * 24 / MB, 2) if bytes_per_hour is not None else None,
+                'growth_rows_per_day': round(rows_per_hour * 24) if rows_per_hour is not None else None,
+                'bytes_per_row': round(size['bytes_per_row'], 1) or None
+            }
+
+        used = sum(size['bytes'] for size in current.values())
+        growth = _growth_per_hour(sorted(totals.items()) + [(now, used)])
+        awaiting = self._awaiting_measurement(used)
+        hours_to_full = None
+        if used >= self.budget_bytes:
+            hours_to_full = 0.0
+        elif growth and growth > 0:
+            hours_to_full = (self.budget_bytes - used) / growth
+
+        return {
+            'budget_mb': round(self.budget_bytes / MB, 1),
+            'used_mb': round(used / MB, 2),
+            'used_percent': round(used / self.budget_bytes * 100, 1) if self.budget_bytes else None,
+            'growth_mb_per_hour': round(growth / MB, 3) if growth is not None else None,
+            'hours_to_full': round(hours_to_full, 1) if hours_to_full is not None else None,
+            'projected_full_at': (now + timedelta(hours=hours_to_full)).isoformat() if hours_to_full is not None else None,
+            'over_budget': used >= self.budget_bytes,
+            'cleanup_due': hours_to_full is not None and hours_to_full <= CAPACITY_LEAD_HOURS and not awaiting,
+            'awaiting_measurement': awaiting,
+            'snapshots': len(totals),
+            'tables': tables
+        }
+
+    def enforce_budget(self, dry_run=False, forecast=None):
+        """
+        Trim the oldest rows back to CAPACITY_TARGET_PERCENT of the budget if cleanup is due
+
+        Rows are removed from each table in proportion to its share of the
+        space to free, using its average bytes per row, and never below the
+        cleaner's minimum and latest-record protections.
+        """
+        from backend.database_cleanup import get_database_cleaner
+
+        forecast = forecast or self.forecast()
+        if 'error' in forecast:
+            return forecast
+        if not forecast['cleanup_due']:
+            return {'dry_run': dry_run, 'triggered': False, 'forecast': forecast, 'total_deleted': 0}
+
+        used = forecast['used_mb'] * MB
+        to_free = max(0, used - self.budget_bytes * CAPACITY_TARGET_PERCENT / 100)
+        logger.info(f"Storage budget cleanup: {used / MB:.1f} MB used, freeing {to_free / MB:.1f} MB "
+                    f"({'DRY RUN' if dry_run else 'LIVE'})")
+
+        rows_to_delete = {}
+        for table, info in forecast['tables'].items():
+            if not info['bytes_per_row'] or not used:
+                continue
+            share = info['size_mb'] * MB / used
+            rows_to_delete[table] = math.ceil(to_free * share / info['bytes_per_row'])
+
+        result = get_database_cleaner().trim_oldest(rows_to_delete, dry_run=dry_run)
+        if not dry_run and result.get('total_deleted'):
+            self.last_trim = {'at': datetime.now(), 'used': used}
+            trimmed = [table for table, info in result['tables_processed'].items() if info.get('records_deleted')]
+            try:
+                self._refresh_statistics(trimmed)
+            except Exception as e:
+                logger.warning(f"Could not refresh table statistics after the trim: {e}")
+        result['triggered'] = True
+        result['forecast'] = forecast
+        result['target_mb'] = round(self.budget_bytes * CAPACITY_TARGET_PERCENT / 100 / MB, 1)
+        return result
+
+
+# Global instance used by the cleanup scheduler and recommendations
+capacity_planner = CapacityPlanner()
+
+def take_capacity_snapshot():
+    """Record current table sizes"""
+    return capacity_planner.take_snapshot()
+
+def get_capacity_forecast():
+    """Storage use, growth and projected time-to-full"""
+    return capacity_planner.forecast()
+
+def enforce_storage_budget(dry_run=False):
+    """Run a budget cleanup if the forecast says the budget will be crossed soon"""
+    return capacity_planner.enforce_budget(dry_run=dry_run)
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+    from backend.config import configure_logging, validate_config
+
+    configure_logging()
+    validate_config()
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Storage Capacity Planning')
+    parser.add_argument('--snapshot', action='store_true', help='Record current table sizes')
+    parser.add_argument('--forecast', action='store_true', help='Show growth forecast and time-to-full')
+    parser.add_argument('--enforce', action='store_true', help='Trim to the budget if cleanup is due')
+    parser.add_argument('--dry-run', action='store_true', help='With --enforce, only show what would be deleted')
+
+    args = parser.parse_args()
+
+    if args.snapshot:
+        current = take_capacity_snapshot()
+        for table, size in current.items():
+            print(f"  {table}: {size['rows']:,} rows, {size['bytes'] / MB:.1f} MB")
+    elif args.enforce:
+        result = enforce_storage_budget(dry_run=args.dry_run)
+        if 'error' in result:
+            print(f"❌ Budget cleanup failed: {result['error']}")
+        elif not result['triggered']:
+            print("✅ Within budget, no cleanup due")
+        else:
+            action = "Would delete" if args.dry_run else "Deleted"
+            print(f"✅ {action} {result['total_deleted']:,} records (target {result['target_mb']} MB)")
+    else:
+        forecast = get_capacity_forecast()
+        if 'error' in forecast:
+            print(f"❌ Forecast failed: {forecast['error']}")
+        else:
+            print(f"💾 {forecast['used_mb']} MB of {forecast['budget_mb']} MB ({forecast['used_percent']}%)")
+            print(f"  Growth: {forecast['growth_mb_per_hour']} MB/hour from {forecast['snapshots']} snapshot(s)")
+            print(f"  Time to full: {forecast['hours_to_full'] if forecast['hours_to_full'] is not None else 'n/a'} hours")
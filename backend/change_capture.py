@@ -0,0 +1,236 @@
+"""
+HUST Solar Car Change Capture
+=============================
+Optional trigger-fed change log for event-driven push.
+
+AFTER INSERT triggers on the telemetry tables append (table, id) to a narrow
+change-log table. The background fetcher polls that single table by its
+primary key and pulls only the new rows, instead of scanning all four
+telemetry tables every tick. Old change-log entries are pruned automatically.
+
+AUTO_INCREMENT seqs are assigned at insert but become visible at commit, so a
+lower seq can appear after a higher one was read. Each poll re-reads the
+last CHANGE_LOG_REREAD seqs below its position and consumes the ones it has
+not seen yet.
+
+Usage:
+    python -m backend.change_capture --install
+    python -m backend.change_capture --uninstall
+    python -m backend.change_capture --status
+"""
+
+import logging
+import time
+from backend.helpers import get_db_connection, fetch_all_data, fetch_rows_by_id, TELEMETRY_TABLES
+from backend.config import CHANGE_LOG_RETENTION_MINUTES
+
+logger = logging.getLogger(__name__)
+
+CHANGE_LOG_TABLE = 'telemetry_change_log'
+
+# Maximum change-log entries consumed per poll; the rest is picked up next tick
+CHANGE_LOG_BATCH_SIZE = 1000
+
+# Seqs below the position re-read on each poll for late commits
+CHANGE_LOG_REREAD = 200
+
+# How often (seconds) old change-log entries are pruned
+PRUNE_INTERVAL_SECONDS = 60
+
+
+def _trigger_name(key):
+    return f"trg_{key}_change_log"
+
+
+def install_change_capture():
+    """Create the change-log table and insert triggers on the telemetry tables"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS `{CHANGE_LOG_TABLE}` (
+                    seq BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                    table_key VARCHAR(16) NOT NULL,
+                    row_id BIGINT NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_created_at (created_at)
+                )
+            """)
+            for key, (table, _, _) in TELEMETRY_TABLES.items():
+                cursor.execute(f"DROP TRIGGER IF EXISTS `{_trigger_name(key)}`")
+                cursor.execute(f"""
+                    CREATE TRIGGER `{_trigger_name(key)}` AFTER INSERT ON `{table}`
+                    FOR EACH ROW INSERT INTO `{CHANGE_LOG_TABLE}` (table_key, row_id) VALUES (%s, NEW.id)
+                """, (key,))
+                logger.info(f"Change capture trigger installed on {table}")
+        conn.commit()
+
+
+def uninstall_change_capture():
+    """Drop the insert triggers and the change-log table"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            for key in TELEMETRY_TABLES:
+                cursor.execute(f"DROP TRIGGER IF EXISTS `{_trigger_name(key)}`")
+            cursor.execute(f"DROP TABLE IF EXISTS `{CHANGE_LOG_TABLE}`")
+        conn.commit()
+    logger.info("Change capture triggers removed")
+
+
+def change_capture_installed():
+    """True if the change-log table and every trigger exist"""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COUNT(*) AS count FROM information_schema.TABLES
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                """, (CHANGE_LOG_TABLE,))
+                if cursor.fetchone()['count'] == 0:
+                    return False
+
+                names = [_trigger_name(key) for key in TELEMETRY_TABLES]
+                placeholders = ",".join(["%s"] * len(names))
+                cursor.execute(f"""
+                    SELECT COUNT(*) AS count FROM information_schema.TRIGGERS
+                    WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME IN ({placeholders})
+                """, tuple(names))
+                return cursor.fetchone()['count'] == len(names)
+    except Exception as e:
+        logger.error(f"Failed to check change capture installation: {e}")
+        return False
+
+
+class ChangeFeed:
+    """Keeps the latest telemetry window per table up to date from the change log"""
+
+    def __init__(self, window_size=20):
+        self.window_size = window_size
+        self.last_seq = None
+        # Seqs consumed within the re-read window below last_seq
+        self.seen_seqs = set()
+        self.windows = {key: [] for key in TELEMETRY_TABLES}
+        self.last_prune = 0
+
+    def reset(self):
+        """Forget the current position; the next poll re-primes the windows"""
+        self.last_seq = None
+        self.seen_seqs = set()
+
+    def _prime(self):
+        """Load the current windows and the change-log position they correspond to"""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT COALESCE(MAX(seq), 0) AS seq FROM `{CHANGE_LOG_TABLE}`")
+                last_seq = cursor.fetchone()['seq']
+                # Entries already visible are covered by the window loaded below
+                cursor.execute(f"SELECT seq FROM `{CHANGE_LOG_TABLE}` WHERE seq > %s AND seq <= %s",
+                               (last_seq - CHANGE_LOG_REREAD, last_seq))
+                seen_seqs = {row['seq'] for row in cursor.fetchall()}
+
+        # Rows inserted between reading the position and the window are merged again
+        # on the next poll and deduplicated by id
+        self.windows = fetch_all_data(limit=self.window_size)
+        self.last_seq = last_seq
+        self.seen_seqs = seen_seqs
+        return {key: rows[::-1] for key, rows in self.windows.items() if rows}
+
+    def _merge(self, key, rows):
+        """Merge rows into a window and return the ones not seen before, oldest first"""
+        by_id = {row['id']: row for row in self.windows.get(key, [])}
+        added = []
+        for row in rows:
+            if row['id'] not in by_id:
+                added.append(row)
+            by_id[row['id']] = row
+        self.windows[key] = sorted(by_id.values(), key=lambda r: r['id'], reverse=True)[:self.window_size]
+        return sorted(added, key=lambda r: r['id'])
+
+    def poll(self):
+        """
+        Consume new change-log entries and merge the referenced rows into the windows
+
+        Returns:
+            tuple: (payload dict in the new_data format, {key: new rows oldest first})
+        """
+        if self.last_seq is None:
+            new_rows = self._prime()
+            return dict(self.windows), new_rows
+
+        new_rows = {}
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                floor = self.last_seq - CHANGE_LOG_REREAD
+                cursor.execute(f"""
+                    SELECT seq, table_key, row_id FROM `{CHANGE_LOG_TABLE}`
+                    WHERE seq > %s ORDER BY seq LIMIT %s
+                """, (floor, CHANGE_LOG_BATCH_SIZE + CHANGE_LOG_REREAD))
+                # Entries at or below the position count only if they committed late
+                changes = [change for change in cursor.fetchall()
+                           if change['seq'] > self.last_seq or (change['seq'] > floor
+                                                                and change['seq'] not in self.seen_seqs)]
+
+                if changes:
+                    ids_by_key = {}
+                    for change in changes:
+                        ids_by_key.setdefault(change['table_key'], []).append(change['row_id'])
+
+                    for key, ids in ids_by_key.items():
+                        if key not in TELEMETRY_TABLES:
+                            continue
+                        # Fetch every new row, not just the window, so row consumers see them all
+                        added = self._merge(key, fetch_rows_by_id(key, ids, cursor=cursor))
+                        if added:
+                            new_rows[key] = added
+
+                    self.last_seq = max(self.last_seq, changes[-1]['seq'])
+                    self.seen_seqs.update(change['seq'] for change in changes)
+                    floor = self.last_seq - CHANGE_LOG_REREAD
+                    self.seen_seqs = {seq for seq in self.seen_seqs if seq > floor}
+
+        self._prune_if_due()
+        return dict(self.windows), new_rows
+
+    def _prune_if_due(self):
+        now = time.time()
+        if now - self.last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self.last_prune = now
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"""
+                        DELETE FROM `{CHANGE_LOG_TABLE}`
+                        WHERE created_at < NOW() - INTERVAL %s MINUTE
+                        LIMIT 10000
+                    """, (CHANGE_LOG_RETENTION_MINUTES,))
+                    if cursor.rowcount:
+                        logger.debug(f"Pruned {cursor.rowcount} change log entries")
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Failed to prune change log: {e}")
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+    from backend.config import configure_logging, validate_config
+
+    configure_logging()
+    validate_config()
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Change Capture')
+    parser.add_argument('--install', action='store_true', help='Create change-log table and insert triggers')
+    parser.add_argument('--uninstall', action='store_true', help='Drop triggers and change-log table')
+    parser.add_argument('--status', action='store_true', help='Show whether change capture is installed')
+
+    args = parser.parse_args()
+
+    if args.install:
+        install_change_capture()
+        print("✅ Change capture installed. Set CHANGE_CAPTURE_ENABLED=true to use it.")
+    elif args.uninstall:
+        uninstall_change_capture()
+        print("✅ Change capture removed")
+    else:
+        installed = change_capture_installed()
+        print(f"📋 Change capture {'installed' if installed else 'not installed'}")
@@ -0,0 +1,197 @@
+"""
+HUST Solar Car Response Compression
+===================================
+Bandwidth savings for the cellular link to the chase car.
+
+- HTTP JSON/CSV responses above COMPRESSION_MIN_SIZE are compressed with
+  brotli or gzip, negotiated from Accept-Encoding.
+- Telemetry broadcasts are serialized and deflated once per broadcast and sent
+  as a binary `new_data_z` event to clients that opted in, instead of being
+  re-encoded for every client.
+- Clients that subscribed to a field projection receive `new_data` with only
+  those fields, cut from the same in-memory payload (no extra queries).
+- Achieved compression ratios are tracked per channel.
+"""
+
+import gzip
+import json
+import logging
+import zlib
+from threading import Lock
+from flask import request
+from backend.tables import KEY_FIELDS
+from backend.backpressure import flow_controller
+from backend.config import (COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE, GZIP_LEVEL,
+                            BROTLI_QUALITY, SOCKET_COMPRESSION_LEVEL)
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain'}
+
+# Socket.IO rooms for plain and pre-compressed telemetry broadcasts
+PLAIN_ROOM = 'telemetry'
+COMPRESSED_ROOM = 'telemetry_z'
+
+# Clients with a field projection share one room per distinct field list
+FIELDS_ROOM_PREFIX = 'telemetry_fields:'
+
+projection_lock = Lock()
+# room -> {payload key: fields}, and the room each projecting client is in
+projection_rooms = {}
+client_projections = {}
+
+stats_lock = Lock()
+compression_stats = {
+    'http': {'count': 0, 'bytes_in': 0, 'bytes_out': 0},
+    'socketio': {'count': 0, 'bytes_in': 0, 'bytes_out': 0}
+}
+
+def _record(channel, bytes_in, bytes_out):
+    with stats_lock:
+        channel_stats = compression_stats[channel]
+        channel_stats['count'] += 1
+        channel_stats['bytes_in'] += bytes_in
+        channel_stats['bytes_out'] += bytes_out
+
+def get_compression_stats():
+    """Compressed payload counts, byte totals and achieved ratio per channel"""
+    with stats_lock:
+        result = {}
+        for channel, channel_stats in compression_stats.items():
+            result[channel] = dict(channel_stats)
+            result[channel]['ratio'] = (
+                round(channel_stats['bytes_in'] / channel_stats['bytes_out'], 2)
+                if channel_stats['bytes_out'] else None
+            )
+        return result
+
+def _negotiate_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] > 0:
+        return 'br'
+    if accepted['gzip'] > 0:
+        return 'gzip'
+    return None
+
+def compress_response(response):
+    """after_request hook compressing large JSON/CSV responses"""
+    if (not COMPRESSION_ENABLED
+            or response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    encoding = _negotiate_encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    _record('http', len(data), len(compressed))
+    return response
+
+def init_compression(app):
+    """Register HTTP response compression on the Flask app"""
+    app.after_request(compress_response)
+    logger.info(f"Response compression {'enabled' if COMPRESSION_ENABLED else 'disabled'} "
+                f"(min size {COMPRESSION_MIN_SIZE} bytes, brotli {'available' if brotli else 'unavailable'})")
+
+def set_client_projection(sid, projection):
+    """
+    Register a client's field projection
+
+    Args:
+        projection (dict): {payload key: fields} from tables.resolve_fields
+
+    Returns:
+        str: Room the client has to join
+    """
+    room = FIELDS_ROOM_PREFIX + ",".join(f for fields in projection.values() for f in fields)
+    with projection_lock:
+        _drop_client_projection(sid)
+        projection_rooms[room] = projection
+        client_projections[sid] = room
+    return room
+
+def clear_client_projection(sid):
+    """Forget a client's projection; returns the room it was in, if any"""
+    with projection_lock:
+        return _drop_client_projection(sid)
+
+def _drop_client_projection(sid):
+    room = client_projections.pop(sid, None)
+    if room is not None and room not in client_projections.values():
+        projection_rooms.pop(room, None)
+    return room
+
+def project_payload(payload, projection):
+    """Copy of a telemetry payload holding only the projected tables and fields"""
+    projected = {}
+    for key, fields in projection.items():
+        keep = KEY_FIELDS + tuple(fields)
+        projected[key] = [{f: row[f] for f in keep if f in row} for row in payload.get(key, [])]
+    if 'seq' in payload:
+        projected['seq'] = {key: seq for key, seq in payload['seq'].items() if key in projection}
+    return projected
+
+def broadcast_telemetry(socketio, event, payload):
+    """
+    Emit a telemetry payload to all clients, compressing it once per broadcast
+
+    Clients in COMPRESSED_ROOM receive `<event>_z` with deflated JSON bytes,
+    clients with a field projection receive the plain event cut down to their
+    fields, everyone else receives the plain event. Flow-controlled clients
+    are skipped by the room emits and get the same variant paced by the
+    flow controller instead.
+    """
+    controlled = flow_controller.controlled_sids()
+    skip = controlled or None
+
+    socketio.emit(event, payload, to=PLAIN_ROOM, skip_sid=skip)
+
+    with projection_lock:
+        rooms = list(projection_rooms.items())
+    projected = {}
+    for room, projection in rooms:
+        projected[room] = project_payload(payload, projection)
+        socketio.emit(event, projected[room], to=room, skip_sid=skip)
+
+    compressed = None
+    if COMPRESSION_ENABLED:
+        encoded = json.dumps(payload, default=str, separators=(',', ':')).encode('utf-8')
+        compressed = zlib.compress(encoded, SOCKET_COMPRESSION_LEVEL)
+        socketio.emit(f"{event}_z", compressed, to=COMPRESSED_ROOM, skip_sid=skip)
+        _record('socketio', len(encoded), len(compressed))
+
+    for sid in controlled:
+        try:
+            client_rooms = socketio.server.rooms(sid, namespace='/')
+        except Exception:
+            # Disconnected since the list was taken
+            continue
+        if COMPRESSED_ROOM in client_rooms and compressed is not None:
+            flow_controller.send(socketio, sid, f"{event}_z", compressed)
+        elif PLAIN_ROOM in client_rooms:
+            flow_controller.send(socketio, sid, event, payload)
+        else:
+            room = next((r for r in client_rooms if r in projected), None)
+            if room is not None:
+                flow_controller.send(socketio, sid, event, projected[room])
@@ -15,39 +15,168 @@ DB_NAME = os.getenv("DB_NAME")
 # Flask Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
 FLASK_ENV = os.getenv("FLASK_ENV", "development")
+SERVER_PORT = int(os.getenv("PORT", "5000"))
 
 # Application Settings
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 MAX_DB_CONNECTIONS = int(os.getenv("MAX_DB_CONNECTIONS", "10"))
 RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
 
+# Background Fetcher Configuration (seconds between polls, adapted to data arrival rate)
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", "0.5"))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", "10"))
+POLL_DEFAULT_INTERVAL = float(os.getenv("POLL_DEFAULT_INTERVAL", "2"))
+
+# Change Capture Configuration (trigger-fed change log instead of polling four tables)
+CHANGE_CAPTURE_ENABLED = os.getenv("CHANGE_CAPTURE_ENABLED", "false").lower() == "true"
+CHANGE_LOG_POLL_INTERVAL = float(os.getenv("CHANGE_LOG_POLL_INTERVAL", "0.25"))
+CHANGE_LOG_RETENTION_MINUTES = int(os.getenv("CHANGE_LOG_RETENTION_MINUTES", "10"))
+
+# Multi-Worker Configuration (message queue for broadcasts, single polling leader)
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "") or None
+LEADER_ELECTION = os.getenv("LEADER_ELECTION", "none").lower()  # none | mysql | file
+LEADER_LOCK_NAME = os.getenv("LEADER_LOCK_NAME", "hust_telemetry_poller")
+LEADER_LOCK_FILE = os.getenv("LEADER_LOCK_FILE", "/tmp/hust_telemetry_poller.lock")
+LEADER_HEARTBEAT_SECONDS = float(os.getenv("LEADER_HEARTBEAT_SECONDS", "5"))
+LEADER_STATE_INTERVAL = float(os.getenv("LEADER_STATE_INTERVAL", "1"))  # seconds between engine state publishes
+
+# Derived Metrics Configuration (rolling windows in seconds, comma separated)
+DERIVED_WINDOWS_SECONDS = [int(w) for w in os.getenv("DERIVED_WINDOWS_SECONDS", "60,300,900").split(",") if w.strip()]
+DERIVED_PUBLISH_INTERVAL = float(os.getenv("DERIVED_PUBLISH_INTERVAL", "5"))
+DERIVED_MAX_GAP_SECONDS = float(os.getenv("DERIVED_MAX_GAP_SECONDS", "30"))
+# Sign of Battery_Current while the pack discharges (1 = positive when discharging, -1 = negative)
+BATTERY_DISCHARGE_SIGN = 1 if float(os.getenv("BATTERY_DISCHARGE_SIGN", "1")) >= 0 else -1
+
+# Rolling Statistics Configuration (standard windows in seconds, comma separated)
+ROLLING_STATS_WINDOWS = [int(w) for w in os.getenv("ROLLING_STATS_WINDOWS", "60,300,900,3600").split(",") if w.strip()]
+
+# Alert Rules Configuration (JSON file, reloaded when it changes)
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE", os.path.join(os.path.dirname(__file__), "alert_rules.json"))
+
+# Joined Time-Series Configuration (/joined streams one chunk of this many seconds at a time)
+JOINED_CHUNK_SECONDS = int(os.getenv("JOINED_CHUNK_SECONDS", "600"))
+JOINED_MAX_POINTS = int(os.getenv("JOINED_MAX_POINTS", "2000000"))
+
+# Driving Session Index Configuration
+SESSION_MIN_VELOCITY = float(os.getenv("SESSION_MIN_VELOCITY", "0"))
+SESSION_GAP_SECONDS = int(os.getenv("SESSION_GAP_SECONDS", "300"))
+SESSION_MIN_SECONDS = int(os.getenv("SESSION_MIN_SECONDS", "120"))
+SESSION_INDEX_INTERVAL = int(os.getenv("SESSION_INDEX_INTERVAL", "60"))
+
+# Historical Replay Configuration
+REPLAY_CHUNK_SECONDS = int(os.getenv("REPLAY_CHUNK_SECONDS", "60"))
+REPLAY_READAHEAD_CHUNKS = int(os.getenv("REPLAY_READAHEAD_CHUNKS", "3"))
+REPLAY_MAX_SESSIONS = int(os.getenv("REPLAY_MAX_SESSIONS", "4"))
+REPLAY_MAX_SPEED = float(os.getenv("REPLAY_MAX_SPEED", "50"))
+
+# Reconnect/Resume Configuration (max missed rows returned per table; clients further behind
+# than RESUME_MAX_GAP ids reload instead)
+RESUME_MAX_ROWS = int(os.getenv("RESUME_MAX_ROWS", "500"))
+RESUME_MAX_GAP = int(os.getenv("RESUME_MAX_GAP", "50000"))
+
+# DB Execution Lanes (native threads for blocking queries; interactive = live reads, heavy = cleanup/stats/export,
+# shed with 503 while live reads are under pressure)
+DB_OFFLOAD_ENABLED = os.getenv("DB_OFFLOAD_ENABLED", "true").lower() == "true"
+DB_INTERACTIVE_THREADS = int(os.getenv("DB_INTERACTIVE_THREADS", "4"))
+DB_HEAVY_THREADS = int(os.getenv("DB_HEAVY_THREADS", "1"))
+DB_LIVE_RESERVED_CONNECTIONS = int(os.getenv("DB_LIVE_RESERVED_CONNECTIONS", "4"))  # never used by heavy work
+DB_INTERACTIVE_QUEUE_TIMEOUT = float(os.getenv("DB_INTERACTIVE_QUEUE_TIMEOUT", "5"))
+DB_HEAVY_QUEUE_TIMEOUT = float(os.getenv("DB_HEAVY_QUEUE_TIMEOUT", "10"))
+DB_HEAVY_MAX_QUEUE = int(os.getenv("DB_HEAVY_MAX_QUEUE", "2"))  # further heavy calls get 503
+DB_SHED_WAIT_MS = float(os.getenv("DB_SHED_WAIT_MS", "200"))  # shed heavy work while live reads wait longer
+
+# Logging Configuration (queued writes, rotated and gzip-compressed; LOG_SAMPLING keeps 1 in N DEBUG lines)
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size").lower()  # size | time
+LOG_MAX_MB = int(os.getenv("LOG_MAX_MB", "10"))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "true").lower() == "true"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "backend.helpers:100,backend.routes:20")
+
+# Store-and-forward Configuration (memory-mapped segment log used while MySQL is unreachable)
+SEGMENT_LOG_ENABLED = os.getenv("SEGMENT_LOG_ENABLED", "true").lower() == "true"
+SEGMENT_LOG_DIR = os.getenv("SEGMENT_LOG_DIR", "segment_log")
+SEGMENT_SIZE_MB = int(os.getenv("SEGMENT_SIZE_MB", "4"))
+SEGMENT_MAX_COUNT = int(os.getenv("SEGMENT_MAX_COUNT", "16"))
+SEGMENT_REPLAY_BATCH = int(os.getenv("SEGMENT_REPLAY_BATCH", "1000"))
+
+# Compression Configuration (HTTP responses and Socket.IO broadcasts)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+SOCKET_COMPRESSION_LEVEL = int(os.getenv("SOCKET_COMPRESSION_LEVEL", "6"))
+
+# Socket.IO Backpressure (per-client flow control for clients that opt in)
+BACKPRESSURE_MAX_IN_FLIGHT = int(os.getenv("BACKPRESSURE_MAX_IN_FLIGHT", "2"))
+BACKPRESSURE_STALL_SECONDS = int(os.getenv("BACKPRESSURE_STALL_SECONDS", "30"))
+
+# Static Asset Caching (hashed build output is immutable; HTML and unhashed files revalidate)
+STATIC_CACHE_SECONDS = int(os.getenv("STATIC_CACHE_SECONDS", "31536000"))
+HTML_CACHE_SECONDS = int(os.getenv("HTML_CACHE_SECONDS", "60"))
+
 # Database Cleanup Configuration
 ENABLE_AUTO_CLEANUP = os.getenv("ENABLE_AUTO_CLEANUP", "true").lower() == "true"
 CLEANUP_SCHEDULE_DAYS = int(os.getenv("CLEANUP_SCHEDULE_DAYS", "7"))
+CLEANUP_PARALLEL = int(os.getenv("CLEANUP_PARALLEL", "1"))  # tables cleaned concurrently
+# Activity-aware scheduling: cleanup waits for a parked car and quiet ingest
+CLEANUP_WINDOW_HORIZON_HOURS = int(os.getenv("CLEANUP_WINDOW_HORIZON_HOURS", "24"))
+CLEANUP_LOAD_HISTORY_DAYS = int(os.getenv("CLEANUP_LOAD_HISTORY_DAYS", "7"))
+CLEANUP_QUIET_MINUTES = int(os.getenv("CLEANUP_QUIET_MINUTES", "10"))
+CLEANUP_PARKED_VELOCITY = float(os.getenv("CLEANUP_PARKED_VELOCITY", "1"))
+CLEANUP_QUIET_ROWS_PER_MINUTE = float(os.getenv("CLEANUP_QUIET_ROWS_PER_MINUTE", "30"))  # per table
+CLEANUP_DEFER_MINUTES = int(os.getenv("CLEANUP_DEFER_MINUTES", "15"))
+CLEANUP_MAX_DEFER_HOURS = float(os.getenv("CLEANUP_MAX_DEFER_HOURS", "6"))  # then run once parked, even with ingest
 BATTERY_RETENTION_DAYS = int(os.getenv("BATTERY_RETENTION_DAYS", "14"))
 MOTOR_RETENTION_DAYS = int(os.getenv("MOTOR_RETENTION_DAYS", "14"))
 MPPT_RETENTION_DAYS = int(os.getenv("MPPT_RETENTION_DAYS", "21"))
 VEHICLE_RETENTION_DAYS = int(os.getenv("VEHICLE_RETENTION_DAYS", "30"))
 
+# Storage Budget Retention (RETENTION_MODE=budget cleans up when growth forecast crosses the budget)
+RETENTION_MODE = os.getenv("RETENTION_MODE", "days").lower()  # days | budget
+STORAGE_BUDGET_MB = int(os.getenv("STORAGE_BUDGET_MB", "2048"))
+CAPACITY_SNAPSHOT_INTERVAL = int(os.getenv("CAPACITY_SNAPSHOT_INTERVAL", "3600"))
+CAPACITY_FORECAST_HOURS = int(os.getenv("CAPACITY_FORECAST_HOURS", "72"))
+CAPACITY_LEAD_HOURS = float(os.getenv("CAPACITY_LEAD_HOURS", "48"))
+CAPACITY_TARGET_PERCENT = float(os.getenv("CAPACITY_TARGET_PERCENT", "80"))
+
 # Latest Records Protection Configuration
 LATEST_BATTERY_PRESERVE = int(os.getenv("LATEST_BATTERY_PRESERVE", "500"))
 LATEST_MOTOR_PRESERVE = int(os.getenv("LATEST_MOTOR_PRESERVE", "500"))
 LATEST_MPPT_PRESERVE = int(os.getenv("LATEST_MPPT_PRESERVE", "500"))
 LATEST_VEHICLE_PRESERVE = int(os.getenv("LATEST_VEHICLE_PRESERVE", "300"))
 
-# Validate required environment variables
-required_vars = [DB_HOST, DB_USER, DB_PASSWORD, DB_NAME]
-if not all(required_vars):
-    missing = [var for var in ["DB_HOST", "DB_USER", "DB_PASSWORD", "DB_NAME"] 
+# Validation and logging run once at startup (not on import) so that importing
+# config stays cheap for scripts and worker boot
+_logging_configured = False
+
+def validate_config():
+    """Raise ValueError if required environment variables are missing"""
+    missing = [var for var in ["DB_HOST", "DB_USER", "DB_PASSWORD", "DB_NAME"]
                if not os.getenv(var)]
-    raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
-
-# Configure logging
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL.upper()),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler()
-    ]
-)
+    if missing:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
+    if not DERIVED_WINDOWS_SECONDS or min(DERIVED_WINDOWS_SECONDS) <= 0:
+        raise ValueError("DERIVED_WINDOWS_SECONDS must list at least one positive window in seconds")
+
+def configure_logging():
+    """Start the queued, rotating log pipeline (console + LOG_FILE); safe to call more than once"""
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+
+    from backend.log_pipeline import start_log_pipeline, parse_sampling
+    start_log_pipeline(
+        level=getattr(logging, LOG_LEVEL.upper()),
+        path=LOG_FILE,
+        fmt=LOG_FORMAT,
+        rotation=LOG_ROTATION,
+        max_bytes=LOG_MAX_MB * 1024 * 1024,
+        backup_count=LOG_BACKUP_COUNT,
+        when=LOG_ROTATE_WHEN,
+        compress=LOG_COMPRESS,
+        sampling=parse_sampling(LOG_SAMPLING)
+    )
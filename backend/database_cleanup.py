@@ -9,54 +9,82 @@ import pymysql
 import logging
 from datetime import datetime, timedelta
 from backend.helpers import get_db_connection
+from backend.db_executor import run_in_lane, with_current_lane, LaneBusy, HEAVY
+from backend.tables import TABLE_REGISTRY, get_table, table_by_name, cleanup_statements
+from backend.config import (CLEANUP_PARALLEL, CAPACITY_TARGET_PERCENT, RETENTION_MODE, CAPACITY_SNAPSHOT_INTERVAL,
+                            CLEANUP_SCHEDULE_DAYS, CLEANUP_WINDOW_HORIZON_HOURS, CLEANUP_LOAD_HISTORY_DAYS,
+                            CLEANUP_QUIET_MINUTES, CLEANUP_PARKED_VELOCITY, CLEANUP_QUIET_ROWS_PER_MINUTE,
+                            CLEANUP_DEFER_MINUTES, CLEANUP_MAX_DEFER_HOURS)
 import threading
-import schedule
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 logger = logging.getLogger(__name__)
 
+# Confidence of an estimated preview, lowest first
+CONFIDENCE_LEVELS = ('low', 'medium', 'high')
+
+# Relative disagreement between the optimizer estimate and the id span
+# tolerated for high / medium confidence
+ESTIMATE_HIGH_MARGIN = 0.10
+ESTIMATE_MEDIUM_MARGIN = 0.35
+
+# Differences of a few rows on near-empty ranges are not divergence
+ESTIMATE_MIN_ROWS = 100
+
+def _divergence(a, b):
+    """Relative difference of two row estimates (0 = identical)"""
+    return abs(a - b) / max(a, b, ESTIMATE_MIN_ROWS)
+
+def _lowest_confidence(levels):
+    return min(levels, key=CONFIDENCE_LEVELS.index, default='high')
+
 class DatabaseCleaner:
     """Professional database cleanup system for solar car telemetry"""
     
     def __init__(self):
-        from backend.config import (BATTERY_RETENTION_DAYS, MOTOR_RETENTION_DAYS, 
-                           MPPT_RETENTION_DAYS, VEHICLE_RETENTION_DAYS,
-                           LATEST_BATTERY_PRESERVE, LATEST_MOTOR_PRESERVE,
-                           LATEST_MPPT_PRESERVE, LATEST_VEHICLE_PRESERVE)
-        
         # Racing-optimized retention periods (configurable)
-        self.retention_days = {
-            'Battery Data Table': BATTERY_RETENTION_DAYS,
-            'Motor Data Table': MOTOR_RETENTION_DAYS,  
-            'MPPT Data Table': MPPT_RETENTION_DAYS,
-            'Vehicle Data Table': VEHICLE_RETENTION_DAYS
-        }
+        self.retention_days = {t.name: t.retention_days for t in TABLE_REGISTRY.values()}
         
         # Safety limits - never delete if table has less than this
-        self.min_records_to_keep = {
-            'Battery Data Table': 1000,   # Keep at least 1000 battery records
-            'Motor Data Table': 1000,     # Keep at least 1000 motor records
-            'MPPT Data Table': 1000,      # Keep at least 1000 solar records
-            'Vehicle Data Table': 500     # Keep at least 500 vehicle records
-        }
+        self.min_records_to_keep = {t.name: t.min_records for t in TABLE_REGISTRY.values()}
         
         # Always preserve the latest N records regardless of age (configurable)
-        self.latest_records_to_preserve = {
-            'Battery Data Table': LATEST_BATTERY_PRESERVE,
-            'Motor Data Table': LATEST_MOTOR_PRESERVE,
-            'MPPT Data Table': LATEST_MPPT_PRESERVE,
-            'Vehicle Data Table': LATEST_VEHICLE_PRESERVE
-        }
+        self.latest_records_to_preserve = {t.name: t.latest_preserve for t in TABLE_REGISTRY.values()}
         
         self.cleanup_running = False
         
-    def get_table_stats(self):
-        """Get detailed statistics for all telemetry tables"""
+    def get_table_stats(self, exact=True):
+        """
+        Get detailed statistics for all telemetry tables
+
+        Args:
+            exact (bool): If False, record counts are index estimates (see estimate_table)
+        """
         try:
             with get_db_connection() as conn:
                 with conn.cursor() as cursor:
                     stats = {}
                     
+                    if not exact:
+                        for table, retention_days in self.retention_days.items():
+                            cutoff_date = datetime.now() - timedelta(days=retention_days)
+                            estimate = self.estimate_table(cursor, table, cutoff_date)
+                            # MIN/MAX of an indexed column are single index lookups
+                            cursor.execute(f"SELECT MIN(timestamp) as oldest, MAX(timestamp) as newest FROM `{table}`")
+                            bounds = cursor.fetchone()
+                            stats[table] = {
+                                'total_records': estimate['total_records'],
+                                'oldest_record': bounds['oldest'],
+                                'newest_record': bounds['newest'],
+                                'records_to_delete': estimate['old_records'],
+                                'retention_days': retention_days,
+                                'cutoff_date': cutoff_date,
+                                'estimated': True,
+                                'confidence': estimate['confidence']
+                            }
+                        return stats
+                    
                     for table in self.retention_days.keys():
                         # Get total count
                         cursor.execute(f"SELECT COUNT(*) as total_count FROM `{table}`")
@@ -90,12 +118,280 @@ class DatabaseCleaner:
             logger.error(f"Failed to get table statistics: {e}")
             return {}
     
-    def cleanup_old_data(self, dry_run=False):
+    def _cleanup_table(self, cursor, table, retention_days, dry_run):
+        """
+        Apply the retention policy to one table
+
+        Returns:
+            dict: Per-table result, or None if the table was skipped without a result
+        """
+        logger.info(f"Processing table: {table}")
+        statements = cleanup_statements(table_by_name(table).key)
+        
+        # Calculate cutoff date
+        cutoff_date = datetime.now() - timedelta(days=retention_days)
+        
+        # Check current table size
+        cursor.execute(statements['count'])
+        total_records = cursor.fetchone()['count']
+        
+        if total_records == 0:
+            logger.info(f"Table {table} is empty, skipping...")
+            return None
+        
+        # Safety check - don't process if below absolute minimum
+        min_required = self.min_records_to_keep[table]
+        if total_records <= min_required:
+            logger.info(f"Table {table} has only {total_records} records (minimum: {min_required}), skipping...")
+            return {
+                'total_records_before': total_records,
+                'records_deleted': 0,
+                'status': 'protected_below_minimum',
+                'retention_days': retention_days
+            }
+        
+        # Get the latest N records to preserve regardless of age
+        latest_preserve = self.latest_records_to_preserve[table]
+        cursor.execute(statements['latest_ids'], (latest_preserve,))
+        preserve_ids = [str(row['id']) for row in cursor.fetchall()]
+        
+        if not preserve_ids:
+            logger.warning(f"No records found to preserve in {table}")
+            return None
+        
+        # Count records that can be safely deleted (old + not in latest N)
+        preserve_ids_str = ','.join(preserve_ids)
+        cursor.execute(statements['count_old'].format(preserve_ids=preserve_ids_str), (cutoff_date,))
+        records_to_delete = cursor.fetchone()['count']
+        
+        # Calculate what would remain after deletion
+        remaining_after = total_records - records_to_delete
+        
+        # Final safety check
+        if remaining_after < min_required:
+            # Adjust deletion to only remove the oldest while preserving minimum + latest
+            max_deletable = max(0, total_records - min_required)
+            if max_deletable > 0:
+                # Delete oldest records while preserving both minimum count AND latest records
+                delete_query = statements['delete_oldest'].format(preserve_ids=preserve_ids_str)
+                if not dry_run:
+                    cursor.execute(delete_query, (max_deletable,))
+                    actual_deleted = cursor.rowcount
+                else:
+                    actual_deleted = max_deletable
+                
+                logger.info(f"Safety mode: Deleted {actual_deleted} oldest records from {table} (preserving minimum {min_required} + latest {latest_preserve})")
+            else:
+                actual_deleted = 0
+                logger.info(f"Skipping {table}: Would breach safety limits")
+        else:
+            # Safe deletion - remove old records but preserve latest N
+            delete_query = statements['delete_old'].format(preserve_ids=preserve_ids_str)
+            if not dry_run:
+                cursor.execute(delete_query, (cutoff_date,))
+                actual_deleted = cursor.rowcount
+            else:
+                actual_deleted = records_to_delete
+            
+            logger.info(f"Deleted {actual_deleted} old records from {table} (latest {latest_preserve} preserved)")
+        
+        # Optimize table after deletion (only if not dry run)
+        if not dry_run and actual_deleted > 0:
+            logger.info(f"Optimizing table {table}...")
+            cursor.execute(statements['optimize'])
+        
+        return {
+            'total_records_before': total_records,
+            'records_deleted': actual_deleted,
+            'cutoff_date': cutoff_date,
+            'retention_days': retention_days,
+            'latest_preserved': latest_preserve,
+            'final_count': total_records - actual_deleted
+        }
+    
+    # ----- estimates -----
+    
+    def estimate_table(self, cursor, table, cutoff_date):
+        """
+        Estimate total and old rows of a table without counting them
+
+        The optimizer's row estimates (`EXPLAIN`, from InnoDB index statistics
+        and index dives on the timestamp range) are cross-checked against the
+        id span of the same rows: ids grow with time, so MAX(id) - MIN(id) and
+        the first id at the cutoff bound the counts, and each is a single
+        index lookup. When the optimizer plans a scan for the old range its
+        row figure covers the whole table, so the old rows are taken from
+        the id span instead. Close agreement on an indexed range gives high
+        confidence; a missing timestamp index or diverging figures lower it.
+        
+        Returns:
+            dict: total_records, old_records, confidence, index, divergence
+        """
+        cursor.execute(f"EXPLAIN SELECT id FROM `{table}`")
+        total_records = int((cursor.fetchone() or {}).get('rows') or 0)
+        cursor.execute(f"EXPLAIN SELECT id FROM `{table}` WHERE timestamp < %s", (cutoff_date,))
+        plan = cursor.fetchone() or {}
+        scanned = plan.get('key') is None
+        old_records = int(plan.get('rows') or 0)
+        if scanned:
+            # A scan's row figure is the whole table; only the filtered share matches the range
+            old_records = round(old_records * float(plan.get('filtered') or 100) / 100)
+        old_records = min(old_records, total_records)
+        # The optimizer may prefer a scan for a wide range even when an index exists
+        index = plan.get('key') or (plan.get('possible_keys') or '').split(',')[0] or None
+        
+        cursor.execute(f"SELECT MIN(id) as min_id, MAX(id) as max_id FROM `{table}`")
+        bounds = cursor.fetchone()
+        if bounds['min_id'] is None:
+            return {'total_records': 0, 'old_records': 0, 'confidence': 'high', 'index': index, 'divergence': 0.0}
+        span_total = bounds['max_id'] - bounds['min_id'] + 1
+        
+        if index is None:
+            # Without a timestamp index the boundary lookup would scan the table
+            return {'total_records': total_records, 'old_records': old_records, 'confidence': 'low',
+                    'index': None, 'divergence': round(_divergence(total_records, span_total), 3)}
+        
+        cursor.execute(f"SELECT id FROM `{table}` WHERE timestamp >= %s ORDER BY timestamp, id LIMIT 1",
+                       (cutoff_date,))
+        boundary = cursor.fetchone()
+        span_old = boundary['id'] - bounds['min_id'] if boundary else span_total
+        if span_old == 0:
+            # The oldest row is already inside the retention period
+            old_records = 0
+        elif scanned:
+            # Scale the id span by the table's id density, so gaps are not counted as rows
+            old_records = min(round(span_old * total_records / span_total), total_records)
+        
+        divergence = max(_divergence(total_records, span_total), _divergence(old_records, span_old))
+        if divergence <= ESTIMATE_HIGH_MARGIN:
+            confidence = 'high'
+        elif divergence <= ESTIMATE_MEDIUM_MARGIN:
+            confidence = 'medium'
+        else:
+            confidence = 'low'
+        return {'total_records': total_records, 'old_records': old_records, 'confidence': confidence,
+                'index': index, 'divergence': round(divergence, 3)}
+    
+    def _estimate_table_cleanup(self, cursor, table, retention_days):
+        """Estimated counterpart of _cleanup_table for a dry run (same result shape)"""
+        cutoff_date = datetime.now() - timedelta(days=retention_days)
+        estimate = self.estimate_table(cursor, table, cutoff_date)
+        total_records = estimate['total_records']
+        if total_records == 0:
+            return None
+        
+        details = {
+            'estimated': True,
+            'confidence': estimate['confidence'],
+            'index': estimate['index'],
+            'divergence': estimate['divergence']
+        }
+        min_required = self.min_records_to_keep[table]
+        if total_records <= min_required:
+            return {
+                'total_records_before': total_records,
+                'records_deleted': 0,
+                'status': 'protected_below_minimum',
+                'retention_days': retention_days,
+                **details
+            }
+        
+        # Same policy as _cleanup_table: the latest N rows are never old, and
+        # if the minimum would be breached only the oldest rows above it go
+        latest_preserve = self.latest_records_to_preserve[table]
+        records_to_delete = min(estimate['old_records'], max(0, total_records - latest_preserve))
+        if total_records - records_to_delete < min_required:
+            records_to_delete = max(0, total_records - min_required)
+        
+        # An error of the estimate's size could move the table across its minimum
+        if (estimate['confidence'] == 'high'
+                and abs(total_records - min_required) <= total_records * ESTIMATE_HIGH_MARGIN):
+            details['confidence'] = 'medium'
+        
+        return {
+            'total_records_before': total_records,
+            'records_deleted': records_to_delete,
+            'cutoff_date': cutoff_date,
+            'retention_days': retention_days,
+            'latest_preserved': latest_preserve,
+            'final_count': total_records - records_to_delete,
+            **details
+        }
+    
+    def estimate_cleanup(self):
+        """
+        Fast dry run from index estimates instead of exact COUNTs
+        
+        Runs a handful of EXPLAINs and index lookups per table, so it returns
+        in milliseconds regardless of table size and does not take the
+        cleanup lock. Each table carries a confidence ('high', 'medium',
+        'low'); the overall confidence is the lowest of them. Use
+        cleanup_old_data(dry_run=True) when exact numbers matter.
+        
+        Returns:
+            dict: Results in the same shape as cleanup_old_data, with mode 'estimate'
+        """
+        cleanup_results = {
+            'start_time': datetime.now(),
+            'dry_run': True,
+            'mode': 'estimate',
+            'tables_processed': {},
+            'total_deleted': 0,
+            'errors': []
+        }
+        
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    for table, retention_days in self.retention_days.items():
+                        started = time.perf_counter()
+                        try:
+                            result = self._estimate_table_cleanup(cursor, table, retention_days)
+                            self._record_table_result(cleanup_results, table, result,
+                                                      time.perf_counter() - started)
+                        except Exception as table_error:
+                            error_msg = f"Error estimating table {table}: {table_error}"
+                            logger.error(error_msg)
+                            cleanup_results['errors'].append(error_msg)
+        except Exception as e:
+            error_msg = f"Cleanup estimate failed: {e}"
+            logger.error(error_msg)
+            return {'error': error_msg}
+        
+        levels = [result['confidence'] for result in cleanup_results['tables_processed'].values()]
+        cleanup_results['confidence'] = 'low' if cleanup_results['errors'] else _lowest_confidence(levels)
+        cleanup_results['end_time'] = datetime.now()
+        cleanup_results['duration'] = (cleanup_results['end_time'] - cleanup_results['start_time']).total_seconds()
+        
+        logger.info(f"Cleanup estimate: ~{cleanup_results['total_deleted']} records would be deleted "
+                    f"(confidence {cleanup_results['confidence']}, {cleanup_results['duration'] * 1000:.1f} ms)")
+        return cleanup_results
+    
+    def _cleanup_table_on_own_connection(self, table, retention_days, dry_run):
+        """Clean one table on its own pooled connection (parallel mode)"""
+        started = time.perf_counter()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                result = self._cleanup_table(cursor, table, retention_days, dry_run)
+            if not dry_run:
+                conn.commit()
+        return result, time.perf_counter() - started
+    
+    def _record_table_result(self, cleanup_results, table, result, duration):
+        if result is None:
+            return
+        result['duration'] = round(duration, 3)
+        cleanup_results['tables_processed'][table] = result
+        cleanup_results['total_deleted'] += result['records_deleted']
+    
+    def cleanup_old_data(self, dry_run=False, parallel=None):
         """
         Clean up old telemetry data based on retention policies
         
         Args:
             dry_run (bool): If True, only calculate what would be deleted without actually deleting
+            parallel (int): Tables cleaned concurrently, each on its own pooled connection
+                            (defaults to CLEANUP_PARALLEL; 1 = one table after another)
             
         Returns:
             dict: Cleanup results and statistics
@@ -105,170 +401,187 @@ class DatabaseCleaner:
             return {'error': 'Cleanup already running'}
         
         self.cleanup_running = True
+        parallel = max(1, min(parallel or CLEANUP_PARALLEL, len(self.retention_days)))
         
         try:
             cleanup_results = {
                 'start_time': datetime.now(),
                 'dry_run': dry_run,
+                'parallel': parallel,
                 'tables_processed': {},
                 'total_deleted': 0,
                 'errors': []
             }
             
-            logger.info(f"Starting database cleanup {'(DRY RUN)' if dry_run else '(LIVE)'}...")
+            logger.info(f"Starting database cleanup {'(DRY RUN)' if dry_run else '(LIVE)'}"
+                        f"{f' on {parallel} connections' if parallel > 1 else ''}...")
+            
+            if parallel > 1:
+                # Tables are independent, so each one gets its own connection and commit
+                cleanup_table = with_current_lane(self._cleanup_table_on_own_connection)
+                with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='cleanup') as executor:
+                    futures = {
+                        executor.submit(cleanup_table, table, retention_days, dry_run): table
+                        for table, retention_days in self.retention_days.items()
+                    }
+                    for future in as_completed(futures):
+                        table = futures[future]
+                        try:
+                            result, duration = future.result()
+                            self._record_table_result(cleanup_results, table, result, duration)
+                        except Exception as table_error:
+                            error_msg = f"Error processing table {table}: {table_error}"
+                            logger.error(error_msg)
+                            cleanup_results['errors'].append(error_msg)
+                # Keep the usual table order in the results
+                cleanup_results['tables_processed'] = {
+                    table: cleanup_results['tables_processed'][table]
+                    for table in self.retention_days if table in cleanup_results['tables_processed']
+                }
+            else:
+                with get_db_connection() as conn:
+                    with conn.cursor() as cursor:
+                        
+                        for table, retention_days in self.retention_days.items():
+                            started = time.perf_counter()
+                            try:
+                                result = self._cleanup_table(cursor, table, retention_days, dry_run)
+                                self._record_table_result(cleanup_results, table, result,
+                                                          time.perf_counter() - started)
+                            except Exception as table_error:
+                                error_msg = f"Error processing table {table}: {table_error}"
+                                logger.error(error_msg)
+                                cleanup_results['errors'].append(error_msg)
+                        
+                        # Commit all changes
+                        if not dry_run:
+                            conn.commit()
+                            logger.info("Database cleanup committed successfully")
+                    
+            cleanup_results['end_time'] = datetime.now()
+            cleanup_results['duration'] = (cleanup_results['end_time'] - cleanup_results['start_time']).total_seconds()
+            
+            logger.info(f"Database cleanup completed {'(DRY RUN)' if dry_run else '(LIVE)'}. "
+                       f"Total records {'would be ' if dry_run else ''}deleted: {cleanup_results['total_deleted']}, "
+                       f"Duration: {cleanup_results['duration']:.2f} seconds")
+            
+            return cleanup_results
+            
+        except Exception as e:
+            error_msg = f"Database cleanup failed: {e}"
+            logger.error(error_msg)
+            return {'error': error_msg}
+        
+        finally:
+            self.cleanup_running = False
+    
+    def trim_oldest(self, rows_to_delete, dry_run=False):
+        """
+        Delete the oldest rows of each table regardless of age (storage budget mode)
+        
+        Args:
+            rows_to_delete (dict): {table: number of oldest rows to remove}
+            dry_run (bool): If True, only calculate what would be deleted
+            
+        Returns:
+            dict: Cleanup results in the same shape as cleanup_old_data
+        """
+        if self.cleanup_running:
+            logger.warning("Cleanup already in progress, skipping...")
+            return {'error': 'Cleanup already running'}
+        
+        self.cleanup_running = True
+        
+        try:
+            cleanup_results = {
+                'start_time': datetime.now(),
+                'dry_run': dry_run,
+                'mode': 'budget',
+                'tables_processed': {},
+                'total_deleted': 0,
+                'errors': []
+            }
             
             with get_db_connection() as conn:
                 with conn.cursor() as cursor:
-                    
-                    for table, retention_days in self.retention_days.items():
+                    for table, requested in rows_to_delete.items():
+                        started = time.perf_counter()
                         try:
-                            logger.info(f"Processing table: {table}")
-                            
-                            # Calculate cutoff date
-                            cutoff_date = datetime.now() - timedelta(days=retention_days)
-                            
-                            # Check current table size
                             cursor.execute(f"SELECT COUNT(*) as count FROM `{table}`")
                             total_records = cursor.fetchone()['count']
                             
-                            if total_records == 0:
-                                logger.info(f"Table {table} is empty, skipping...")
-                                continue
-                            
-                            # Safety check - don't process if below absolute minimum
-                            min_required = self.min_records_to_keep[table]
-                            if total_records <= min_required:
-                                logger.info(f"Table {table} has only {total_records} records (minimum: {min_required}), skipping...")
-                                cleanup_results['tables_processed'][table] = {
-                                    'total_records_before': total_records,
-                                    'records_deleted': 0,
-                                    'status': 'protected_below_minimum',
-                                    'retention_days': retention_days
-                                }
-                                continue
-                            
-                            # Get the latest N records to preserve regardless of age
-                            latest_preserve = self.latest_records_to_preserve[table]
-                            cursor.execute(f"""
-                                SELECT id FROM `{table}` 
-                                ORDER BY timestamp DESC 
-                                LIMIT %s
-                            """, (latest_preserve,))
-                            preserve_ids = [str(row['id']) for row in cursor.fetchall()]
-                            
-                            if not preserve_ids:
-                                logger.warning(f"No records found to preserve in {table}")
-                                continue
+                            # Same protections as age-based cleanup
+                            keep = max(self.min_records_to_keep[table], self.latest_records_to_preserve[table])
+                            to_delete = min(requested, max(0, total_records - keep))
+                            deleted = 0
                             
-                            # Count records that can be safely deleted (old + not in latest N)
-                            preserve_ids_str = ','.join(preserve_ids)
-                            cursor.execute(f"""
-                                SELECT COUNT(*) as count FROM `{table}` 
-                                WHERE timestamp < %s 
-                                AND id NOT IN ({preserve_ids_str})
-                            """, (cutoff_date,))
-                            records_to_delete = cursor.fetchone()['count']
-                            
-                            # Calculate what would remain after deletion
-                            remaining_after = total_records - records_to_delete
-                            
-                            # Final safety check
-                            if remaining_after < min_required:
-                                # Adjust deletion to only remove the oldest while preserving minimum + latest
-                                max_deletable = max(0, total_records - min_required)
-                                if max_deletable > 0:
-                                    # Delete oldest records while preserving both minimum count AND latest records
-                                    delete_query = f"""
-                                    DELETE FROM `{table}` 
-                                    WHERE id IN (
-                                        SELECT id FROM (
-                                            SELECT id FROM `{table}` 
-                                            WHERE id NOT IN ({preserve_ids_str})
-                                            ORDER BY timestamp ASC 
-                                            LIMIT %s
-                                        ) as temp
-                                    )
-                                    """
-                                    if not dry_run:
-                                        cursor.execute(delete_query, (max_deletable,))
-                                        actual_deleted = cursor.rowcount
-                                    else:
-                                        actual_deleted = max_deletable
-                                    
-                                    logger.info(f"Safety mode: Deleted {actual_deleted} oldest records from {table} (preserving minimum {min_required} + latest {latest_preserve})")
-                                else:
-                                    actual_deleted = 0
-                                    logger.info(f"Skipping {table}: Would breach safety limits")
-                            else:
-                                # Safe deletion - remove old records but preserve latest N
-                                delete_query = f"""
-                                DELETE FROM `{table}` 
-                                WHERE timestamp < %s 
-                                AND id NOT IN ({preserve_ids_str})
-                                """
-                                if not dry_run:
-                                    cursor.execute(delete_query, (cutoff_date,))
-                                    actual_deleted = cursor.rowcount
+                            if to_delete > 0:
+                                # ids grow with time, so everything below the n-th id is the oldest n rows
+                                cursor.execute(f"SELECT id FROM `{table}` ORDER BY id LIMIT 1 OFFSET %s", (to_delete,))
+                                cutoff_id = cursor.fetchone()['id']
+                                if dry_run:
+                                    deleted = to_delete
                                 else:
-                                    actual_deleted = records_to_delete
-                                
-                                logger.info(f"Deleted {actual_deleted} old records from {table} (latest {latest_preserve} preserved)")
+                                    cursor.execute(f"DELETE FROM `{table}` WHERE id < %s", (cutoff_id,))
+                                    deleted = cursor.rowcount
+                                    logger.info(f"Optimizing table {table}...")
+                                    cursor.execute(f"OPTIMIZE TABLE `{table}`")
                             
-                            # Record results
-                            cleanup_results['tables_processed'][table] = {
+                            logger.info(f"Budget cleanup: {'would delete' if dry_run else 'deleted'} {deleted} "
+                                        f"oldest records from {table} (requested {requested})")
+                            self._record_table_result(cleanup_results, table, {
                                 'total_records_before': total_records,
-                                'records_deleted': actual_deleted,
-                                'cutoff_date': cutoff_date,
-                                'retention_days': retention_days,
-                                'latest_preserved': latest_preserve,
-                                'final_count': total_records - actual_deleted
-                            }
-                            
-                            cleanup_results['total_deleted'] += actual_deleted
-                            
-                            # Optimize table after deletion (only if not dry run)
-                            if not dry_run and actual_deleted > 0:
-                                logger.info(f"Optimizing table {table}...")
-                                cursor.execute(f"OPTIMIZE TABLE `{table}`")
-                            
+                                'records_deleted': deleted,
+                                'records_requested': requested,
+                                'final_count': total_records - deleted
+                            }, time.perf_counter() - started)
                         except Exception as table_error:
                             error_msg = f"Error processing table {table}: {table_error}"
                             logger.error(error_msg)
                             cleanup_results['errors'].append(error_msg)
                     
-                    # Commit all changes
                     if not dry_run:
                         conn.commit()
-                        logger.info("Database cleanup committed successfully")
-                    
+            
             cleanup_results['end_time'] = datetime.now()
             cleanup_results['duration'] = (cleanup_results['end_time'] - cleanup_results['start_time']).total_seconds()
-            
-            logger.info(f"Database cleanup completed {'(DRY RUN)' if dry_run else '(LIVE)'}. "
-                       f"Total records {'would be ' if dry_run else ''}deleted: {cleanup_results['total_deleted']}, "
-                       f"Duration: {cleanup_results['duration']:.2f} seconds")
-            
             return cleanup_results
             
         except Exception as e:
-            error_msg = f"Database cleanup failed: {e}"
+            error_msg = f"Budget cleanup failed: {e}"
             logger.error(error_msg)
             return {'error': error_msg}
         
         finally:
             self.cleanup_running = False
     
-    def get_cleanup_recommendations(self):
-        """Analyze database and provide cleanup recommendations"""
+    def get_cleanup_recommendations(self, exact=True):
+        """
+        Analyze database and provide cleanup recommendations
+
+        Args:
+            exact (bool): If False, record counts are index estimates and the
+                          result carries the lowest table confidence
+        """
+        from backend.capacity import get_capacity_forecast
+        
         try:
-            stats = self.get_table_stats()
+            stats = self.get_table_stats(exact=exact)
+            # Measured size and growth against the storage budget replace fixed row-count thresholds
+            capacity = get_capacity_forecast()
+            capacity_ok = 'error' not in capacity
+            used_mb = sum(t['size_mb'] for t in capacity['tables'].values()) if capacity_ok else 0
             recommendations = {
-                'urgent_cleanup_needed': False,
+                'urgent_cleanup_needed': capacity_ok and capacity['cleanup_due'],
                 'total_records': 0,
                 'total_deletable': 0,
                 'table_analysis': {},
-                'recommended_action': 'no_action'
+                'recommended_action': 'no_action',
+                'capacity': capacity,
+                'estimated': not exact
             }
+            if not exact:
+                recommendations['confidence'] = _lowest_confidence(t['confidence'] for t in stats.values())
             
             for table, table_stats in stats.items():
                 total_records = table_stats['total_records']
@@ -285,19 +598,23 @@ class DatabaseCleaner:
                     'age_span_days': None,
                     'recommendation': 'no_action'
                 }
+                table_capacity = capacity['tables'].get(table, {}) if capacity_ok else {}
+                analysis['size_mb'] = table_capacity.get('size_mb')
+                analysis['growth_mb_per_day'] = table_capacity.get('growth_mb_per_day')
+                # Tables holding at least their even share of the space drive the budget
+                major_table = bool(used_mb) and (table_capacity.get('size_mb') or 0) >= used_mb / len(stats)
                 
                 if table_stats['oldest_record'] and table_stats['newest_record']:
                     age_span = (table_stats['newest_record'] - table_stats['oldest_record']).days
                     analysis['age_span_days'] = age_span
                 
                 # Determine status and recommendations
-                if total_records > 50000:  # Large table
-                    analysis['status'] = 'large'
-                    analysis['recommendation'] = 'cleanup_recommended'
-                elif total_records > 100000:  # Very large table
+                if major_table and capacity['cleanup_due']:  # Budget full or filling within the lead time
                     analysis['status'] = 'very_large'
                     analysis['recommendation'] = 'cleanup_urgent'
-                    recommendations['urgent_cleanup_needed'] = True
+                elif major_table and capacity['used_percent'] >= CAPACITY_TARGET_PERCENT:  # Above target use
+                    analysis['status'] = 'large'
+                    analysis['recommendation'] = 'cleanup_recommended'
                 elif deletable_records > total_records * 0.5:  # More than 50% old data
                     analysis['status'] = 'old_data_heavy'
                     analysis['recommendation'] = 'cleanup_beneficial'
@@ -307,6 +624,8 @@ class DatabaseCleaner:
             # Overall recommendation
             if recommendations['urgent_cleanup_needed']:
                 recommendations['recommended_action'] = 'cleanup_urgent'
+            elif capacity_ok and capacity['used_percent'] >= CAPACITY_TARGET_PERCENT:
+                recommendations['recommended_action'] = 'cleanup_recommended'
             elif recommendations['total_deletable'] > 10000:
                 recommendations['recommended_action'] = 'cleanup_recommended'
             elif recommendations['total_deletable'] > 5000:
@@ -320,40 +639,74 @@ class DatabaseCleaner:
 
 
 class CleanupScheduler:
-    """Automated cleanup scheduler for continuous operation"""
+    """
+    Activity-aware cleanup scheduler for continuous operation
+
+    Heavy cleanup never runs while the car is driving: when a cleanup becomes
+    due it is planned for the historically quietest hour within
+    CLEANUP_WINDOW_HORIZON_HOURS, and at that time it only starts if recent
+    velocity shows the car parked and ingest is quiet; otherwise it is deferred
+    by CLEANUP_DEFER_MINUTES. After CLEANUP_MAX_DEFER_HOURS of deferral a
+    parked car is enough, so a logger that keeps writing while parked cannot
+    postpone cleanup forever. Jobs live in a private `schedule.Scheduler`, and
+    the thread sleeps until the next job's exact deadline.
+    """
     
     def __init__(self, cleaner: DatabaseCleaner):
         self.cleaner = cleaner
         self.running = False
         self.scheduler_thread = None
+        self.jobs = None
+        self.wake = threading.Event()
+        # Cleanup kinds ('retention' / 'budget') planned but not yet run
+        self.pending = {}
+        # Cleanup kind -> time of its first deferral
+        self.deferred_since = {}
+        self.last_activity = None
         
     def start_scheduler(self):
         """Start the automated cleanup scheduler"""
+        import schedule
+
         if self.running:
             logger.warning("Scheduler already running")
             return
         
         self.running = True
+        self.jobs = schedule.Scheduler()
+        self.wake.clear()
+        logger.info("Cleanup scheduler started:")
         
-        # Schedule cleanup every 7 days at 3:00 AM
-        schedule.every(7).days.at("03:00").do(self._scheduled_cleanup)
+        if RETENTION_MODE == 'budget':
+            # Cleanup is triggered by the growth forecast, not the calendar
+            logger.info(f"- Storage budget: cleanup when the forecast crosses the budget "
+                        f"(checked every {CAPACITY_SNAPSHOT_INTERVAL}s)")
+        else:
+            self.jobs.every(CLEANUP_SCHEDULE_DAYS).days.do(self._request_cleanup, 'retention')
+            logger.info(f"- Automatic cleanup: every {CLEANUP_SCHEDULE_DAYS} days, in the quietest hour "
+                        f"of the following {CLEANUP_WINDOW_HORIZON_HOURS}h while the car is parked")
         
-        # Schedule daily stats logging at 1:00 AM
-        schedule.every().day.at("01:00").do(self._daily_stats_log)
+        # Size snapshots feed the growth forecast in both modes
+        self.jobs.every(CAPACITY_SNAPSHOT_INTERVAL).seconds.do(self._capacity_check)
         
-        logger.info("Cleanup scheduler started:")
-        logger.info("- Automatic cleanup: Every 7 days at 3:00 AM")
+        # Schedule daily stats logging at 1:00 AM
+        self.jobs.every().day.at("01:00").do(self._daily_stats_log)
         logger.info("- Daily statistics: Every day at 1:00 AM")
         
-        # Run scheduler in separate daemon thread
+        # Run scheduler in separate daemon thread, sleeping until the next deadline
         def run_schedule():
             while self.running:
                 try:
-                    schedule.run_pending()
-                    time.sleep(300)  # Check every 5 minutes
+                    # Cleanups, activity checks and snapshots all count as heavy work
+                    run_in_lane(HEAVY, self.jobs.run_pending)
+                    self.wake.wait(self.jobs.idle_seconds if self.jobs.jobs else None)
+                    self.wake.clear()
+                except LaneBusy as e:
+                    logger.info(f"Scheduled jobs deferred: {e}")
+                    self.wake.wait(e.retry_after)
                 except Exception as e:
                     logger.error(f"Scheduler error: {e}")
-                    time.sleep(60)  # Wait 1 minute before retrying
+                    self.wake.wait(60)  # Wait 1 minute before retrying
         
         self.scheduler_thread = threading.Thread(target=run_schedule, daemon=True)
         self.scheduler_thread.start()
@@ -361,8 +714,146 @@ class CleanupScheduler:
     def stop_scheduler(self):
         """Stop the automated cleanup scheduler"""
         self.running = False
-        schedule.clear()
+        if self.jobs is not None:
+            # Only our own jobs - other users of the schedule module are untouched
+            self.jobs.clear()
+        self.pending.clear()
+        self.deferred_since.clear()
+        self.wake.set()
         logger.info("Cleanup scheduler stopped")
+    
+    def _add_job(self, delay_seconds, func, *args):
+        import schedule
+        
+        def run_once():
+            func(*args)
+            return schedule.CancelJob
+        
+        self.jobs.every(max(1, int(delay_seconds))).seconds.do(run_once)
+        # Re-arm the sleeping thread so it waits for the new (possibly earlier) deadline
+        self.wake.set()
+    
+    # ----- activity -----
+    
+    def check_activity(self):
+        """
+        Recent driving and ingest activity
+
+        Returns:
+            dict: max velocity and rows/minute of the busiest table over the last
+                  CLEANUP_QUIET_MINUTES, and whether the car is parked and ingest quiet
+        """
+        since = datetime.now() - timedelta(minutes=CLEANUP_QUIET_MINUTES)
+        vehicle = get_table('vehicle_data')
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT MAX(ABS({vehicle.fields['velocity']})) AS max_velocity FROM `{vehicle.name}` "
+                    f"WHERE timestamp >= %s",
+                    (since,)
+                )
+                max_velocity = float(cursor.fetchone()['max_velocity'] or 0)
+                
+                # The threshold is per table, so adding tables does not make ingest look busier
+                recent_rows = 0
+                for table in self.cleaner.retention_days:
+                    cursor.execute(f"SELECT COUNT(*) AS count FROM `{table}` WHERE timestamp >= %s", (since,))
+                    recent_rows = max(recent_rows, cursor.fetchone()['count'])
+        
+        rows_per_minute = recent_rows / CLEANUP_QUIET_MINUTES
+        activity = {
+            'checked_at': datetime.now().isoformat(),
+            'max_velocity': round(max_velocity, 2),
+            'rows_per_minute': round(rows_per_minute, 1),
+            'parked': max_velocity <= CLEANUP_PARKED_VELOCITY,
+            'ingest_quiet': rows_per_minute <= CLEANUP_QUIET_ROWS_PER_MINUTE
+        }
+        activity['quiet'] = activity['parked'] and activity['ingest_quiet']
+        self.last_activity = activity
+        return activity
+    
+    def find_quiet_window(self, horizon_hours=None):
+        """
+        Start of the historically quietest hour within the horizon
+
+        Uses the average number of vehicle rows per hour of day over the past
+        CLEANUP_LOAD_HISTORY_DAYS; the earliest slot wins ties, so with no
+        history the cleanup is attempted right away.
+        """
+        horizon_hours = CLEANUP_WINDOW_HORIZON_HOURS if horizon_hours is None else horizon_hours
+        now = datetime.now()
+        if horizon_hours <= 0:
+            return now
+        
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT HOUR(timestamp) AS hour, COUNT(*) AS row_count
+                    FROM `{get_table('vehicle_data').name}` WHERE timestamp >= %s
+                    GROUP BY HOUR(timestamp)
+                """, (now - timedelta(days=CLEANUP_LOAD_HISTORY_DAYS),))
+                load_by_hour = {row['hour']: row['row_count'] for row in cursor.fetchall()}
+        
+        next_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        slots = [now] + [next_hour + timedelta(hours=h) for h in range(int(horizon_hours))]
+        return min(slots, key=lambda slot: load_by_hour.get(slot.hour, 0))
+    
+    # ----- cleanup planning -----
+    
+    def _request_cleanup(self, kind, horizon_hours=None):
+        """Plan a cleanup of the given kind for the quietest window (once per kind)"""
+        if kind in self.pending:
+            return
+        try:
+            window = self.find_quiet_window(horizon_hours)
+        except Exception as e:
+            logger.error(f"Could not estimate load history, attempting cleanup now: {e}")
+            window = datetime.now()
+        
+        self.pending[kind] = window
+        delay = (window - datetime.now()).total_seconds()
+        logger.info(f"🗓️  {kind.capitalize()} cleanup planned for {window:%Y-%m-%d %H:%M}")
+        self._add_job(delay, self._attempt_cleanup, kind)
+    
+    def _attempt_cleanup(self, kind):
+        """Run a planned cleanup if the car is parked and ingest quiet, else defer it"""
+        try:
+            activity = self.check_activity()
+        except Exception as e:
+            logger.error(f"Activity check failed, deferring {kind} cleanup: {e}")
+            activity = None
+        
+        deferred_since = self.deferred_since.setdefault(kind, datetime.now())
+        overdue = datetime.now() - deferred_since >= timedelta(hours=CLEANUP_MAX_DEFER_HOURS)
+        if activity is not None and not activity['quiet'] and activity['parked'] and overdue:
+            logger.warning(f"▶️  Running {kind} cleanup despite {activity['rows_per_minute']} rows/min: "
+                           f"deferred since {deferred_since:%Y-%m-%d %H:%M} and the car is parked")
+        elif activity is None or not activity['quiet']:
+            if activity is not None:
+                logger.info(f"⏸️  Deferring {kind} cleanup {CLEANUP_DEFER_MINUTES} min: "
+                            f"velocity {activity['max_velocity']}, {activity['rows_per_minute']} rows/min")
+            self.pending[kind] = datetime.now() + timedelta(minutes=CLEANUP_DEFER_MINUTES)
+            self._add_job(CLEANUP_DEFER_MINUTES * 60, self._attempt_cleanup, kind)
+            return
+        
+        self.pending.pop(kind, None)
+        self.deferred_since.pop(kind, None)
+        if kind == 'budget':
+            self._budget_cleanup()
+        else:
+            self._scheduled_cleanup()
+    
+    def get_status(self):
+        """Scheduler state, planned cleanups and the last activity check"""
+        next_run = self.jobs.next_run if self.running and self.jobs and self.jobs.jobs else None
+        return {
+            'running': self.running,
+            'mode': RETENTION_MODE,
+            'next_wakeup': next_run.isoformat() if next_run else None,
+            'pending_cleanups': {kind: at.isoformat() for kind, at in self.pending.items()},
+            'deferred_since': {kind: at.isoformat() for kind, at in self.deferred_since.items()},
+            'last_activity': self.last_activity
+        }
         
     def _scheduled_cleanup(self):
         """Internal method for scheduled cleanup execution"""
@@ -379,6 +870,40 @@ class CleanupScheduler:
         except Exception as e:
             logger.error(f"Scheduled cleanup error: {e}")
     
+    def _budget_cleanup(self):
+        """Internal method for storage budget cleanup execution"""
+        from backend.capacity import enforce_storage_budget
+        
+        try:
+            result = enforce_storage_budget(dry_run=False)
+            if 'error' in result:
+                logger.error(f"Storage budget cleanup failed: {result['error']}")
+            elif result['triggered']:
+                logger.info(f"✅ Storage budget cleanup deleted {result['total_deleted']} records "
+                           f"(forecast: full in {result['forecast']['hours_to_full']} hours)")
+                
+        except Exception as e:
+            logger.error(f"Storage budget cleanup error: {e}")
+    
+    def _capacity_check(self):
+        """Internal method recording a size snapshot and planning a budget cleanup when due"""
+        from backend.capacity import take_capacity_snapshot, get_capacity_forecast
+        
+        try:
+            take_capacity_snapshot()
+            if RETENTION_MODE != 'budget':
+                return
+            
+            forecast = get_capacity_forecast()
+            if forecast.get('cleanup_due'):
+                # Over budget: attempt now; otherwise use the quietest hour before the budget fills
+                horizon = 0 if forecast['over_budget'] else min(CLEANUP_WINDOW_HORIZON_HOURS,
+                                                                 forecast['hours_to_full'])
+                self._request_cleanup('budget', horizon_hours=horizon)
+                
+        except Exception as e:
+            logger.error(f"Capacity check error: {e}")
+    
     def _daily_stats_log(self):
         """Internal method for daily statistics logging"""
         try:
@@ -398,44 +923,74 @@ class CleanupScheduler:
             logger.error(f"Daily stats logging error: {e}")
 
 
-# Global instances
-database_cleaner = DatabaseCleaner()
-cleanup_scheduler = CleanupScheduler(database_cleaner)
+# Global instances, created on first use so importing this module stays cheap
+_database_cleaner = None
+_cleanup_scheduler = None
 
-def run_cleanup(dry_run=False):
+def get_database_cleaner():
+    """Shared DatabaseCleaner instance"""
+    global _database_cleaner
+    if _database_cleaner is None:
+        _database_cleaner = DatabaseCleaner()
+    return _database_cleaner
+
+def get_cleanup_scheduler():
+    """Shared CleanupScheduler instance"""
+    global _cleanup_scheduler
+    if _cleanup_scheduler is None:
+        _cleanup_scheduler = CleanupScheduler(get_database_cleaner())
+    return _cleanup_scheduler
+
+def run_cleanup(dry_run=False, parallel=None):
     """
     Main function to run database cleanup
     
     Args:
         dry_run (bool): If True, only calculate what would be deleted
+        parallel (int): Number of tables cleaned concurrently (default CLEANUP_PARALLEL)
         
     Returns:
         dict: Cleanup results
     """
-    return database_cleaner.cleanup_old_data(dry_run=dry_run)
+    return get_database_cleaner().cleanup_old_data(dry_run=dry_run, parallel=parallel)
 
-def get_database_stats():
-    """Get current database statistics"""
-    return database_cleaner.get_table_stats()
+def estimate_cleanup():
+    """Estimate what a cleanup would delete from index statistics (fast dry run)"""
+    return get_database_cleaner().estimate_cleanup()
 
-def get_cleanup_recommendations():
+def get_database_stats(exact=True):
+    """Get current database statistics (index estimates if exact is False)"""
+    return get_database_cleaner().get_table_stats(exact=exact)
+
+def get_cleanup_recommendations(exact=True):
     """Get cleanup recommendations based on current database state"""
-    return database_cleaner.get_cleanup_recommendations()
+    return get_database_cleaner().get_cleanup_recommendations(exact=exact)
 
 def start_automated_cleanup():
     """Start the automated cleanup scheduler"""
-    cleanup_scheduler.start_scheduler()
+    get_cleanup_scheduler().start_scheduler()
+
+def get_scheduler_status():
+    """Cleanup scheduler state and planned cleanups"""
+    return get_cleanup_scheduler().get_status()
 
 def stop_automated_cleanup():
     """Stop the automated cleanup scheduler"""
-    cleanup_scheduler.stop_scheduler()
+    if _cleanup_scheduler is not None:
+        _cleanup_scheduler.stop_scheduler()
 
 # For direct script execution
 if __name__ == "__main__":
     import argparse
+    from backend.config import configure_logging, validate_config
+
+    configure_logging()
+    validate_config()
     
     parser = argparse.ArgumentParser(description='HUST Solar Car Database Cleanup')
     parser.add_argument('--dry-run', action='store_true', help='Show what would be deleted without deleting')
+    parser.add_argument('--estimate', action='store_true',
+                        help='With --dry-run: estimate from index statistics instead of exact counts')
     parser.add_argument('--stats', action='store_true', help='Show database statistics only')
     parser.add_argument('--recommendations', action='store_true', help='Show cleanup recommendations')
     
@@ -452,6 +1007,12 @@ if __name__ == "__main__":
         print(f"  Total records: {recs['total_records']:,}")
         print(f"  Deletable records: {recs['total_deletable']:,}")
         print(f"  Recommended action: {recs['recommended_action']}")
+    elif args.dry_run and args.estimate:
+        result = estimate_cleanup()
+        if 'error' in result:
+            print(f"❌ Estimate failed: {result['error']}")
+        else:
+            print(f"✅ Would delete ~{result['total_deleted']:,} records (confidence: {result['confidence']})")
     else:
         result = run_cleanup(dry_run=args.dry_run)
         if 'error' in result:
@@ -0,0 +1,358 @@
+"""
+HUST Solar Car DB Execution Lanes
+=================================
+Keeps blocking PyMySQL calls off the eventlet hub.
+
+The server runs Socket.IO with async_mode="eventlet" but does not monkey-patch
+the standard library, so a PyMySQL query made from a greenlet (the background
+fetcher, a request handler) blocks the hub and freezes every socket until the
+query returns. `run_in_lane` runs such calls in eventlet's native thread pool
+(tpool) instead and yields to the hub while they run.
+
+Work is split into two lanes, each bounded to a number of pool threads:
+'interactive' for the live fetcher and dashboard reads, 'heavy' for cleanup,
+table statistics and exports. A multi-minute cleanup therefore never holds the
+threads the live stream needs. When sockets are already monkey-patched PyMySQL
+I/O is cooperative and calls run directly, still bounded by their lane.
+
+The lanes also partition the connection pool: DB_LIVE_RESERVED_CONNECTIONS
+connections are never handed to heavy work, whichever thread it runs on.
+The lane is whatever the enclosing `run_in_lane` call named; work outside
+any lane (startup, CLI scripts) counts as interactive, so background loops
+tag their DB calls explicitly. Waiting for a
+lane or a connection is bounded by the lane's queue timeout, and heavy calls
+are shed up front while the interactive lane is under pressure. Both raise
+LaneBusy, which the HTTP routes turn into 503 with Retry-After.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from backend.config import (DB_OFFLOAD_ENABLED, DB_INTERACTIVE_THREADS, DB_HEAVY_THREADS, MAX_DB_CONNECTIONS,
+                            DB_LIVE_RESERVED_CONNECTIONS, DB_INTERACTIVE_QUEUE_TIMEOUT, DB_HEAVY_QUEUE_TIMEOUT,
+                            DB_HEAVY_MAX_QUEUE, DB_SHED_WAIT_MS)
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+HEAVY = 'heavy'
+
+LANE_LIMITS = {INTERACTIVE: DB_INTERACTIVE_THREADS, HEAVY: DB_HEAVY_THREADS}
+LANE_QUEUE_TIMEOUTS = {INTERACTIVE: DB_INTERACTIVE_QUEUE_TIMEOUT, HEAVY: DB_HEAVY_QUEUE_TIMEOUT}
+
+# Heavy work may hold at most this many pooled connections; the rest are reserved for live reads
+HEAVY_CONNECTION_LIMIT = max(1, MAX_DB_CONNECTIONS - DB_LIVE_RESERVED_CONNECTIONS)
+LANE_CONNECTION_LIMITS = {INTERACTIVE: MAX_DB_CONNECTIONS, HEAVY: HEAVY_CONNECTION_LIMIT}
+
+# Weight of the newest sample in the recent queue wait average
+WAIT_SMOOTHING = 0.2
+
+# Seconds a client is asked to wait before retrying shed work
+RETRY_AFTER_SECONDS = 5
+
+lane_stats = {
+    lane: {'limit': limit, 'active': 0, 'waiting': 0, 'completed': 0, 'errors': 0,
+           'wait_ms_total': 0.0, 'max_wait_ms': 0.0, 'recent_wait_ms': 0.0, 'run_ms_total': 0.0,
+           'shed': 0, 'timeouts': 0, 'connections': 0, 'max_connections': 0}
+    for lane, limit in LANE_LIMITS.items()
+}
+_started = time.time()
+
+_semaphores = {}
+_tpool_ready = False
+
+# Connection slots: every connection takes a pool slot, heavy ones also a heavy slot
+_pool_slots = threading.BoundedSemaphore(MAX_DB_CONNECTIONS)
+_heavy_slots = threading.BoundedSemaphore(HEAVY_CONNECTION_LIMIT)
+_connection_lock = threading.Lock()
+_local = threading.local()
+
+
+class LaneBusy(RuntimeError):
+    """Work refused because its lane is saturated or the live lane needs the capacity"""
+
+    def __init__(self, lane, reason):
+        super().__init__(f"Database busy ({lane} lane): {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = RETRY_AFTER_SECONDS
+
+
+def _eventlet():
+    try:
+        import eventlet
+        import eventlet.patcher
+        import eventlet.semaphore
+        import eventlet.tpool
+        return eventlet
+    except ImportError:
+        return None
+
+def _cooperative(eventlet):
+    """True when blocking socket calls already yield to the eventlet hub"""
+    return eventlet.patcher.is_monkey_patched('socket')
+
+def _semaphore(eventlet, lane):
+    if lane not in _semaphores:
+        _semaphores[lane] = eventlet.semaphore.Semaphore(LANE_LIMITS[lane])
+    return _semaphores[lane]
+
+def _ensure_tpool(eventlet):
+    """Size the native pool so both lanes can run at their limits"""
+    global _tpool_ready
+    if _tpool_ready:
+        return
+    from eventlet import tpool
+    tpool.set_num_threads(max(sum(LANE_LIMITS.values()), 2))
+    _tpool_ready = True
+    logger.info(f"DB lanes using native thread pool: "
+                + ", ".join(f"{lane}={limit}" for lane, limit in LANE_LIMITS.items()))
+
+def current_lane():
+    """Lane of the calling thread: set by run_in_lane, interactive outside any lane"""
+    return getattr(_local, 'lane', None) or INTERACTIVE
+
+def _call_in_lane(lane, func, args, kwargs):
+    previous = getattr(_local, 'lane', None)
+    _local.lane = lane
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _local.lane = previous
+
+def with_current_lane(func):
+    """Wrap func to run in the caller's lane on another thread, such as an executor worker"""
+    lane = current_lane()
+
+    def call(*args, **kwargs):
+        return _call_in_lane(lane, func, args, kwargs)
+    return call
+
+@contextmanager
+def connection_slot():
+    """
+    Hold a pool slot for one connection of the calling thread's lane
+
+    Raises:
+        LaneBusy: If no slot frees up within the lane's queue timeout
+    """
+    lane = current_lane()
+    timeout = LANE_QUEUE_TIMEOUTS[lane]
+    stats = lane_stats[lane]
+    held = []
+    try:
+        if lane == HEAVY:
+            if not _heavy_slots.acquire(timeout=timeout):
+                stats['timeouts'] += 1
+                raise LaneBusy(lane, f"all {HEAVY_CONNECTION_LIMIT} heavy connections in use")
+            held.append(_heavy_slots)
+        if not _pool_slots.acquire(timeout=timeout):
+            stats['timeouts'] += 1
+            raise LaneBusy(lane, f"all {MAX_DB_CONNECTIONS} connections in use")
+        held.append(_pool_slots)
+
+        with _connection_lock:
+            stats['connections'] += 1
+            stats['max_connections'] = max(stats['max_connections'], stats['connections'])
+        try:
+            yield lane
+        finally:
+            with _connection_lock:
+                stats['connections'] -= 1
+    finally:
+        for semaphore in reversed(held):
+            semaphore.release()
+
+def under_pressure():
+    """Why heavy work should be shed right now, or None"""
+    interactive = lane_stats[INTERACTIVE]
+    if interactive['waiting'] > 0:
+        return f"{interactive['waiting']} live read(s) queued"
+    if interactive['recent_wait_ms'] > DB_SHED_WAIT_MS:
+        return f"live reads waiting {interactive['recent_wait_ms']:.0f} ms"
+    if lane_stats[HEAVY]['waiting'] >= DB_HEAVY_MAX_QUEUE:
+        return f"{lane_stats[HEAVY]['waiting']} heavy call(s) already queued"
+    return None
+
+def run_in_lane(lane, func, *args, **kwargs):
+    """
+    Run a blocking DB call without stalling the eventlet hub
+
+    Args:
+        lane (str): 'interactive' or 'heavy'
+        func: Callable doing the database work
+
+    Returns:
+        Whatever func returns; exceptions are re-raised in the caller
+
+    Raises:
+        LaneBusy: If heavy work is shed or the lane's queue wait times out
+    """
+    if lane not in LANE_LIMITS:
+        raise ValueError(f"Unknown DB lane: {lane}")
+
+    eventlet = _eventlet()
+    # Plain OS threads (cleanup scheduler, CLI scripts) never block the hub
+    if eventlet is None or (threading.current_thread() is not threading.main_thread()
+                            and not _cooperative(eventlet)):
+        return _call_in_lane(lane, func, args, kwargs)
+
+    stats = lane_stats[lane]
+    if lane == HEAVY:
+        reason = under_pressure()
+        if reason:
+            stats['shed'] += 1
+            logger.warning(f"Shedding heavy DB work: {reason}")
+            raise LaneBusy(lane, reason)
+
+    semaphore = _semaphore(eventlet, lane)
+    queued = time.perf_counter()
+    stats['waiting'] += 1
+    acquired = semaphore.acquire(timeout=LANE_QUEUE_TIMEOUTS[lane])
+    stats['waiting'] -= 1
+    started = time.perf_counter()
+    wait_ms = (started - queued) * 1000
+    stats['recent_wait_ms'] = WAIT_SMOOTHING * wait_ms + (1 - WAIT_SMOOTHING) * stats['recent_wait_ms']
+    if not acquired:
+        stats['timeouts'] += 1
+        raise LaneBusy(lane, f"no {lane} thread free within {LANE_QUEUE_TIMEOUTS[lane]}s")
+    stats['wait_ms_total'] += wait_ms
+    stats['max_wait_ms'] = max(stats['max_wait_ms'], wait_ms)
+    stats['active'] += 1
+
+    try:
+        if DB_OFFLOAD_ENABLED and not _cooperative(eventlet):
+            _ensure_tpool(eventlet)
+            return eventlet.tpool.execute(_call_in_lane, lane, func, args, kwargs)
+        return _call_in_lane(lane, func, args, kwargs)
+    except Exception:
+        stats['errors'] += 1
+        raise
+    finally:
+        stats['active'] -= 1
+        stats['completed'] += 1
+        stats['run_ms_total'] += (time.perf_counter() - started) * 1000
+        semaphore.release()
+
+def get_lane_stats():
+    """Utilization of each DB lane"""
+    result = {}
+    elapsed_ms = (time.time() - _started) * 1000
+    for lane, stats in lane_stats.items():
+        completed = stats['completed'] or 1
+        result[lane] = {
+            'limit': stats['limit'],
+            'active': stats['active'],
+            'waiting': stats['waiting'],
+            'completed': stats['completed'],
+            'errors': stats['errors'],
+            'shed': stats['shed'],
+            'timeouts': stats['timeouts'],
+            'queue_timeout_seconds': LANE_QUEUE_TIMEOUTS[lane],
+            'avg_wait_ms': round(stats['wait_ms_total'] / completed, 2),
+            'recent_wait_ms': round(stats['recent_wait_ms'], 2),
+            'max_wait_ms': round(stats['max_wait_ms'], 2),
+            'avg_run_ms': round(stats['run_ms_total'] / completed, 2),
+            # Share of the lane's threads busy since startup
+            'utilization': round(stats['run_ms_total'] / (elapsed_ms * stats['limit']), 4) if elapsed_ms else 0.0,
+            'connections': stats['connections'],
+            'connection_limit': LANE_CONNECTION_LIMITS[lane],
+            'max_connections': stats['max_connections']
+        }
+    return result
+
+
+# ----- benchmark -----
+
+# Interval of the simulated push loop, same order as the fastest poll interval
+BENCH_TICK_SECONDS = 0.05
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def _measure_push_latency(eventlet, seconds, heavy_work=None):
+    """Run a simulated push loop for `seconds`, optionally alongside heavy_work; returns lateness in ms"""
+    lateness = []
+    done = [False]
+
+    def push_loop():
+        while not done[0]:
+            start = time.perf_counter()
+            eventlet.sleep(BENCH_TICK_SECONDS)
+            lateness.append((time.perf_counter() - start - BENCH_TICK_SECONDS) * 1000)
+
+    ticker = eventlet.spawn(push_loop)
+    if heavy_work is not None:
+        eventlet.spawn(heavy_work).wait()
+    else:
+        eventlet.sleep(seconds)
+    done[0] = True
+    ticker.wait()
+    return lateness
+
+def benchmark(seconds=5, use_cleanup=False):
+    """
+    Compare push-loop latency idle, during a heavy query on the hub, and during
+    the same query in the heavy lane
+
+    The heavy work is `SELECT SLEEP(seconds)` (a stand-in for a long DELETE or
+    OPTIMIZE, which block on the socket the same way) or, with use_cleanup, a
+    real cleanup dry run.
+    """
+    eventlet = _eventlet()
+    if eventlet is None:
+        raise RuntimeError("eventlet is required for the benchmark")
+    from backend.helpers import get_db_connection
+
+    def heavy_query():
+        if use_cleanup:
+            from backend.database_cleanup import run_cleanup
+            return run_cleanup(dry_run=True)
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT SLEEP(%s)", (seconds,))
+                return cursor.fetchall()
+
+    results = {
+        'idle': _measure_push_latency(eventlet, seconds),
+        'blocking': _measure_push_latency(eventlet, seconds, heavy_query),
+        'heavy_lane': _measure_push_latency(eventlet, seconds, lambda: run_in_lane(HEAVY, heavy_query))
+    }
+    return {
+        name: {
+            'ticks': len(values),
+            'p50_ms': round(_percentile(values, 50), 2),
+            'p99_ms': round(_percentile(values, 99), 2),
+            'max_ms': round(max(values), 2) if values else 0.0
+        }
+        for name, values in results.items()
+    }
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+    from backend.config import configure_logging, validate_config
+
+    configure_logging()
+    validate_config()
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car DB Execution Lanes')
+    parser.add_argument('--benchmark', action='store_true', help='Measure push latency during a heavy query')
+    parser.add_argument('--seconds', type=int, default=5, help='Length of the heavy query')
+    parser.add_argument('--cleanup', action='store_true', help='Use a real cleanup dry run as the heavy query')
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(f"⏱️  Push loop every {BENCH_TICK_SECONDS * 1000:.0f} ms, lateness per tick:")
+        for name, result in benchmark(seconds=args.seconds, use_cleanup=args.cleanup).items():
+            print(f"  {name:<11} ticks={result['ticks']:<5} p50={result['p50_ms']:>8} ms  "
+                  f"p99={result['p99_ms']:>8} ms  max={result['max_ms']:>8} ms")
+    else:
+        for lane, limit in LANE_LIMITS.items():
+            print(f"  {lane}: {limit} thread(s)")
@@ -0,0 +1,198 @@
+"""
+HUST Solar Car Derived Metrics Engine
+=====================================
+Server-side energy metrics computed incrementally from new telemetry rows.
+
+Maintains cumulative solar energy in (MPPT), battery energy discharged and
+charged (signed V x I, so regen and solar charging are not counted as energy
+out), rolling average power over configurable windows, net energy balance and
+efficiency. Each batch of new rows is processed with vectorized NumPy; results
+are published as a low-volume `derived_metrics` stream and via `/derived`.
+NumPy is imported on first use so it does not slow down startup.
+"""
+
+import logging
+import time
+from collections import deque
+from threading import Lock
+from datetime import datetime
+from backend.config import (DERIVED_WINDOWS_SECONDS, DERIVED_PUBLISH_INTERVAL, DERIVED_MAX_GAP_SECONDS,
+                            BATTERY_DISCHARGE_SIGN)
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamps_to_seconds(rows):
+    """Convert row timestamps ('%Y-%m-%d %H:%M:%S' strings or datetimes) to epoch seconds"""
+    import numpy as np
+
+    stamps = np.array([str(row['timestamp']) for row in rows], dtype='datetime64[s]')
+    return stamps.astype('int64').astype(np.float64)
+
+
+def _column(rows, name):
+    import numpy as np
+
+    return np.array([float(row.get(name) or 0) for row in rows], dtype=np.float64)
+
+
+class PowerIntegrator:
+    """Trapezoidal energy integration and rolling averages for one power signal"""
+
+    def __init__(self, max_window):
+        # Signed energy (positive minus negative)
+        self.energy_wh = 0.0
+        # Energy while the signal was positive / negative (both >= 0)
+        self.positive_wh = 0.0
+        self.negative_wh = 0.0
+        self.last_t = None
+        self.last_p = None
+        self.max_window = max_window
+        # (timestamp, power) samples kept for rolling averages
+        self.samples = deque()
+
+    def add(self, t, p):
+        import numpy as np
+
+        if t.size == 0:
+            return
+
+        if self.last_t is not None:
+            t_all = np.concatenate(([self.last_t], t))
+            p_all = np.concatenate(([self.last_p], p))
+        else:
+            t_all, p_all = t, p
+
+        dt = np.diff(t_all)
+        # Ignore gaps we did not observe (car off, fetcher suspended) and out-of-order rows
+        dt = np.where((dt > 0) & (dt <= DERIVED_MAX_GAP_SECONDS), dt, 0.0)
+        self.energy_wh += float(np.sum((p_all[1:] + p_all[:-1]) * 0.5 * dt)) / 3600.0
+        positive = np.clip(p_all, 0, None)
+        negative = np.clip(-p_all, 0, None)
+        self.positive_wh += float(np.sum((positive[1:] + positive[:-1]) * 0.5 * dt)) / 3600.0
+        self.negative_wh += float(np.sum((negative[1:] + negative[:-1]) * 0.5 * dt)) / 3600.0
+
+        self.last_t = float(t[-1])
+        self.last_p = float(p[-1])
+
+        self.samples.extend(zip(t.tolist(), p.tolist()))
+        cutoff = self.last_t - self.max_window
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+
+    def rolling_means(self, windows):
+        import numpy as np
+
+        if not self.samples:
+            return {window: None for window in windows}
+        t, p = np.array(self.samples).T
+        means = {}
+        for window in windows:
+            mask = t >= self.last_t - window
+            means[window] = round(float(p[mask].mean()), 1) if mask.any() else None
+        return means
+
+
+class DerivedMetricsEngine:
+    """Incremental energy/power/efficiency metrics over the telemetry stream"""
+
+    def __init__(self, windows=None):
+        self.windows = sorted(windows or DERIVED_WINDOWS_SECONDS)
+        # An empty list is reported by validate_config(); don't fail at import first
+        max_window = self.windows[-1] if self.windows else 0
+        self.solar = PowerIntegrator(max_window)
+        self.battery = PowerIntegrator(max_window)
+        self.last_ids = {}
+        self.lock = Lock()
+        self.started_at = datetime.now()
+        self.last_published = 0
+        self.dirty = False
+
+    def _fresh(self, key, rows):
+        """Drop rows already processed (the fetcher can re-send its window)"""
+        last_id = self.last_ids.get(key)
+        fresh = [row for row in rows if last_id is None or row['id'] > last_id]
+        if fresh:
+            self.last_ids[key] = fresh[-1]['id']
+        return fresh
+
+    def ingest(self, new_by_table):
+        """
+        Process new rows from the background fetcher
+
+        Args:
+            new_by_table (dict): {payload key: rows oldest first}
+        """
+        try:
+            with self.lock:
+                mppt_rows = self._fresh('mppt_data', new_by_table.get('mppt_data', []))
+                if mppt_rows:
+                    self.solar.add(_timestamps_to_seconds(mppt_rows), _column(mppt_rows, 'MPPT_total_watt'))
+                    self.dirty = True
+
+                battery_rows = self._fresh('battery_data', new_by_table.get('battery_data', []))
+                if battery_rows:
+                    # Signed: positive while discharging, negative while charging (regen, solar surplus)
+                    power = (BATTERY_DISCHARGE_SIGN * _column(battery_rows, 'battery_volt')
+                             * _column(battery_rows, 'battery_current'))
+                    self.battery.add(_timestamps_to_seconds(battery_rows), power)
+                    self.dirty = True
+        except Exception as e:
+            logger.error(f"Derived metrics update failed: {e}")
+
+    def snapshot(self):
+        """Current derived metrics"""
+        with self.lock:
+            solar_w = self.solar.last_p or 0.0
+            battery_w = self.battery.last_p or 0.0
+            solar_means = self.solar.rolling_means(self.windows)
+            battery_means = self.battery.rolling_means(self.windows)
+
+            # battery_w is signed (positive = discharging); the car draws solar + battery_w,
+            # so solar minus consumption is simply the power flowing into the pack
+            rolling = {}
+            for window in self.windows:
+                solar_avg, battery_avg = solar_means[window], battery_means[window]
+                rolling[f"{window}s"] = {
+                    'solar_power_w': solar_avg,
+                    'battery_power_w': battery_avg,
+                    'power_balance_w': round(-battery_avg, 1) if battery_avg is not None else None
+                }
+
+            if battery_w > 0:
+                efficiency = round(min(solar_w / battery_w * 100, 999), 1) if solar_w else 0
+            else:
+                # Pack idle or charging: solar covers the whole demand
+                efficiency = 999 if solar_w else 0
+
+            return {
+                'energy_in_wh': round(self.solar.energy_wh, 2),
+                'energy_out_wh': round(self.battery.positive_wh, 2),
+                'energy_charged_wh': round(self.battery.negative_wh, 2),
+                'net_energy_wh': round(-self.battery.energy_wh, 2),
+                'solar_power_w': round(solar_w, 1),
+                'battery_power_w': round(battery_w, 1),
+                'power_balance_w': round(-battery_w, 1),
+                'efficiency_pct': efficiency,
+                'energy_efficiency_pct': (round(self.solar.energy_wh / self.battery.positive_wh * 100, 1)
+                                          if self.battery.positive_wh else None),
+                'rolling': rolling,
+                'since': self.started_at.isoformat()
+            }
+
+    def publish_if_due(self, socketio):
+        """Emit `derived_metrics` at most every DERIVED_PUBLISH_INTERVAL seconds when changed"""
+        now = time.time()
+        if not self.dirty or now - self.last_published < DERIVED_PUBLISH_INTERVAL:
+            return
+        self.last_published = now
+        self.dirty = False
+        socketio.emit("derived_metrics", self.snapshot())
+
+
+# Global instance fed by the background fetcher
+derived_metrics_engine = DerivedMetricsEngine()
+
+def get_derived_metrics():
+    """Get the current derived energy metrics"""
+    return derived_metrics_engine.snapshot()
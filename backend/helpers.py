@@ -1,16 +1,42 @@
 import pymysql
 import datetime
 import logging
+import time
+from threading import Lock
 from contextlib import contextmanager
-from backend.config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, MAX_DB_CONNECTIONS
+from backend.tables import TABLE_REGISTRY, latest_statement, use_valid_row_flag
+from backend.segment_log import segment_store
+from backend.db_executor import run_in_lane, connection_slot, LaneBusy, INTERACTIVE
+from backend.config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, MAX_DB_CONNECTIONS, SEGMENT_LOG_ENABLED
 
 logger = logging.getLogger(__name__)
 
 # Create connection pool for better performance
 connection_pool = None
+pool_lock = Lock()
+
+# Retry delays (seconds) while MySQL is still coming up at boot
+POOL_RETRY_MIN_SECONDS = 1
+POOL_RETRY_MAX_SECONDS = 30
+
+# Readiness of the connection pool, reported on /health
+pool_state = {
+    'state': 'starting',
+    'attempts': 0,
+    'last_error': None,
+    'ready_after_seconds': None
+}
+_process_started = time.time()
 
 def initialize_connection_pool():
     """Initialize the database connection pool"""
+    global connection_pool
+    with pool_lock:
+        if connection_pool is not None:
+            return
+        _create_connection_pool()
+
+def _create_connection_pool():
     global connection_pool
     try:
         connection_pool = pymysql.pooling.ConnectionPool(
@@ -25,25 +51,61 @@ def initialize_connection_pool():
             autocommit=True
         )
         logger.info(f"Database connection pool initialized with {MAX_DB_CONNECTIONS} connections")
+        _detect_valid_row_flag()
+        pool_state['state'] = 'ready'
+        pool_state['last_error'] = None
+        pool_state['ready_after_seconds'] = round(time.time() - _process_started, 2)
     except Exception as e:
         logger.error(f"Failed to initialize connection pool: {e}")
+        pool_state['last_error'] = str(e)
         raise
 
+def warm_connection_pool(socketio, stop_event):
+    """
+    Background task creating the pool without holding up startup
+
+    Retries with exponential backoff while MySQL is unreachable, so the server
+    (and the dashboard UI) come up immediately and data follows once the
+    database is available.
+    """
+    delay = POOL_RETRY_MIN_SECONDS
+    while connection_pool is None and not stop_event.is_set():
+        pool_state['attempts'] += 1
+        try:
+            run_in_lane(INTERACTIVE, initialize_connection_pool)
+            run_in_lane(INTERACTIVE, health_check)
+            return
+        except Exception:
+            pool_state['state'] = 'retrying'
+            logger.warning(f"Database not reachable yet, retrying in {delay}s")
+            socketio.sleep(delay)
+            delay = min(delay * 2, POOL_RETRY_MAX_SECONDS)
+
+def get_readiness():
+    """Readiness of the database pool for /health"""
+    return dict(pool_state)
+
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    conn = None
+    """Context manager for database connections (bounded by the caller's DB lane)"""
     try:
-        if connection_pool is None:
-            initialize_connection_pool()
-        conn = connection_pool.get_connection()
-        yield conn
+        with connection_slot():
+            conn = None
+            try:
+                if connection_pool is None:
+                    initialize_connection_pool()
+                conn = connection_pool.get_connection()
+                yield conn
+            finally:
+                # Returned to the pool before the slot is released
+                if conn:
+                    conn.close()
+    except LaneBusy as e:
+        logger.warning(str(e))
+        raise
     except Exception as e:
         logger.error(f"Database connection error: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def connect_db():
     """Legacy function for backwards compatibility"""
@@ -57,60 +119,55 @@ def ts(rows):
             r["timestamp"] = r["timestamp"].strftime("%Y-%m-%d %H:%M:%S")
     return rows
 
-BATTERY = """
-SELECT id, timestamp,
-       Battery_Volt               AS battery_volt,
-       Battery_Current            AS battery_current,
-       Battery_Cell_Low_Volt      AS battery_cell_low_volt,
-       Battery_Cell_High_Volt     AS battery_cell_high_volt,
-       Battery_Cell_Average_Volt  AS battery_cell_average_volt,
-       Battery_Cell_Low_Temp      AS battery_cell_low_temp,
-       Battery_Cell_High_Temp     AS battery_cell_high_temp,
-       Battery_Cell_Average_Temp  AS battery_cell_average_temp,
-       Battery_Cell_High_Temp_ID  AS battery_cell_high_temp_ID,
-       Battery_Cell_Low_Temp_ID   AS battery_cell_low_temp_ID
-FROM `Battery Data Table`
-WHERE Battery_Volt <> 0           -- ← skip zero rows
-ORDER BY id DESC
-LIMIT %s;
-"""
-
-MOTOR = """
-SELECT id, timestamp,
-       Motor_Current        AS motor_current,
-       Motor_Temp           AS motor_temp,
-       Motor_Controller_Temp AS motor_controller_temp
-FROM `Motor Data Table`
-WHERE Motor_Temp <> 0 OR Motor_Current <> 0
-ORDER BY id DESC
-LIMIT %s;
-"""
-
-MPPT = """
-SELECT id, timestamp,
-       MPPT1_Watt      AS MPPT1_watt,
-       MPPT2_Watt      AS MPPT2_watt,
-       MPPT3_Watt      AS MPPT3_watt,
-       MPPT_Total_Watt AS MPPT_total_watt
-FROM `MPPT Data Table`
-WHERE MPPT_Total_Watt <> 0
-ORDER BY id DESC
-LIMIT %s;
-"""
-
-VEHICLE = """
-SELECT id, timestamp,
-       Velocity           AS velocity,
-       Distance_Travelled AS distance_travelled
-FROM `Vehicle Data Table`
-WHERE Velocity <> 0
-ORDER BY id DESC
-LIMIT %s;
-"""
-
-def fetch_all_data(limit=20):
-    """Fetch all telemetry data with improved error handling"""
-    out = {"battery_data": [], "motor_data": [], "mppt_data": [], "vehicle_data": []}
+def _telemetry_tables():
+    return {key: (table.name, table.select_list(), table.row_filter) for key, table in TABLE_REGISTRY.items()}
+
+# payload key -> (table, selected columns, valid-row filter), generated from the registry
+TELEMETRY_TABLES = _telemetry_tables()
+
+def _detect_valid_row_flag():
+    """Switch live queries to the indexed valid_row column where migration 2 is applied"""
+    from backend.migrations import valid_row_tables
+
+    try:
+        conn = connection_pool.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                keys = valid_row_tables(cursor)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.warning(f"Could not check for the valid_row column, using the plain filters: {e}")
+        return
+    use_valid_row_flag(keys)
+    # Updated in place: other modules hold a reference to this dict
+    TELEMETRY_TABLES.update(_telemetry_tables())
+    if keys:
+        logger.info(f"Live queries filter on valid_row for: {', '.join(keys)}")
+
+# payload key -> {output field: SQL expression}, used for projection
+TABLE_FIELDS = {key: table.fields for key, table in TABLE_REGISTRY.items()}
+
+def projection(key, fields=None):
+    """
+    SELECT list for a subset of a table's fields (id and timestamp are always included)
+
+    Raises:
+        ValueError: If a requested field does not exist in the table
+    """
+    return TABLE_REGISTRY[key].select_list(fields)
+
+def fetch_all_data(limit=20, fields=None):
+    """
+    Fetch all telemetry data with improved error handling
+
+    Args:
+        limit (int): Newest valid rows per table
+        fields (dict): Optional {payload key: fields} projection (see tables.resolve_fields);
+                       only the listed tables are queried
+    """
+    keys = list(fields) if fields else list(TABLE_REGISTRY)
+    out = {key: [] for key in keys}
     
     # Validate limit parameter
     if not isinstance(limit, int) or limit < 1 or limit > 1000:
@@ -121,47 +178,107 @@ def fetch_all_data(limit=20):
         with get_db_connection() as conn:
             with conn.cursor() as c:
                 # Execute queries with error handling for each
-                try:
-                    c.execute(BATTERY, (limit,))
-                    out["battery_data"] = ts(c.fetchall())
-                except Exception as e:
-                    logger.error(f"Error fetching battery data: {e}")
-                
-                try:
-                    c.execute(MOTOR, (limit,))
-                    out["motor_data"] = ts(c.fetchall())
-                except Exception as e:
-                    logger.error(f"Error fetching motor data: {e}")
-                
-                try:
-                    c.execute(MPPT, (limit,))
-                    out["mppt_data"] = ts(c.fetchall())
-                except Exception as e:
-                    logger.error(f"Error fetching MPPT data: {e}")
-                
-                try:
-                    c.execute(VEHICLE, (limit,))
-                    out["vehicle_data"] = ts(c.fetchall())
-                except Exception as e:
-                    logger.error(f"Error fetching vehicle data: {e}")
+                for key in keys:
+                    try:
+                        c.execute(latest_statement(key, fields[key] if fields else None), (limit,))
+                        out[key] = ts(c.fetchall())
+                    except Exception as e:
+                        logger.error(f"Error fetching {key}: {e}")
                     
-        logger.debug(f"Successfully fetched data with limit {limit}")
+        logger.debug("Successfully fetched data with limit %s", limit)
         
+    except LaneBusy:
+        # Pool saturated, not an outage - let the caller shed or retry
+        raise
     except Exception as e:
         logger.error(f"Database connection error in fetch_all_data: {e}")
-        # Return empty data structure instead of crashing
+        # Serve the newest rows from the local segment log instead of crashing
+        if SEGMENT_LOG_ENABLED:
+            segment_store.mark_outage()
+            try:
+                return segment_store.latest(limit, fields)
+            except Exception as e:
+                logger.error(f"Failed to read the segment log: {e}")
+        return out
+    
+    if SEGMENT_LOG_ENABLED:
+        segment_store.mark_available()
+        # Only complete rows are mirrored, projected reads would leave gaps
+        if not fields:
+            try:
+                segment_store.mirror(out)
+            except Exception as e:
+                logger.error(f"Failed to mirror telemetry to the segment log: {e}")
     
     return out
 
+def fetch_rows_by_id(key, ids, cursor=None):
+    """Fetch valid rows of one telemetry table by primary key, newest first"""
+    if not ids:
+        return []
+    table, columns, valid_filter = TELEMETRY_TABLES[key]
+    placeholders = ",".join(["%s"] * len(ids))
+    query = (f"SELECT {columns} FROM `{table}` "
+             f"WHERE id IN ({placeholders}) AND ({valid_filter}) ORDER BY id DESC")
+
+    if cursor is not None:
+        cursor.execute(query, tuple(ids))
+        return ts(cursor.fetchall())
+
+    with get_db_connection() as conn:
+        with conn.cursor() as c:
+            c.execute(query, tuple(ids))
+            return ts(c.fetchall())
+
+def fetch_page(key, before_id=None, after_id=None, page_size=100, fields=None):
+    """
+    Keyset-paginated rows of one table using the primary key
+
+    Without after_id pages run newest-first below before_id; with only after_id
+    they run oldest-first above it. Each page is a single PK range scan no matter
+    how deep into the table it is.
+
+    Returns:
+        dict: {'rows': [...], 'next': cursor dict for the following page or None}
+    """
+    table, _, valid_filter = TELEMETRY_TABLES[key]
+    conditions = [f"({valid_filter})"]
+    params = []
+    if before_id is not None:
+        conditions.append("id < %s")
+        params.append(before_id)
+    if after_id is not None:
+        conditions.append("id > %s")
+        params.append(after_id)
+
+    ascending = after_id is not None and before_id is None
+    query = (f"SELECT {projection(key, fields)} FROM `{table}` "
+             f"WHERE {' AND '.join(conditions)} "
+             f"ORDER BY id {'ASC' if ascending else 'DESC'} LIMIT %s")
+    params.append(page_size + 1)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as c:
+            c.execute(query, tuple(params))
+            rows = ts(c.fetchall())
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_id = rows[-1]['id']
+        if ascending:
+            next_cursor = {'after_id': last_id}
+        else:
+            next_cursor = {'before_id': last_id}
+            if after_id is not None:
+                next_cursor['after_id'] = after_id
+
+    return {'rows': rows, 'next': next_cursor}
+
 def validate_table_name(table_name):
     """Validate table names to prevent injection"""
-    allowed_tables = {
-        'battery': '`Battery Data Table`',
-        'motor': '`Motor Data Table`',
-        'mppt': '`MPPT Data Table`',
-        'vehicle': '`Vehicle Data Table`'
-    }
-    return allowed_tables.get(table_name)
+    table = TABLE_REGISTRY.get(f"{table_name}_data")
+    return f"`{table.name}`" if table else None
 
 def health_check():
     """Check database connectivity for health endpoint"""
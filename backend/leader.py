@@ -0,0 +1,212 @@
+"""
+HUST Solar Car Poller Leader Election
+=====================================
+Ensures only one process polls the database when several Socket.IO workers
+serve the dashboard. Workers share broadcasts through the Socket.IO message
+queue (SOCKETIO_MESSAGE_QUEUE); one of them holds a lock (MySQL GET_LOCK or a
+lock file) and runs the background fetcher. When the leader dies its lock is
+released and a follower takes over on its next heartbeat.
+
+Each worker also publishes its connected-client count so the leader can
+suspend polling only when nobody is connected to any worker. The engines fed
+by the fetcher (derived metrics, rolling statistics, alerts) only run on the
+leader; followers read their state through shared_state.py.
+"""
+
+import os
+import socket
+import logging
+import time
+from pathlib import Path
+import pymysql
+from backend.config import (DB_HOST, DB_USER, DB_PASSWORD, DB_NAME,
+                            LEADER_ELECTION, LEADER_LOCK_NAME, LEADER_LOCK_FILE,
+                            LEADER_HEARTBEAT_SECONDS)
+from backend.socket_events import get_client_count
+from backend.db_executor import run_in_lane, LaneBusy, INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# Worker presence rows/files older than this many heartbeats are ignored
+PRESENCE_TIMEOUT_HEARTBEATS = 3
+
+WORKERS_TABLE = 'poller_workers'
+
+
+class MySQLLeaderElector:
+    """Leader election via MySQL GET_LOCK on a dedicated (non-pooled) connection"""
+
+    def __init__(self, lock_name=LEADER_LOCK_NAME):
+        self.lock_name = lock_name
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.cluster_clients = 0
+        self.conn = None
+
+    def _connect(self):
+        # Pooled connections reset their session, which would drop the named lock
+        self.conn = pymysql.connect(
+            host=DB_HOST,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            database=DB_NAME,
+            cursorclass=pymysql.cursors.DictCursor,
+            autocommit=True
+        )
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS `{WORKERS_TABLE}` (
+                    worker_id VARCHAR(128) NOT NULL PRIMARY KEY,
+                    clients INT NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+    def heartbeat(self):
+        """Publish presence, acquire or verify leadership and refresh the cluster client count"""
+        try:
+            if self.conn is None:
+                self._connect()
+
+            with self.conn.cursor() as cursor:
+                cursor.execute(f"""
+                    INSERT INTO `{WORKERS_TABLE}` (worker_id, clients, updated_at) VALUES (%s, %s, NOW())
+                    ON DUPLICATE KEY UPDATE clients = VALUES(clients), updated_at = NOW()
+                """, (self.worker_id, get_client_count()))
+
+                if self.is_leader:
+                    cursor.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID() AS held", (self.lock_name,))
+                    held = bool(cursor.fetchone()['held'])
+                    if not held:
+                        logger.warning(f"Worker {self.worker_id} lost poller leadership")
+                    self.is_leader = held
+                else:
+                    cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (self.lock_name,))
+                    if cursor.fetchone()['acquired'] == 1:
+                        logger.info(f"Worker {self.worker_id} became poller leader")
+                        self.is_leader = True
+
+                cursor.execute(f"""
+                    SELECT COALESCE(SUM(clients), 0) AS clients FROM `{WORKERS_TABLE}`
+                    WHERE updated_at > NOW() - INTERVAL %s SECOND
+                """, (LEADER_HEARTBEAT_SECONDS * PRESENCE_TIMEOUT_HEARTBEATS,))
+                self.cluster_clients = int(cursor.fetchone()['clients'])
+
+        except Exception as e:
+            # Losing the connection releases the lock server-side
+            logger.error(f"Leader election heartbeat failed: {e}")
+            self.is_leader = False
+            self.release()
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+        self.is_leader = False
+
+
+class FileLeaderElector:
+    """Leader election via an exclusive flock on a local lock file (single host only)"""
+
+    def __init__(self, lock_file=LEADER_LOCK_FILE):
+        import fcntl  # POSIX only
+        self.fcntl = fcntl
+        self.lock_file = Path(lock_file)
+        self.presence_dir = self.lock_file.with_name(self.lock_file.name + '.workers')
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.is_leader = False
+        self.cluster_clients = 0
+        self.fd = None
+
+    def heartbeat(self):
+        """Publish presence, acquire leadership if free and refresh the cluster client count"""
+        try:
+            self.presence_dir.mkdir(parents=True, exist_ok=True)
+            (self.presence_dir / self.worker_id).write_text(str(get_client_count()))
+
+            if not self.is_leader:
+                fd = open(self.lock_file, 'a')
+                try:
+                    self.fcntl.flock(fd, self.fcntl.LOCK_EX | self.fcntl.LOCK_NB)
+                except OSError:
+                    fd.close()
+                else:
+                    # The OS releases the lock when this process exits
+                    self.fd = fd
+                    self.is_leader = True
+                    logger.info(f"Worker {self.worker_id} became poller leader")
+
+            cutoff = time.time() - LEADER_HEARTBEAT_SECONDS * PRESENCE_TIMEOUT_HEARTBEATS
+            total = 0
+            for entry in self.presence_dir.iterdir():
+                try:
+                    if entry.stat().st_mtime >= cutoff:
+                        total += int(entry.read_text() or 0)
+                    elif self.is_leader:
+                        entry.unlink()
+                except (OSError, ValueError):
+                    continue
+            self.cluster_clients = total
+
+        except Exception as e:
+            logger.error(f"Leader election heartbeat failed: {e}")
+
+    def release(self):
+        if self.fd is not None:
+            try:
+                self.fcntl.flock(self.fd, self.fcntl.LOCK_UN)
+                self.fd.close()
+            except Exception:
+                pass
+            self.fd = None
+        try:
+            (self.presence_dir / self.worker_id).unlink()
+        except OSError:
+            pass
+        self.is_leader = False
+
+
+def _create_elector():
+    if LEADER_ELECTION == 'mysql':
+        return MySQLLeaderElector()
+    if LEADER_ELECTION == 'file':
+        try:
+            return FileLeaderElector()
+        except ImportError:
+            logger.warning("File leader election needs fcntl (POSIX), falling back to MySQL GET_LOCK")
+            return MySQLLeaderElector()
+    return None
+
+
+# Global instance (None when running a single worker)
+leader_elector = _create_elector()
+
+def is_poller_leader():
+    """True if this process should poll the database"""
+    return leader_elector is None or leader_elector.is_leader
+
+def get_cluster_client_count():
+    """Connected clients across all workers (this worker only without leader election)"""
+    if leader_elector is None:
+        return get_client_count()
+    # Include local changes since the last heartbeat
+    return max(leader_elector.cluster_clients, get_client_count())
+
+def run_leader_election(socketio, stop_event):
+    """Heartbeat loop; run as a Socket.IO background task in every worker"""
+    if leader_elector is None:
+        return
+
+    logger.info(f"Leader election enabled ({LEADER_ELECTION}), worker {leader_elector.worker_id}")
+    while not stop_event.is_set():
+        try:
+            # The MySQL elector's queries block like any other PyMySQL call
+            run_in_lane(INTERACTIVE, leader_elector.heartbeat)
+        except LaneBusy as e:
+            logger.warning(f"Leader heartbeat skipped: {e}")
+        socketio.sleep(LEADER_HEARTBEAT_SECONDS)
+
+    leader_elector.release()
@@ -0,0 +1,290 @@
+"""
+HUST Solar Car Log Pipeline
+===========================
+Asynchronous, rotating logging that keeps disk writes off the request path.
+
+Application threads only put records on an in-memory queue (QueueHandler); a
+QueueListener thread formats them and writes to the console and the log file.
+The listener and its queue use the unpatched threading/queue modules, so the
+writes stay on a real OS thread even under a monkey-patching eventlet worker.
+The file rotates by size or time and rotated files are gzip-compressed, so
+`app.log` cannot fill the SD card. High-frequency DEBUG lines can be sampled
+per logger (LOG_SAMPLING) before they are even queued, and LOG_FORMAT=json
+switches to one JSON object per line for log shippers.
+
+Usage:
+    python -m backend.log_pipeline --benchmark
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from threading import Lock
+
+# Records queued beyond this are dropped rather than blocking the caller
+QUEUE_SIZE = 10000
+
+
+def _native_modules():
+    """
+    The unpatched threading and queue modules
+
+    Under a monkey-patching eventlet worker (gunicorn -k eventlet) threading
+    and queue are green, so a plain QueueListener would write files on the
+    hub again. eventlet.patcher.original returns the real modules.
+    """
+    try:
+        import eventlet.patcher
+    except ImportError:
+        import threading
+        return threading, queue
+    return eventlet.patcher.original('threading'), eventlet.patcher.original('queue')
+
+
+class NativeQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose thread is always a real OS thread"""
+
+    def start(self):
+        threading, _ = _native_modules()
+        self._thread = threading.Thread(target=self._monitor, name='log-pipeline', daemon=True)
+        self._thread.start()
+
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep 1 in N records below INFO for configured loggers
+
+    Args:
+        rates (dict): {logger name prefix: N}
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.counters = {}
+        self.lock = Lock()
+
+    def _rate(self, name):
+        # Longest matching prefix wins, so 'backend.helpers' overrides 'backend'
+        best = None
+        for prefix in self.rates:
+            if (name == prefix or name.startswith(prefix + '.')) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return self.rates[best] if best else 1
+
+    def filter(self, record):
+        if record.levelno >= logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        if rate <= 1:
+            return True
+        with self.lock:
+            count = self.counters.get(record.name, 0)
+            self.counters[record.name] = count + 1
+        return count % rate == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Only merge the arguments into the message (they may be mutated later);
+        # formatting, including tracebacks, is left to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except (queue.Full, _native_modules()[1].Full):
+            DroppingQueueHandler.dropped += 1
+
+
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+def parse_sampling(spec):
+    """'backend.helpers:100,backend.routes:10' -> {'backend.helpers': 100, 'backend.routes': 10}"""
+    rates = {}
+    for item in spec.split(','):
+        name, _, rate = item.strip().partition(':')
+        if name and rate:
+            rates[name.strip()] = max(1, int(rate))
+    return rates
+
+def build_file_handler(path, rotation='size', max_bytes=10 * 1024 * 1024, backup_count=5,
+                       when='midnight', compress=True):
+    """Rotating file handler (by size or time) with optional gzip of rotated files"""
+    if rotation == 'time':
+        handler = logging.handlers.TimedRotatingFileHandler(path, when=when, backupCount=backup_count,
+                                                            encoding='utf-8', delay=True)
+    else:
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                       encoding='utf-8', delay=True)
+    if compress:
+        handler.namer = lambda name: name + '.gz'
+        handler.rotator = _gzip_rotator
+    return handler
+
+def start_log_pipeline(level, path='app.log', fmt='text', rotation='size', max_bytes=10 * 1024 * 1024,
+                       backup_count=5, when='midnight', compress=True, sampling=None, console=True):
+    """
+    Install a QueueHandler on the root logger and start the background listener
+
+    Returns:
+        logging.handlers.QueueListener: The running listener (stopped at exit)
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if fmt == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    handlers = [build_file_handler(path, rotation, max_bytes, backup_count, when, compress)]
+    if console:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # A native queue: put_nowait never blocks the caller, get blocks only the listener thread
+    log_queue = _native_modules()[1].Queue(QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+
+    _listener = NativeQueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_log_pipeline)
+    return _listener
+
+def stop_log_pipeline():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def get_log_stats():
+    """Queue depth and records dropped because the queue was full"""
+    return {
+        'queued': _listener.queue.qsize() if _listener else 0,
+        'dropped': DroppingQueueHandler.dropped
+    }
+
+
+# ----- benchmark -----
+
+class _SlowFile:
+    """File wrapper adding a fixed delay to every write, to mimic SD card stalls"""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, data):
+        import time
+        time.sleep(self.delay)
+        return self.stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def _time_calls(logger, calls, level=logging.INFO):
+    import time
+    start = time.perf_counter()
+    for i in range(calls):
+        logger.log(level, "Data request successful: limit=%s, IP=%s", 20, '10.0.0.1')
+    return (time.perf_counter() - start) / calls * 1e6
+
+def benchmark(calls=20000, write_latency_ms=0.0):
+    """
+    Per-call cost (microseconds) seen by the caller for synchronous file
+    logging, the queued pipeline, and a sampled DEBUG logger
+
+    write_latency_ms adds a delay to every file write to model a slow SD card.
+    """
+    import tempfile
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_logger = logging.getLogger('benchmark.sync')
+        sync_logger.propagate = False
+        sync_logger.setLevel(logging.DEBUG)
+        file_handler = logging.FileHandler(os.path.join(tmp, 'sync.log'))
+        if write_latency_ms:
+            file_handler.stream = _SlowFile(file_handler.stream, write_latency_ms / 1000)
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        sync_logger.addHandler(file_handler)
+        results['sync_file_us'] = _time_calls(sync_logger, calls)
+        file_handler.close()
+
+        listener = start_log_pipeline(logging.DEBUG, path=os.path.join(tmp, 'async.log'), console=False,
+                                      sampling={'benchmark.sampled': 100})
+        if write_latency_ms:
+            async_file = listener.handlers[0]
+            async_file.stream = _SlowFile(async_file._open(), write_latency_ms / 1000)
+        results['queued_us'] = _time_calls(logging.getLogger('benchmark.queued'), calls)
+        results['sampled_debug_us'] = _time_calls(logging.getLogger('benchmark.sampled'), calls, logging.DEBUG)
+        stop_log_pipeline()
+        del listener
+
+    return {name: round(value, 2) for name, value in results.items()}
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Log Pipeline')
+    parser.add_argument('--benchmark', action='store_true', help='Measure per-call logging overhead')
+    parser.add_argument('--calls', type=int, default=20000, help='Log calls per measurement')
+    parser.add_argument('--write-latency-ms', type=float, default=0.0,
+                        help='Delay added to every file write to model a slow SD card')
+
+    args = parser.parse_args()
+
+    if args.benchmark:
+        results = benchmark(calls=args.calls, write_latency_ms=args.write_latency_ms)
+        print(f"📝 Caller-side cost per log call over {args.calls:,} calls:")
+        print(f"  Synchronous FileHandler: {results['sync_file_us']:>8} µs")
+        print(f"  Queued pipeline:         {results['queued_us']:>8} µs")
+        print(f"  Sampled DEBUG (1/100):   {results['sampled_debug_us']:>8} µs")
+    else:
+        parser.print_help()
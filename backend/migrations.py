@@ -0,0 +1,353 @@
+"""
+HUST Solar Car Schema Migrations
+================================
+Versioned schema/index migrations tailored to the dashboard's query patterns.
+
+The live queries filter on each table's "valid row" predicate and read the
+newest rows by primary key, while cleanup and statistics scan by timestamp.
+These migrations make sure supporting indexes exist and report the query
+plans and timings before and after they are applied.
+
+Usage:
+    python -m backend.migrations --status
+    python -m backend.migrations --explain
+    python -m backend.migrations --apply
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+from backend.helpers import get_db_connection
+from backend.tables import TABLE_REGISTRY, VALID_ROW_COLUMN, table_by_name, latest_statement
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping table recording which migration versions have been applied
+MIGRATIONS_TABLE = 'schema_migrations'
+
+# Validity predicates as of migration 2. Frozen here on purpose: the applied
+# migrations must not change when a table's valid_filter in tables.py does.
+VALID_ROW_FILTERS = {
+    'Battery Data Table': 'Battery_Volt <> 0',
+    'Motor Data Table': 'Motor_Temp <> 0 OR Motor_Current <> 0',
+    'MPPT Data Table': 'MPPT_Total_Watt <> 0',
+    'Vehicle Data Table': 'Velocity <> 0'
+}
+
+
+def _index_step(table, index_name, columns):
+    """Build a migration step that creates an index if it is missing"""
+    return {
+        'kind': 'index',
+        'table': table,
+        'name': index_name,
+        'sql': f"CREATE INDEX `{index_name}` ON `{table}` ({columns})"
+    }
+
+
+def _column_step(table, column_name, definition):
+    """Build a migration step that adds a column if it is missing"""
+    return {
+        'kind': 'column',
+        'table': table,
+        'name': column_name,
+        'sql': f"ALTER TABLE `{table}` ADD COLUMN `{column_name}` {definition}"
+    }
+
+
+# Ordered list of migrations. Never edit an applied version - append a new one.
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'Timestamp indexes for cleanup and statistics',
+        'steps': [
+            _index_step(table, 'idx_timestamp_id', '`timestamp`, `id`')
+            for table in VALID_ROW_FILTERS
+        ]
+    },
+    {
+        'version': 2,
+        'description': 'Generated valid_row flag with (valid_row, id) index for live reads',
+        'steps': [
+            step
+            for table, predicate in VALID_ROW_FILTERS.items()
+            for step in (
+                _column_step(table, VALID_ROW_COLUMN,
+                             f"TINYINT(1) AS (IF({predicate}, 1, 0)) VIRTUAL"),
+                _index_step(table, 'idx_valid_row_id', '`valid_row`, `id`')
+            )
+        ]
+    }
+]
+
+
+class SchemaMigrator:
+    """Applies versioned index migrations and reports their effect on query plans"""
+
+    def __init__(self, migrations=None):
+        self.migrations = migrations if migrations is not None else MIGRATIONS
+
+    def _probe_queries(self, table):
+        """The dashboard's hot queries against a table, as (name, sql, params)"""
+        cutoff_date = datetime.now() - timedelta(days=14)
+        return [
+            ('latest_valid', latest_statement(table_by_name(table).key), (20,)),
+            ('oldest_timestamp', f"SELECT MIN(timestamp) FROM `{table}`", ()),
+            ('count_older_than', f"SELECT COUNT(*) FROM `{table}` WHERE timestamp < %s", (cutoff_date,))
+        ]
+
+    def _ensure_migrations_table(self, cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{MIGRATIONS_TABLE}` (
+                version INT NOT NULL PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at DATETIME NOT NULL
+            )
+        """)
+
+    def _applied_versions(self, cursor):
+        self._ensure_migrations_table(cursor)
+        cursor.execute(f"SELECT version FROM `{MIGRATIONS_TABLE}`")
+        return {row['version'] for row in cursor.fetchall()}
+
+    def _step_exists(self, cursor, step):
+        """Check information_schema so steps are idempotent (MySQL lacks CREATE INDEX IF NOT EXISTS)"""
+        if step['kind'] == 'index':
+            cursor.execute("""
+                SELECT COUNT(*) AS count FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+            """, (step['table'], step['name']))
+        else:
+            cursor.execute("""
+                SELECT COUNT(*) AS count FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+            """, (step['table'], step['name']))
+        return cursor.fetchone()['count'] > 0
+
+    def explain_queries(self):
+        """
+        Run EXPLAIN and time each hot query on every telemetry table
+
+        Returns:
+            dict: {table: {query_name: {'plan': [...], 'duration_ms': float}}}
+        """
+        report = {}
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    for table in VALID_ROW_FILTERS:
+                        report[table] = {}
+                        for name, sql, params in self._probe_queries(table):
+                            try:
+                                cursor.execute(f"EXPLAIN {sql}", params)
+                                plan = cursor.fetchall()
+
+                                started = time.perf_counter()
+                                cursor.execute(sql, params)
+                                cursor.fetchall()
+                                duration_ms = (time.perf_counter() - started) * 1000
+
+                                report[table][name] = {
+                                    'plan': [
+                                        {
+                                            'type': row.get('type'),
+                                            'key': row.get('key'),
+                                            'rows': row.get('rows'),
+                                            'extra': row.get('Extra')
+                                        }
+                                        for row in plan
+                                    ],
+                                    'duration_ms': round(duration_ms, 2)
+                                }
+                            except Exception as query_error:
+                                logger.error(f"Failed to explain {name} on {table}: {query_error}")
+                                report[table][name] = {'error': str(query_error)}
+        except Exception as e:
+            logger.error(f"Failed to explain dashboard queries: {e}")
+            return {'error': str(e)}
+
+        return report
+
+    def get_status(self):
+        """Return applied and pending migration versions"""
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    applied = self._applied_versions(cursor)
+        except Exception as e:
+            logger.error(f"Failed to read migration status: {e}")
+            return {'error': str(e)}
+
+        return {
+            'applied': sorted(applied),
+            'pending': [m['version'] for m in self.migrations if m['version'] not in applied],
+            'latest': max((m['version'] for m in self.migrations), default=0)
+        }
+
+    def migrate(self, dry_run=False):
+        """
+        Apply all pending migrations in version order
+
+        Args:
+            dry_run (bool): If True, only report which steps would run
+
+        Returns:
+            dict: Applied steps plus before/after query plans and timings
+        """
+        results = {
+            'start_time': datetime.now(),
+            'dry_run': dry_run,
+            'migrations_applied': [],
+            'steps_executed': [],
+            'steps_skipped': [],
+            'errors': []
+        }
+
+        results['before'] = self.explain_queries()
+
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    applied = self._applied_versions(cursor)
+
+                    for migration in sorted(self.migrations, key=lambda m: m['version']):
+                        version = migration['version']
+                        if version in applied:
+                            continue
+
+                        logger.info(f"Applying migration {version}: {migration['description']}")
+                        failed = False
+
+                        for step in migration['steps']:
+                            label = f"{step['table']}.{step['name']}"
+                            try:
+                                if self._step_exists(cursor, step):
+                                    results['steps_skipped'].append(label)
+                                    continue
+
+                                if not dry_run:
+                                    started = time.perf_counter()
+                                    cursor.execute(step['sql'])
+                                    logger.info(f"  {label} created in {time.perf_counter() - started:.2f}s")
+                                results['steps_executed'].append(label)
+                            except Exception as step_error:
+                                error_msg = f"Migration {version} step {label} failed: {step_error}"
+                                logger.error(error_msg)
+                                results['errors'].append(error_msg)
+                                failed = True
+                                break
+
+                        if failed:
+                            # Later migrations may depend on this one, stop here
+                            break
+
+                        if not dry_run:
+                            cursor.execute(
+                                f"INSERT INTO `{MIGRATIONS_TABLE}` (version, description, applied_at) VALUES (%s, %s, %s)",
+                                (version, migration['description'], datetime.now())
+                            )
+                            conn.commit()
+                        results['migrations_applied'].append(version)
+
+        except Exception as e:
+            error_msg = f"Schema migration failed: {e}"
+            logger.error(error_msg)
+            results['errors'].append(error_msg)
+
+        if not dry_run and results['steps_executed']:
+            results['after'] = self.explain_queries()
+
+        results['end_time'] = datetime.now()
+        results['duration'] = (results['end_time'] - results['start_time']).total_seconds()
+        return results
+
+
+def valid_row_tables(cursor):
+    """
+    Payload keys of the tables whose live queries can filter on valid_row
+
+    The column must exist (migration 2 applied) and its frozen predicate must
+    still equal the table's current valid_filter; otherwise the flag would
+    select different rows than the registry declares.
+    """
+    cursor.execute("""
+        SELECT TABLE_NAME AS table_name FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND COLUMN_NAME = %s
+    """, (VALID_ROW_COLUMN,))
+    migrated = {row['table_name'] for row in cursor.fetchall()}
+    keys = []
+    for key, table in TABLE_REGISTRY.items():
+        if table.name not in migrated:
+            continue
+        if VALID_ROW_FILTERS.get(table.name) != table.valid_filter:
+            logger.warning(f"{table.name}: valid_filter differs from migration 2, not using {VALID_ROW_COLUMN}")
+            continue
+        keys.append(key)
+    return keys
+
+
+schema_migrator = SchemaMigrator()
+
+def run_migrations(dry_run=False):
+    """Apply pending schema migrations"""
+    return schema_migrator.migrate(dry_run=dry_run)
+
+def get_migration_status():
+    """Get applied and pending migration versions"""
+    return schema_migrator.get_status()
+
+def explain_dashboard_queries():
+    """Get EXPLAIN plans and timings for the dashboard's hot queries"""
+    return schema_migrator.explain_queries()
+
+
+def _print_plans(title, report):
+    print(title)
+    if 'error' in report:
+        print(f"  ❌ {report['error']}")
+        return
+    for table, queries in report.items():
+        print(f"  {table}")
+        for name, info in queries.items():
+            if 'error' in info:
+                print(f"    {name:<18} ❌ {info['error']}")
+                continue
+            steps = ", ".join(f"{p['type']}/{p['key'] or '-'} ({p['rows']} rows)" for p in info['plan'])
+            print(f"    {name:<18} {info['duration_ms']:>9.2f} ms  {steps}")
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+    from backend.config import configure_logging, validate_config
+
+    configure_logging()
+    validate_config()
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Schema Migrations')
+    parser.add_argument('--status', action='store_true', help='Show applied and pending migrations')
+    parser.add_argument('--explain', action='store_true', help='Show query plans and timings for the hot queries')
+    parser.add_argument('--apply', action='store_true', help='Apply pending migrations')
+    parser.add_argument('--dry-run', action='store_true', help='Show which steps would run without changing the schema')
+
+    args = parser.parse_args()
+
+    if args.explain:
+        _print_plans("🔍 Query plans:", explain_dashboard_queries())
+    elif args.apply or args.dry_run:
+        result = run_migrations(dry_run=not args.apply or args.dry_run)
+        _print_plans("🔍 Before:", result['before'])
+        if 'after' in result:
+            _print_plans("🚀 After:", result['after'])
+        action = "Would apply" if result['dry_run'] else "Applied"
+        print(f"✅ {action} migrations {result['migrations_applied'] or 'none'} "
+              f"({len(result['steps_executed'])} steps, {len(result['steps_skipped'])} already present)")
+        for error in result['errors']:
+            print(f"❌ {error}")
+    else:
+        status = get_migration_status()
+        if 'error' in status:
+            print(f"❌ {status['error']}")
+        else:
+            print(f"📋 Schema version {max(status['applied'], default=0)} of {status['latest']}")
+            print(f"  Pending: {status['pending'] or 'none'}")
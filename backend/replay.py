@@ -0,0 +1,294 @@
+"""
+HUST Solar Car Historical Replay
+================================
+Replays a past time range through the live dashboard for debriefs and driver
+training.
+
+A replay streams `new_data`-compatible payloads to a dedicated room
+(`replay:<sid>`) at 1x-50x speed while the live stream keeps running for
+everyone else. A prefetch task keeps REPLAY_READAHEAD_CHUNKS chunks of
+REPLAY_CHUNK_SECONDS each loaded ahead of the playhead, so playback never waits
+on MySQL and memory stays bounded regardless of range length. Pause, resume,
+seek and speed changes take effect on the next tick. A replay that reaches its
+end frees its slot and returns the client to the live stream.
+"""
+
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from backend.helpers import get_db_connection, TELEMETRY_TABLES
+from backend.compression import PLAIN_ROOM, COMPRESSED_ROOM, FIELDS_ROOM_PREFIX
+from backend.db_executor import run_in_lane, LaneBusy, INTERACTIVE
+from backend.config import (REPLAY_CHUNK_SECONDS, REPLAY_READAHEAD_CHUNKS, REPLAY_MAX_SESSIONS,
+                            REPLAY_MAX_SPEED)
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/'
+
+# Wall-clock seconds between replay frames
+REPLAY_TICK_SECONDS = 0.5
+
+# Rows per table kept in each emitted frame, same as the live window
+REPLAY_WINDOW_SIZE = 20
+
+replay_sessions = {}
+
+
+def _format_row(row):
+    row = dict(row)
+    if isinstance(row.get('timestamp'), datetime):
+        row['timestamp'] = row['timestamp'].strftime("%Y-%m-%d %H:%M:%S")
+    return row
+
+
+class ReplaySession:
+    """One client's replay: prefetch buffer, playhead and per-table windows"""
+
+    def __init__(self, socketio, sid, start, end, speed):
+        self.socketio = socketio
+        self.sid = sid
+        self.room = f"replay:{sid}"
+        self.start = start
+        self.end = end
+        self.speed = speed
+        self.paused = False
+        self.stopped = False
+        self.buffering = False
+        self.position = start
+        self.next_chunk_start = start
+        # Bumped on seek so chunks loaded for the old position are discarded
+        self.generation = 0
+        # Each chunk: {'end': datetime, 'rows': [(timestamp, key, row)], 'cursor': int}
+        self.buffer = deque()
+        self.windows = {key: deque(maxlen=REPLAY_WINDOW_SIZE) for key in TELEMETRY_TABLES}
+        self.live_rooms = []
+
+    # ----- chunk loading -----
+
+    def _load_chunk(self, chunk_start, chunk_end):
+        rows = []
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for key, (table, columns, valid_filter) in TELEMETRY_TABLES.items():
+                    cursor.execute(
+                        f"SELECT {columns} FROM `{table}` "
+                        f"WHERE ({valid_filter}) AND timestamp >= %s AND timestamp < %s ORDER BY timestamp, id",
+                        (chunk_start, chunk_end)
+                    )
+                    rows.extend((row['timestamp'], key, row) for row in cursor.fetchall())
+        rows.sort(key=lambda item: item[0])
+        return {'end': chunk_end, 'rows': rows, 'cursor': 0}
+
+    def _prefill_windows(self, at):
+        """Fill the windows with the rows just before `at` so charts are not empty after a seek"""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                for key, (table, columns, valid_filter) in TELEMETRY_TABLES.items():
+                    cursor.execute(
+                        f"SELECT {columns} FROM `{table}` WHERE ({valid_filter}) AND timestamp < %s "
+                        f"ORDER BY timestamp DESC LIMIT %s",
+                        (at, REPLAY_WINDOW_SIZE)
+                    )
+                    window = self.windows[key]
+                    window.clear()
+                    window.extend(_format_row(row) for row in reversed(cursor.fetchall()))
+
+    def prefetch_loop(self):
+        while not self.stopped:
+            if len(self.buffer) >= REPLAY_READAHEAD_CHUNKS or self.next_chunk_start >= self.end:
+                self.socketio.sleep(0.1)
+                continue
+
+            generation = self.generation
+            chunk_start = self.next_chunk_start
+            chunk_end = min(chunk_start + timedelta(seconds=REPLAY_CHUNK_SECONDS), self.end)
+            try:
+                chunk = run_in_lane(INTERACTIVE, self._load_chunk, chunk_start, chunk_end)
+            except Exception as e:
+                logger.error(f"Replay prefetch failed for {self.sid}: {e}")
+                self.socketio.sleep(1)
+                continue
+
+            if generation == self.generation:
+                self.buffer.append(chunk)
+                self.next_chunk_start = chunk_end
+
+    # ----- playback -----
+
+    def play_loop(self):
+        self.emit_status()
+        while not self.stopped:
+            self.socketio.sleep(REPLAY_TICK_SECONDS)
+            if self.paused:
+                continue
+
+            target = min(self.position + timedelta(seconds=REPLAY_TICK_SECONDS * self.speed), self.end)
+            emitted = 0
+
+            while self.buffer:
+                chunk = self.buffer[0]
+                rows = chunk['rows']
+                while chunk['cursor'] < len(rows) and rows[chunk['cursor']][0] <= target:
+                    _, key, row = rows[chunk['cursor']]
+                    self.windows[key].append(_format_row(row))
+                    chunk['cursor'] += 1
+                    emitted += 1
+                if chunk['cursor'] < len(rows) or chunk['end'] > target:
+                    break
+                self.buffer.popleft()
+
+            # Only advance the playhead over data that has actually been loaded
+            loaded_until = self.buffer[-1]['end'] if self.buffer else self.next_chunk_start
+            buffering = target > loaded_until and loaded_until < self.end
+            self.position = min(target, loaded_until) if buffering else target
+
+            if emitted:
+                payload = {key: list(reversed(window)) for key, window in self.windows.items()}
+                self.socketio.emit("new_data", payload, to=self.room, namespace=NAMESPACE)
+
+            if buffering != self.buffering:
+                self.buffering = buffering
+                self.emit_status()
+
+            if self.position >= self.end:
+                self.emit_status(state='finished')
+                # Free the slot and return the client to the live stream
+                if replay_sessions.get(self.sid) is self:
+                    stop_replay(self.socketio, self.sid)
+                self.stopped = True
+
+    # ----- control -----
+
+    def seek(self, at):
+        at = min(max(at, self.start), self.end)
+        self.generation += 1
+        self.buffer.clear()
+        self.next_chunk_start = at
+        self.position = at
+        run_in_lane(INTERACTIVE, self._prefill_windows, at)
+        self.emit_status()
+
+    def set_speed(self, speed):
+        self.speed = speed
+        self.emit_status()
+
+    def emit_status(self, state=None):
+        if state is None:
+            state = 'paused' if self.paused else ('buffering' if self.buffering else 'playing')
+        self.socketio.emit("replay_status", {
+            'state': state,
+            'position': self.position.isoformat(),
+            'from': self.start.isoformat(),
+            'to': self.end.isoformat(),
+            'speed': self.speed,
+            'buffered_chunks': len(self.buffer)
+        }, to=self.room, namespace=NAMESPACE)
+
+
+def _parse_request(data):
+    start = datetime.fromisoformat(data['from'])
+    end = datetime.fromisoformat(data['to'])
+    if end <= start:
+        raise ValueError('to must be after from')
+    return start, end
+
+def _validate_speed(speed):
+    speed = float(speed)
+    if not 1 <= speed <= REPLAY_MAX_SPEED:
+        raise ValueError(f'speed must be between 1 and {REPLAY_MAX_SPEED}')
+    return speed
+
+def start_replay(socketio, sid, data):
+    """Start (or restart) a replay for a client; it stops receiving the live stream meanwhile"""
+    stop_replay(socketio, sid)
+    if len(replay_sessions) >= REPLAY_MAX_SESSIONS:
+        return {'error': f'At most {REPLAY_MAX_SESSIONS} concurrent replays'}
+
+    try:
+        start, end = _parse_request(data)
+        speed = _validate_speed(data.get('speed', 1))
+    except (KeyError, TypeError, ValueError) as e:
+        return {'error': f'Invalid replay request: {e}'}
+
+    session = ReplaySession(socketio, sid, start, end, speed)
+    # Hold the slot while the windows load; the client stays on the live stream until they have
+    replay_sessions[sid] = session
+    try:
+        run_in_lane(INTERACTIVE, session._prefill_windows, start)
+    except LaneBusy as e:
+        replay_sessions.pop(sid, None)
+        return {'error': str(e), 'retry_after': e.retry_after}
+    except Exception as e:
+        replay_sessions.pop(sid, None)
+        logger.error(f"Replay prefill failed for {sid}: {e}")
+        return {'error': 'Could not load the replay range'}
+    if replay_sessions.get(sid) is not session:
+        # Stopped or disconnected while loading
+        return {'error': 'Replay cancelled'}
+
+    server = socketio.server
+    try:
+        session.live_rooms = [room for room in server.rooms(sid, namespace=NAMESPACE)
+                              if room in (PLAIN_ROOM, COMPRESSED_ROOM) or room.startswith(FIELDS_ROOM_PREFIX)]
+        for room in session.live_rooms:
+            server.leave_room(sid, room, namespace=NAMESPACE)
+        server.enter_room(sid, session.room, namespace=NAMESPACE)
+    except Exception as e:
+        stop_replay(socketio, sid)
+        logger.error(f"Replay start failed for {sid}: {e}")
+        return {'error': 'Could not start the replay'}
+
+    socketio.start_background_task(session.prefetch_loop)
+    socketio.start_background_task(session.play_loop)
+
+    logger.info(f"Replay started for {sid}: {start} - {end} at {speed}x")
+    return {'success': True}
+
+def control_replay(sid, action, data=None):
+    """Pause, resume, seek or change speed of a client's replay"""
+    session = replay_sessions.get(sid)
+    if session is None:
+        return {'error': 'No replay running'}
+
+    data = data or {}
+    try:
+        if action == 'pause':
+            session.paused = True
+            session.emit_status()
+        elif action == 'resume':
+            session.paused = False
+            session.emit_status()
+        elif action == 'seek':
+            session.seek(datetime.fromisoformat(data['to']))
+        elif action == 'speed':
+            session.set_speed(_validate_speed(data['speed']))
+        else:
+            return {'error': f'Unknown replay action: {action}'}
+    except (KeyError, TypeError, ValueError) as e:
+        return {'error': f'Invalid replay request: {e}'}
+    except LaneBusy as e:
+        return {'error': str(e), 'retry_after': e.retry_after}
+    except Exception as e:
+        logger.error(f"Replay {action} failed for {sid}: {e}")
+        return {'error': f'Replay {action} failed'}
+    return {'success': True}
+
+def stop_replay(socketio, sid):
+    """Stop a client's replay and return it to the live stream"""
+    session = replay_sessions.pop(sid, None)
+    if session is None:
+        return {'success': False}
+
+    session.stopped = True
+    server = socketio.server
+    try:
+        server.leave_room(sid, session.room, namespace=NAMESPACE)
+        for room in session.live_rooms:
+            server.enter_room(sid, room, namespace=NAMESPACE)
+    except Exception:
+        # Client already disconnected
+        pass
+
+    logger.info(f"Replay stopped for {sid}")
+    return {'success': True}
@@ -0,0 +1,180 @@
+"""
+HUST Solar Car Rolling Statistics
+=================================
+Streaming mean/min/max/std per telemetry metric over several standard windows.
+
+Every numeric field of the telemetry rows gets one aggregator per window in
+ROLLING_STATS_WINDOWS. Aggregators are fed by the background fetcher and
+update in O(1) amortized time: monotonic deques for min/max and a sliding
+Welford accumulator for mean/variance. Queries never touch MySQL.
+"""
+
+import logging
+import math
+from collections import deque
+from decimal import Decimal
+from datetime import datetime
+from threading import Lock
+from backend.config import ROLLING_STATS_WINDOWS
+
+logger = logging.getLogger(__name__)
+
+# Row fields that are not measurements
+NON_METRIC_FIELDS = {'id', 'timestamp'}
+
+
+def _row_time(row):
+    stamp = row['timestamp']
+    if isinstance(stamp, datetime):
+        return stamp.timestamp()
+    return datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+class WindowAggregator:
+    """Time-windowed mean/variance/min/max with O(1) amortized updates"""
+
+    __slots__ = ('window', 'samples', 'min_queue', 'max_queue', 'count', 'mean', 'm2')
+
+    def __init__(self, window):
+        self.window = window
+        self.samples = deque()
+        self.min_queue = deque()
+        self.max_queue = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, t, value):
+        self.samples.append((t, value))
+
+        # Welford add
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        # Monotonic deques: front is always the window min/max
+        while self.min_queue and self.min_queue[-1][1] >= value:
+            self.min_queue.pop()
+        self.min_queue.append((t, value))
+        while self.max_queue and self.max_queue[-1][1] <= value:
+            self.max_queue.pop()
+        self.max_queue.append((t, value))
+
+    def evict(self, now):
+        cutoff = now - self.window
+        while self.samples and self.samples[0][0] < cutoff:
+            _, value = self.samples.popleft()
+
+            # Welford remove
+            if self.count <= 1:
+                self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            else:
+                self.count -= 1
+                delta = value - self.mean
+                self.mean -= delta / self.count
+                self.m2 = max(0.0, self.m2 - delta * (value - self.mean))
+
+        while self.min_queue and self.min_queue[0][0] < cutoff:
+            self.min_queue.popleft()
+        while self.max_queue and self.max_queue[0][0] < cutoff:
+            self.max_queue.popleft()
+
+    def summary(self):
+        if self.count == 0:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None, 'std': None}
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 4),
+            'min': self.min_queue[0][1],
+            'max': self.max_queue[0][1],
+            'std': round(math.sqrt(self.m2 / (self.count - 1)), 4) if self.count > 1 else 0.0
+        }
+
+
+class RollingStatsEngine:
+    """Per-metric rolling aggregators for every standard window"""
+
+    def __init__(self, windows=None):
+        self.windows = sorted(windows or ROLLING_STATS_WINDOWS)
+        self.aggregators = {}   # metric -> {window: WindowAggregator}
+        self.metric_tables = {} # metric -> payload key
+        self.last_ids = {}
+        self.latest_time = {}   # payload key -> newest row time seen
+        self.lock = Lock()
+
+    def ingest(self, new_by_table):
+        """
+        Feed new rows from the background fetcher
+
+        Args:
+            new_by_table (dict): {payload key: rows oldest first}
+        """
+        try:
+            with self.lock:
+                for key, rows in new_by_table.items():
+                    last_id = self.last_ids.get(key)
+                    for row in rows:
+                        if last_id is not None and row['id'] <= last_id:
+                            continue
+                        last_id = row['id']
+                        # Keep time monotonic so the deques stay ordered
+                        t = max(_row_time(row), self.latest_time.get(key, 0))
+                        self.latest_time[key] = t
+
+                        for field, value in row.items():
+                            if (field in NON_METRIC_FIELDS or field.endswith('_ID')
+                                    or isinstance(value, bool)
+                                    or not isinstance(value, (int, float, Decimal))):
+                                continue
+                            per_window = self.aggregators.get(field)
+                            if per_window is None:
+                                per_window = {w: WindowAggregator(w) for w in self.windows}
+                                self.aggregators[field] = per_window
+                                self.metric_tables[field] = key
+                            for aggregator in per_window.values():
+                                aggregator.add(t, float(value))
+
+                    self.last_ids[key] = last_id
+
+                for field, per_window in self.aggregators.items():
+                    now = self.latest_time[self.metric_tables[field]]
+                    for aggregator in per_window.values():
+                        aggregator.evict(now)
+        except Exception as e:
+            logger.error(f"Rolling statistics update failed: {e}")
+
+    def get(self, metric, window):
+        """Statistics for one metric over one window, or None if unknown"""
+        with self.lock:
+            per_window = self.aggregators.get(metric)
+            if per_window is None or window not in per_window:
+                return None
+            result = per_window[window].summary()
+            result['as_of'] = datetime.fromtimestamp(self.latest_time[self.metric_tables[metric]]).isoformat()
+            return result
+
+    def available(self):
+        with self.lock:
+            return {'metrics': sorted(self.aggregators), 'windows': self.windows}
+
+    def export(self):
+        """Catalog plus every metric's statistics, {metric: {str(window): summary}}, for other workers"""
+        catalog = self.available()
+        return {
+            'catalog': catalog,
+            'stats': {metric: {str(window): self.get(metric, window) for window in catalog['windows']}
+                      for metric in catalog['metrics']}
+        }
+
+
+# Global instance fed by the background fetcher
+rolling_stats_engine = RollingStatsEngine()
+
+def get_rolling_stats(metric, window):
+    """Get rolling statistics for a metric over a window in seconds"""
+    return rolling_stats_engine.get(metric, window)
+
+def get_rolling_stats_catalog():
+    """Get the metrics and windows that rolling statistics are kept for"""
+    return rolling_stats_engine.available()
@@ -1,20 +1,37 @@
-from flask import Blueprint, render_template, request, jsonify, make_response
+from flask import Blueprint, render_template, request, jsonify, make_response, Response, stream_with_context
 import logging
 import time
 from datetime import datetime
 from functools import wraps
-from backend.helpers import fetch_all_data, health_check
-from backend.config import RATE_LIMIT_PER_MINUTE
+from backend.helpers import fetch_all_data, health_check, validate_table_name, fetch_page, get_readiness
+from backend.tables import TABLE_REGISTRY, resolve_fields, export_projection
+from backend.tasks import get_fetcher_stats
+from backend.compression import get_compression_stats
+from backend.shared_state import get_derived_metrics, get_rolling_stats, get_rolling_stats_catalog, get_active_alerts
+from backend.alerts import get_alert_history
+from backend.timeseries import iter_joined_chunks, JOIN_METHODS
+from backend.sessions import get_sessions, get_session_rows
+from backend.db_executor import run_in_lane, get_lane_stats, LaneBusy, INTERACTIVE, HEAVY
+from backend.log_pipeline import get_log_stats
+from backend.segment_log import get_segment_log_stats
+from backend.static_assets import html_response
+from backend.backpressure import get_backpressure_stats
+from backend.config import RATE_LIMIT_PER_MINUTE, JOINED_MAX_POINTS, SEGMENT_LOG_ENABLED
 from backend.database_cleanup import (
     run_cleanup, 
+    estimate_cleanup,
     get_database_stats, 
     get_cleanup_recommendations,
     start_automated_cleanup,
-    stop_automated_cleanup
+    stop_automated_cleanup,
+    get_scheduler_status
 )
 
 logger = logging.getLogger(__name__)
 
+# Short table names accepted by ?table= parameters
+VALID_TABLES = [table.short_name for table in TABLE_REGISTRY.values()]
+
 main = Blueprint('main', __name__)
 routes = Blueprint('routes', __name__)
 
@@ -50,15 +67,39 @@ def rate_limit(max_requests=RATE_LIMIT_PER_MINUTE):
         return wrapper
     return decorator
 
+def shed_response(error):
+    """503 with Retry-After for DB work refused by its lane"""
+    response = jsonify({'success': False, 'error': str(error), 'lane': error.lane})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def wants_exact():
+    """True if the request asks for exact counts (?exact=true or {"exact": true})"""
+    if request.args.get('exact', '').lower() in ('1', 'true', 'yes'):
+        return True
+    body = request.get_json(silent=True)
+    return bool(body.get('exact')) if isinstance(body, dict) else False
+
 @routes.route("/")
 def index():
-    return render_template("index.html")
+    return html_response(make_response(render_template("index.html")))
 
 @main.route("/health")
 def health_check_endpoint():
     """Health check endpoint for monitoring"""
     try:
-        db_healthy = health_check()
+        readiness = get_readiness()
+        if readiness['state'] != 'ready':
+            # Still warming up at boot: report it instead of blocking on the pool
+            return jsonify({
+                'status': 'starting',
+                'timestamp': datetime.utcnow().isoformat(),
+                'database': readiness['state'],
+                'readiness': readiness
+            }), 503
+
+        db_healthy = run_in_lane(INTERACTIVE, health_check)
         status = 'healthy' if db_healthy else 'unhealthy'
         status_code = 200 if db_healthy else 503
         
@@ -67,8 +108,17 @@ def health_check_endpoint():
             'timestamp': datetime.utcnow().isoformat(),
             'database': 'connected' if db_healthy else 'disconnected',
             'version': '2.0.0',
-            'features': ['BWSC_Racing', 'Database_Cleanup', 'Latest_Records_Protection']
+            'features': ['BWSC_Racing', 'Database_Cleanup', 'Latest_Records_Protection'],
+            'fetcher': get_fetcher_stats(),
+            'compression': get_compression_stats(),
+            'db_lanes': get_lane_stats(),
+            'logging': get_log_stats(),
+            'segment_log': get_segment_log_stats() if SEGMENT_LOG_ENABLED else None,
+            'backpressure': {key: value for key, value in get_backpressure_stats().items() if key != 'clients'},
+            'readiness': readiness
         }), status_code
+    except LaneBusy as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Health check error: {e}")
         return jsonify({
@@ -82,24 +132,208 @@ def health_check_endpoint():
 @main.route("/data")
 @rate_limit()
 def get_data():
-    """Get telemetry data with validation"""
+    """Get telemetry data with validation (?limit=&fields=battery_volt,velocity)"""
     try:
         limit = request.args.get("limit", default=20, type=int)
+        fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
         
         # Validate limit parameter
         if limit < 1 or limit > 1000:
             return jsonify({'error': 'Limit must be between 1 and 1000'}), 400
         
-        data = fetch_all_data(limit=limit)
+        try:
+            projected = resolve_fields(fields) if fields else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        data = run_in_lane(INTERACTIVE, fetch_all_data, limit=limit, fields=projected)
         
         # Log successful request
-        logger.debug(f"Data request successful: limit={limit}, IP={request.remote_addr}")
+        logger.debug("Data request successful: limit=%s, IP=%s", limit, request.remote_addr)
         
         return jsonify(data)
+    except LaneBusy as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Error in get_data: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@main.route("/history")
+@rate_limit()
+def get_history():
+    """Keyset-paginated history of one table (?table=&before_id=&after_id=&page_size=&fields=)"""
+    try:
+        table = request.args.get("table", "battery")
+        before_id = request.args.get("before_id", type=int)
+        after_id = request.args.get("after_id", type=int)
+        page_size = request.args.get("page_size", default=100, type=int)
+        fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
+
+        if not validate_table_name(table):
+            return jsonify({'error': f"table must be one of: {', '.join(VALID_TABLES)}"}), 400
+        if page_size < 1 or page_size > 5000:
+            return jsonify({'error': 'page_size must be between 1 and 5000'}), 400
+
+        try:
+            page = run_in_lane(INTERACTIVE, fetch_page, f"{table}_data", before_id=before_id,
+                               after_id=after_id, page_size=page_size, fields=fields)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({'table': table, 'page_size': page_size, **page})
+    except LaneBusy as e:
+        return shed_response(e)
+    except Exception as e:
+        logger.error(f"Error in get_history: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route("/derived")
+@rate_limit()
+def get_derived():
+    """Get server-side derived energy metrics (cumulative Wh, rolling power, efficiency)"""
+    try:
+        return jsonify(get_derived_metrics())
+    except Exception as e:
+        logger.error(f"Error in get_derived: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route("/stats/rolling")
+@rate_limit()
+def get_rolling():
+    """Get mean/min/max/std of a metric over a rolling window, served from memory"""
+    try:
+        metric = request.args.get("metric")
+        window = request.args.get("window", type=int)
+        catalog = get_rolling_stats_catalog()
+
+        if not metric or window is None:
+            return jsonify({'error': 'metric and window (seconds) are required', **catalog}), 400
+
+        stats = get_rolling_stats(metric, window)
+        if stats is None:
+            return jsonify({'error': f'Unknown metric or window: {metric}, {window}', **catalog}), 404
+
+        return jsonify({'metric': metric, 'window': window, **stats})
+    except Exception as e:
+        logger.error(f"Error in get_rolling: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route("/alerts")
+@rate_limit()
+def get_alerts():
+    """Get currently raised alerts from the server-side rule engine"""
+    return jsonify({'alerts': get_active_alerts()})
+
+@main.route("/alerts/history")
+@rate_limit()
+def get_alerts_history():
+    """Get recent alert raise/clear transitions"""
+    limit = request.args.get("limit", default=100, type=int)
+    if limit < 1 or limit > 1000:
+        return jsonify({'error': 'Limit must be between 1 and 1000'}), 400
+    try:
+        return jsonify({'history': run_in_lane(INTERACTIVE, get_alert_history, limit=limit)})
+    except LaneBusy as e:
+        return shed_response(e)
+
+@main.route("/joined")
+@rate_limit(max_requests=5)
+def get_joined():
+    """Stream all four tables as-of joined onto a common time grid (NDJSON or CSV)"""
+    try:
+        import pandas as pd
+
+        try:
+            start = datetime.fromisoformat(request.args["from"])
+            end = datetime.fromisoformat(request.args["to"])
+        except (KeyError, ValueError):
+            return jsonify({'error': 'from and to must be ISO timestamps'}), 400
+
+        freq = request.args.get("freq", "1s")
+        tolerance = request.args.get("tolerance", "5s")
+        method = request.args.get("method", "backward")
+        output_format = request.args.get("format", "ndjson")
+
+        if end <= start:
+            return jsonify({'error': 'to must be after from'}), 400
+        if method not in JOIN_METHODS:
+            return jsonify({'error': f"method must be one of {', '.join(JOIN_METHODS)}"}), 400
+        if output_format not in ('ndjson', 'csv'):
+            return jsonify({'error': 'format must be ndjson or csv'}), 400
+        try:
+            step = pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+            pd.Timedelta(tolerance)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'freq and tolerance must be fixed durations like 1s, 500ms, 1min'}), 400
+        if step <= pd.Timedelta(0) or (end - start) / step > JOINED_MAX_POINTS:
+            return jsonify({'error': f'Range/freq would exceed {JOINED_MAX_POINTS:,} grid points'}), 400
+
+        # Load the first chunk before the response starts, so a busy heavy lane is still a 503
+        chunks = iter_joined_chunks(start, end, freq=freq, tolerance=tolerance, method=method)
+        first_chunk = next(chunks, None)
+
+        def generate():
+            chunk, first = first_chunk, True
+            while chunk is not None:
+                if output_format == 'csv':
+                    yield chunk.to_csv(index=False, header=first, date_format='%Y-%m-%d %H:%M:%S.%f')
+                else:
+                    yield chunk.to_json(orient='records', lines=True, date_format='iso').rstrip("\n") + "\n"
+                first = False
+                try:
+                    chunk = next(chunks, None)
+                except LaneBusy as e:
+                    logger.warning(f"Joined export cut short after the status was sent: {e}")
+                    return
+
+        logger.info(f"Joined export: {start} to {end} every {freq} ({method}), IP={request.remote_addr}")
+        mimetype = 'text/csv' if output_format == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
+
+    except LaneBusy as e:
+        return shed_response(e)
+    except Exception as e:
+        logger.error(f"Error in get_joined: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route("/sessions")
+@rate_limit()
+def list_sessions():
+    """Get recent driving sessions with per-table id ranges"""
+    try:
+        limit = request.args.get("limit", default=50, type=int)
+        if limit < 1 or limit > 500:
+            return jsonify({'error': 'Limit must be between 1 and 500'}), 400
+        return jsonify({'sessions': run_in_lane(INTERACTIVE, get_sessions, limit=limit)})
+    except LaneBusy as e:
+        return shed_response(e)
+    except Exception as e:
+        logger.error(f"Error in list_sessions: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route("/sessions/<int:session_id>/data")
+@rate_limit()
+def get_session_data(session_id):
+    """Get one session's rows for a table, read by primary-key range (?after_id= for the next page)"""
+    try:
+        table = request.args.get("table", "vehicle")
+        limit = request.args.get("limit", default=5000, type=int)
+        after_id = request.args.get("after_id", type=int)
+        if not validate_table_name(table):
+            return jsonify({'error': f"table must be one of: {', '.join(VALID_TABLES)}"}), 400
+        if limit < 1 or limit > 50000:
+            return jsonify({'error': 'Limit must be between 1 and 50000'}), 400
+
+        page = run_in_lane(HEAVY, get_session_rows, session_id, f"{table}_data", limit=limit, after_id=after_id)
+        if page is None:
+            return jsonify({'error': f'Unknown session {session_id}'}), 404
+        return jsonify({'session_id': session_id, 'table': table, **page})
+    except LaneBusy as e:
+        return shed_response(e)
+    except Exception as e:
+        logger.error(f"Error in get_session_data: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @main.route("/export_csv")
 @rate_limit(max_requests=5)  # Lower limit for export
 def export_csv():
@@ -111,24 +345,13 @@ def export_csv():
         if limit < 1 or limit > 5000:
             return jsonify({'error': 'CSV export limit must be between 1 and 5000'}), 400
         
-        data_rows = fetch_all_data(limit=limit)
+        data_rows = run_in_lane(HEAVY, fetch_all_data, limit=limit, fields=export_projection())
         csv_lines = ["Table,ID,Timestamp,Value1,Value2\n"]
 
-        # Add battery data
-        for row in data_rows["battery_data"]:
-            csv_lines.append(f"Battery,{row['id']},{row['timestamp']},{row['battery_volt']},{row['battery_current']}\n")
-
-        # Add motor data
-        for row in data_rows["motor_data"]:
-            csv_lines.append(f"Motor,{row['id']},{row['timestamp']},{row['motor_current']},{row['motor_temp']}\n")
-        
-        # Add MPPT data
-        for row in data_rows["mppt_data"]:
-            csv_lines.append(f"MPPT,{row['id']},{row['timestamp']},{row['MPPT_total_watt']},{row['MPPT1_watt']}\n")
-        
-        # Add vehicle data
-        for row in data_rows["vehicle_data"]:
-            csv_lines.append(f"Vehicle,{row['id']},{row['timestamp']},{row['velocity']},{row['distance_travelled']}\n")
+        for key, table in TABLE_REGISTRY.items():
+            value1, value2 = table.export_fields[:2]
+            for row in data_rows[key]:
+                csv_lines.append(f"{table.export_name},{row['id']},{row['timestamp']},{row[value1]},{row[value2]}\n")
 
         resp = make_response("".join(csv_lines))
         resp.headers["Content-Disposition"] = f"attachment; filename=hust_data_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
@@ -137,6 +360,8 @@ def export_csv():
         logger.info(f"CSV export successful: {len(csv_lines)} rows, IP={request.remote_addr}")
         return resp
         
+    except LaneBusy as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Error in export_csv: {e}")
         return jsonify({'error': 'Export failed'}), 500
@@ -147,14 +372,17 @@ def export_csv():
 @main.route("/admin/cleanup/stats", methods=['GET'])
 @rate_limit(max_requests=10)  # Limited access for admin endpoints
 def get_cleanup_stats():
-    """Get detailed database statistics for cleanup analysis"""
+    """Get detailed database statistics for cleanup analysis (index estimates unless ?exact=true)"""
     try:
-        stats = get_database_stats()
+        exact = wants_exact()
+        # Even estimates can scan a table that lacks the timestamp index
+        stats = run_in_lane(HEAVY, get_database_stats, exact=exact)
         total_records = sum(table['total_records'] for table in stats.values())
         total_deletable = sum(table['records_to_delete'] for table in stats.values())
         
         response = {
             'success': True,
+            'estimated': not exact,
             'total_records': total_records,
             'total_deletable': total_deletable,
             'table_stats': stats,
@@ -164,6 +392,8 @@ def get_cleanup_stats():
         logger.info(f"Database stats requested: {total_records:,} total records, {total_deletable:,} deletable")
         return jsonify(response)
         
+    except LaneBusy as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Error getting database stats: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -171,9 +401,9 @@ def get_cleanup_stats():
 @main.route("/admin/cleanup/recommendations", methods=['GET'])
 @rate_limit(max_requests=10)
 def get_cleanup_recs():
-    """Get intelligent cleanup recommendations based on database analysis"""
+    """Get intelligent cleanup recommendations based on database analysis (estimated unless ?exact=true)"""
     try:
-        recommendations = get_cleanup_recommendations()
+        recommendations = run_in_lane(HEAVY, get_cleanup_recommendations, exact=wants_exact())
         
         if 'error' in recommendations:
             return jsonify({'success': False, 'error': recommendations['error']}), 500
@@ -187,6 +417,8 @@ def get_cleanup_recs():
         logger.info(f"Cleanup recommendations generated: {recommendations['recommended_action']}")
         return jsonify(response)
         
+    except LaneBusy as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Error generating cleanup recommendations: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -194,24 +426,41 @@ def get_cleanup_recs():
 @main.route("/admin/cleanup/dry-run", methods=['POST'])
 @rate_limit(max_requests=5)  # Very limited for resource-intensive operations
 def cleanup_dry_run():
-    """Perform a dry run cleanup to see what would be deleted without actually deleting"""
+    """
+    Perform a dry run cleanup to see what would be deleted without actually deleting
+
+    By default the counts are estimated from index statistics and returned
+    within milliseconds, with a confidence per table; send ?exact=true or
+    {"exact": true} to run the full cleanup logic with exact COUNTs.
+    """
     try:
-        logger.info("Starting cleanup dry run...")
-        result = run_cleanup(dry_run=True)
+        if wants_exact():
+            logger.info("Starting exact cleanup dry run...")
+            result = run_in_lane(HEAVY, run_cleanup, dry_run=True)
+        else:
+            result = run_in_lane(HEAVY, estimate_cleanup)
         
         if 'error' in result:
             return jsonify({'success': False, 'error': result['error']}), 500
         
+        if result.get('mode') == 'estimate':
+            message = (f"Estimated dry run: would delete ~{result['total_deleted']:,} records "
+                       f"(confidence: {result['confidence']})")
+        else:
+            message = f"Dry run completed. Would delete {result['total_deleted']:,} records"
         response = {
             'success': True,
             'dry_run': True,
+            'exact': result.get('mode') != 'estimate',
             'result': result,
-            'message': f"Dry run completed. Would delete {result['total_deleted']:,} records"
+            'message': message
         }
         
-        logger.info(f"Cleanup dry run completed: {result['total_deleted']:,} records would be deleted")
+        logger.info(f"Cleanup dry run completed: {message}")
         return jsonify(response)
         
+    except LaneBusy as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Error in cleanup dry run: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -231,7 +480,7 @@ def execute_cleanup():
             }), 400
         
         logger.warning(" EXECUTING LIVE DATABASE CLEANUP ")
-        result = run_cleanup(dry_run=False)
+        result = run_in_lane(HEAVY, run_cleanup, dry_run=False)
         
         if 'error' in result:
             return jsonify({'success': False, 'error': result['error']}), 500
@@ -246,6 +495,8 @@ def execute_cleanup():
         logger.warning(f" LIVE CLEANUP COMPLETED: {result['total_deleted']:,} records deleted in {result['duration']:.2f}s")
         return jsonify(response)
         
+    except LaneBusy as e:
+        return shed_response(e)
     except Exception as e:
         logger.error(f"Error in live cleanup execution: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -260,7 +511,8 @@ def start_cleanup_scheduler():
         response = {
             'success': True,
             'message': 'Automated cleanup scheduler started',
-            'schedule': 'Every 7 days at 3:00 AM'
+            'schedule': 'Quietest hour after each due date, only while the car is parked',
+            'status': get_scheduler_status()
         }
         
         logger.info(" Automated cleanup scheduler started")
@@ -270,6 +522,16 @@ def start_cleanup_scheduler():
         logger.error(f"Error starting cleanup scheduler: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@main.route("/admin/cleanup/scheduler/status", methods=['GET'])
+@rate_limit(max_requests=10)
+def cleanup_scheduler_status():
+    """Scheduler state, planned cleanups and the last driving/ingest activity check"""
+    try:
+        return jsonify({'success': True, 'status': get_scheduler_status()})
+    except Exception as e:
+        logger.error(f"Error getting cleanup scheduler status: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @main.route("/admin/cleanup/scheduler/stop", methods=['POST'])
 @rate_limit(max_requests=5)
 def stop_cleanup_scheduler():
@@ -288,3 +550,16 @@ def stop_cleanup_scheduler():
     except Exception as e:
         logger.error(f"Error stopping cleanup scheduler: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ===== SOCKET.IO CLIENT ENDPOINTS =====
+
+@main.route("/admin/clients", methods=['GET'])
+@rate_limit(max_requests=30)
+def get_client_lag():
+    """Per-client send queue depth, coalesced/dropped frames, round-trip time and lag"""
+    try:
+        return jsonify({'success': True, 'backpressure': get_backpressure_stats()})
+    except Exception as e:
+        logger.error(f"Error getting client lag metrics: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
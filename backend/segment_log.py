@@ -0,0 +1,488 @@
+"""
+HUST Solar Car Store-and-Forward Segment Log
+============================================
+Local, append-only telemetry log that keeps the dashboard serving recent
+history while MySQL is unreachable.
+
+Telemetry is appended to fixed-size segment files that are memory-mapped, so
+an append is a memcpy into the page cache. Every row is packed as a fixed
+struct (id, epoch timestamp, one double per field) using the table layout
+from the table registry, and reads unpack straight from the mapping through
+memoryviews without copying the segment.
+
+Two kinds of records are written:
+
+- seen:    rows the fetcher read from MySQL, mirrored so `fetch_all_data`
+           can answer from the log during an outage
+- pending: rows a writer could not get into MySQL, appended with
+           `SegmentStore.buffer`; they are replayed into their tables in bulk
+           once the database is back and then marked as replayed in place
+
+Telemetry ingest is external: the car's uplink writes straight to MySQL and
+this server only reads it, so nothing here calls `buffer`. It is the hook for
+an ingest writer running in this process; a writer in another process must
+not share SEGMENT_LOG_DIR, since segments are opened once and never re-read.
+
+Segments rotate at SEGMENT_SIZE_MB and at most SEGMENT_MAX_COUNT are kept,
+so the log never uses more than their product on disk.
+
+Usage:
+    python -m backend.segment_log --status
+    python -m backend.segment_log --replay
+"""
+
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+from threading import Lock
+from backend.tables import TABLE_REGISTRY, KEY_FIELDS
+from backend.config import (SEGMENT_LOG_DIR, SEGMENT_SIZE_MB, SEGMENT_MAX_COUNT, SEGMENT_REPLAY_BATCH)
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'HUSTSEG1'
+
+# magic, end of the last complete record, length of the schema that follows
+SEGMENT_HEADER = struct.Struct('<8sQI')
+# kind, table index in the segment schema, number of rows
+RECORD_HEADER = struct.Struct('<BBH')
+
+KIND_SEEN = 1
+KIND_PENDING = 2
+KIND_REPLAYED = 3
+
+# Rows per record are limited by the 16-bit row count
+MAX_RECORD_ROWS = 0xFFFF
+
+# Mapped pages are flushed to disk at most this often
+FLUSH_INTERVAL_SECONDS = 1.0
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _row_struct(fields):
+    return struct.Struct('<qd' + 'd' * len(fields))
+
+def _to_epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.strptime(value, TIMESTAMP_FORMAT).timestamp()
+    return float(value)
+
+def _to_double(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class Segment:
+    """One memory-mapped segment file with its own table layout"""
+
+    def __init__(self, path, size=None, schema=None):
+        self.path = path
+        self.records = []  # [offset, kind, table index, row count]
+
+        if schema is not None:
+            self.file = open(path, 'w+b')
+            self.file.truncate(size)
+            self.mm = mmap.mmap(self.file.fileno(), size)
+            encoded = json.dumps(schema, separators=(',', ':')).encode('utf-8')
+            self.mm[SEGMENT_HEADER.size:SEGMENT_HEADER.size + len(encoded)] = encoded
+            self.end = SEGMENT_HEADER.size + len(encoded)
+            SEGMENT_HEADER.pack_into(self.mm, 0, MAGIC, self.end, len(encoded))
+        else:
+            self.file = open(path, 'r+b')
+            self.mm = mmap.mmap(self.file.fileno(), 0)
+            magic, self.end, schema_length = SEGMENT_HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC:
+                self.close()
+                raise ValueError(f"{path} is not a segment file")
+            start = SEGMENT_HEADER.size
+            schema = json.loads(self.mm[start:start + schema_length].decode('utf-8'))
+
+        self.schema = schema
+        self.keys = list(schema)
+        self.row_structs = [_row_struct(fields) for fields in schema.values()]
+        self._index_records()
+
+    def _index_records(self):
+        offset = SEGMENT_HEADER.size + SEGMENT_HEADER.unpack_from(self.mm, 0)[2]
+        while offset < self.end:
+            kind, table_index, count = RECORD_HEADER.unpack_from(self.mm, offset)
+            self.records.append([offset, kind, table_index, count])
+            offset += RECORD_HEADER.size + count * self.row_structs[table_index].size
+
+    @property
+    def size(self):
+        return len(self.mm)
+
+    def append(self, kind, key, rows):
+        """Pack rows of one table into a record; False if the segment is full"""
+        table_index = self.keys.index(key)
+        row_struct = self.row_structs[table_index]
+        needed = RECORD_HEADER.size + len(rows) * row_struct.size
+        if self.end + needed > self.size:
+            return False
+
+        fields = self.schema[key]
+        offset = self.end
+        RECORD_HEADER.pack_into(self.mm, offset, kind, table_index, len(rows))
+        position = offset + RECORD_HEADER.size
+        for row in rows:
+            row_struct.pack_into(self.mm, position, int(row['id']), _to_epoch(row['timestamp']),
+                                 *(_to_double(row.get(f)) for f in fields))
+            position += row_struct.size
+
+        # The header only points past a record once it is completely written
+        self.end = position
+        SEGMENT_HEADER.pack_into(self.mm, 0, MAGIC, self.end, SEGMENT_HEADER.unpack_from(self.mm, 0)[2])
+        self.records.append([offset, kind, table_index, len(rows)])
+        return True
+
+    def iter_rows(self, record, newest_first=False):
+        """Unpack a record's rows directly from the mapping (oldest first by default)"""
+        offset, _, table_index, count = record
+        row_struct = self.row_structs[table_index]
+        start = offset + RECORD_HEADER.size
+        with memoryview(self.mm) as view:
+            if newest_first:
+                # Walk the row offsets backwards so a limited read stops early
+                for position in range(start + (count - 1) * row_struct.size, start - 1, -row_struct.size):
+                    yield row_struct.unpack_from(view, position)
+            else:
+                with view[start:start + count * row_struct.size] as rows:
+                    yield from row_struct.iter_unpack(rows)
+
+    def mark(self, record, kind):
+        """Change a record's kind in place (pending -> replayed)"""
+        self.mm[record[0]] = kind
+        record[1] = kind
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+class SegmentStore:
+    """Rotating set of segments with outage fallback reads and bulk replay"""
+
+    def __init__(self, directory=SEGMENT_LOG_DIR, segment_mb=SEGMENT_SIZE_MB, max_segments=SEGMENT_MAX_COUNT):
+        self.directory = directory
+        self.segment_bytes = segment_mb * 1024 * 1024
+        self.max_segments = max(2, max_segments)
+        self.lock = Lock()
+        self.segments = []
+        self.opened = False
+        self.last_flush = 0.0
+        # Newest id mirrored per table, so each fetched row is written once
+        self.last_seen = {}
+        self.pending_rows = 0
+        self.outage_since = None
+        self.replaying = False
+        self.stats = {'rows_written': 0, 'rows_replayed': 0, 'rows_dropped': 0, 'fallback_reads': 0}
+
+    # ----- segments -----
+
+    def _open(self):
+        if self.opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.seg'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                self.segments.append(Segment(path))
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Skipping unreadable segment {name}: {e}")
+        for segment in self.segments:
+            for record in segment.records:
+                if record[1] == KIND_PENDING:
+                    self.pending_rows += record[3]
+                elif record[1] == KIND_SEEN and record[3]:
+                    key = segment.keys[record[2]]
+                    newest = max(row[0] for row in segment.iter_rows(record))
+                    self.last_seen[key] = max(self.last_seen.get(key, 0), newest)
+        self.opened = True
+        if self.segments:
+            logger.info(f"Segment log opened: {len(self.segments)} segment(s), "
+                        f"{self.pending_rows} pending row(s)")
+
+    def _new_segment(self):
+        number = int(os.path.basename(self.segments[-1].path)[:-4]) + 1 if self.segments else 1
+        schema = {key: [f for f in table.fields if f not in KEY_FIELDS] for key, table in TABLE_REGISTRY.items()}
+        path = os.path.join(self.directory, f"{number:08d}.seg")
+        self.segments.append(Segment(path, self.segment_bytes, schema))
+
+        while len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            dropped = sum(r[3] for r in oldest.records if r[1] == KIND_PENDING)
+            if dropped:
+                self.pending_rows -= dropped
+                self.stats['rows_dropped'] += dropped
+                logger.warning(f"Segment log full: dropped {dropped} pending row(s) from {oldest.path}")
+            oldest.close()
+            os.remove(oldest.path)
+
+    def _append(self, kind, key, rows):
+        self._open()
+        for start in range(0, len(rows), MAX_RECORD_ROWS):
+            chunk = rows[start:start + MAX_RECORD_ROWS]
+            if not self.segments or key not in self.segments[-1].schema:
+                self._new_segment()
+            if not self.segments[-1].append(kind, key, chunk):
+                self._new_segment()
+                if not self.segments[-1].append(kind, key, chunk):
+                    raise ValueError(f"{len(chunk)} rows do not fit in one segment")
+            self.stats['rows_written'] += len(chunk)
+            if kind == KIND_PENDING:
+                self.pending_rows += len(chunk)
+
+        now = time.time()
+        if now - self.last_flush >= FLUSH_INTERVAL_SECONDS:
+            self.segments[-1].flush()
+            self.last_flush = now
+
+    # ----- writes -----
+
+    def mirror(self, data):
+        """Append rows fetched from MySQL that are not in the log yet"""
+        with self.lock:
+            self._open()
+            for key, rows in data.items():
+                if key not in TABLE_REGISTRY or not rows:
+                    continue
+                last = self.last_seen.get(key, 0)
+                new = [row for row in reversed(rows) if row['id'] > last]
+                if new:
+                    self._append(KIND_SEEN, key, new)
+                    self.last_seen[key] = new[-1]['id']
+
+    def buffer(self, key, rows):
+        """
+        Append rows that still have to be written to MySQL
+
+        For an in-process ingest writer whose INSERT failed; the server itself
+        only reads telemetry, so there is no caller in this tree.
+        """
+        with self.lock:
+            self._append(KIND_PENDING, key, rows)
+
+    # ----- reads -----
+
+    def latest(self, limit, fields=None):
+        """
+        Newest rows per table from the log, shaped like fetch_all_data's result
+
+        Args:
+            limit (int): Rows per table
+            fields (dict): Optional {payload key: fields} projection
+        """
+        keys = list(fields) if fields else list(TABLE_REGISTRY)
+        out = {key: [] for key in keys}
+        seen_ids = {key: set() for key in keys}
+        with self.lock:
+            self._open()
+            self.stats['fallback_reads'] += 1
+            for segment in reversed(self.segments):
+                for record in reversed(segment.records):
+                    key = segment.keys[record[2]]
+                    if key not in out or len(out[key]) >= limit or record[3] == 0:
+                        continue
+                    names = KEY_FIELDS + tuple(segment.schema[key])
+                    wanted = set(KEY_FIELDS + tuple(fields[key])) if fields else None
+                    for values in segment.iter_rows(record, newest_first=True):
+                        if values[0] in seen_ids[key]:
+                            continue
+                        seen_ids[key].add(values[0])
+                        row = {
+                            name: (None if isinstance(v, float) and math.isnan(v) else v)
+                            for name, v in zip(names, values)
+                            if wanted is None or name in wanted
+                        }
+                        row['timestamp'] = datetime.fromtimestamp(values[1]).strftime(TIMESTAMP_FORMAT)
+                        out[key].append(row)
+                        if len(out[key]) >= limit:
+                            break
+                if all(len(rows) >= limit for rows in out.values()):
+                    break
+        for rows in out.values():
+            rows.sort(key=lambda row: row['id'], reverse=True)
+        return out
+
+    # ----- outage tracking and replay -----
+
+    def mark_outage(self):
+        if self.outage_since is None:
+            self.outage_since = time.time()
+            logger.warning("MySQL unreachable, serving telemetry from the segment log")
+
+    def mark_available(self):
+        if self.outage_since is not None:
+            logger.info(f"MySQL reachable again after {time.time() - self.outage_since:.0f}s")
+            self.outage_since = None
+
+    def has_pending(self):
+        with self.lock:
+            self._open()
+            return self.pending_rows > 0
+
+    def replay_pending(self, batch_size=SEGMENT_REPLAY_BATCH):
+        """
+        Write pending rows to their tables in bulk (INSERT IGNORE keyed on id)
+
+        Records are marked replayed only after their rows are committed, so an
+        interrupted replay is resumed from the first unmarked record.
+        """
+        from backend.helpers import get_db_connection
+
+        with self.lock:
+            self._open()
+            pending = [(segment, record) for segment in self.segments
+                       for record in segment.records if record[1] == KIND_PENDING]
+            if not pending:
+                self.replaying = False
+                return {'replayed': 0}
+            self.replaying = True
+
+        replayed = 0
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    for segment, record in pending:
+                        key = segment.keys[record[2]]
+                        table = TABLE_REGISTRY.get(key)
+                        if table is None:
+                            logger.warning(f"Pending rows for unknown table {key}, skipping")
+                            continue
+                        fields = [f for f in segment.schema[key] if f in table.fields]
+                        columns = ", ".join(['id', 'timestamp'] + [f"`{table.fields[f]}`" for f in fields])
+                        positions = [segment.schema[key].index(f) + 2 for f in fields]
+                        query = (f"INSERT IGNORE INTO `{table.name}` ({columns}) "
+                                 f"VALUES ({', '.join(['%s'] * (len(fields) + 2))})")
+
+                        with self.lock:
+                            rows = [
+                                (values[0], datetime.fromtimestamp(values[1]),
+                                 *(None if math.isnan(values[i]) else values[i] for i in positions))
+                                for values in segment.iter_rows(record)
+                            ]
+                        for start in range(0, len(rows), batch_size):
+                            cursor.executemany(query, rows[start:start + batch_size])
+                        conn.commit()
+
+                        with self.lock:
+                            if segment in self.segments:
+                                segment.mark(record, KIND_REPLAYED)
+                                self.pending_rows -= record[3]
+                        replayed += len(rows)
+        finally:
+            with self.lock:
+                self.stats['rows_replayed'] += replayed
+                self.replaying = False
+                if self.segments:
+                    self.segments[-1].flush()
+
+        logger.info(f"Replayed {replayed} buffered row(s) into MySQL")
+        return {'replayed': replayed}
+
+    def get_stats(self):
+        """Segment count, disk use, pending rows and outage state"""
+        with self.lock:
+            self._open()
+            return {
+                'segments': len(self.segments),
+                'bytes_allocated': sum(segment.size for segment in self.segments),
+                'max_bytes': self.segment_bytes * self.max_segments,
+                'pending_rows': self.pending_rows,
+                'outage': self.outage_since is not None,
+                'outage_seconds': round(time.time() - self.outage_since, 1) if self.outage_since else None,
+                'replaying': self.replaying,
+                **self.stats
+            }
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments:
+                segment.flush()
+                segment.close()
+            self.segments = []
+            self.opened = False
+
+
+# Global instance, opened on first use
+segment_store = SegmentStore()
+
+def mirror_rows(data):
+    """Mirror fetched telemetry into the log"""
+    segment_store.mirror(data)
+
+def read_latest(limit, fields=None):
+    """Newest telemetry from the log, for use while MySQL is unreachable"""
+    return segment_store.latest(limit, fields)
+
+def replay_pending():
+    """Replay buffered rows into MySQL"""
+    return segment_store.replay_pending()
+
+def schedule_replay(socketio):
+    """Start a background replay of buffered rows once MySQL is reachable again"""
+    from backend.db_executor import run_in_lane, HEAVY
+
+    with segment_store.lock:
+        if segment_store.replaying or not segment_store.pending_rows or segment_store.outage_since is not None:
+            return False
+        segment_store.replaying = True
+
+    def replay():
+        try:
+            run_in_lane(HEAVY, segment_store.replay_pending)
+        except Exception as e:
+            logger.error(f"Segment log replay failed, will retry: {e}")
+        finally:
+            # replay_pending never ran if the lane was busy
+            with segment_store.lock:
+                segment_store.replaying = False
+
+    socketio.start_background_task(replay)
+    return True
+
+def get_segment_log_stats():
+    """Segment log state for /health"""
+    return segment_store.get_stats()
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+    from backend.config import configure_logging, validate_config
+
+    configure_logging()
+    validate_config()
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Store-and-Forward Segment Log')
+    parser.add_argument('--status', action='store_true', help='Show segments and pending rows')
+    parser.add_argument('--replay', action='store_true', help='Replay pending rows into MySQL')
+    parser.add_argument('--latest', type=int, metavar='N', help='Print the newest N rows per table')
+
+    args = parser.parse_args()
+
+    if args.replay:
+        print(f"✅ Replayed {replay_pending()['replayed']:,} row(s)")
+    elif args.latest:
+        print(json.dumps(read_latest(args.latest), indent=2))
+    else:
+        stats = get_segment_log_stats()
+        print(f"🗄️  {stats['segments']} segment(s), {stats['bytes_allocated'] / 1024 / 1024:.1f} MB of "
+              f"{stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        print(f"  Pending rows: {stats['pending_rows']:,}")
@@ -0,0 +1,404 @@
+"""
+HUST Solar Car Driving Sessions
+===============================
+Background indexer that segments telemetry into driving sessions.
+
+Sessions are runs of `Vehicle Data Table` rows with velocity above
+SESSION_MIN_VELOCITY, split wherever the car has not moved for longer than
+SESSION_GAP_SECONDS. For each session the indexer stores the min/max id and
+timestamp of every telemetry table, so session-scoped queries and exports can
+use primary-key ranges instead of timestamp scans. Indexing is incremental
+and never scans by timestamp: each run reads vehicle rows past the last
+indexed id, then walks every table past its own id cursor and folds each
+batch into the sessions it overlaps. A run reads at most INDEX_MAX_BATCHES
+batches per table, so a large backlog is worked off over several runs.
+
+Usage:
+    python -m backend.sessions --index
+    python -m backend.sessions --list
+    python -m backend.sessions --rebuild
+"""
+
+import logging
+from datetime import datetime
+from backend.helpers import get_db_connection, TELEMETRY_TABLES, ts
+from backend.tables import get_table
+from backend.leader import is_poller_leader
+from backend.db_executor import run_in_lane, LaneBusy, HEAVY
+from backend.config import (SESSION_MIN_VELOCITY, SESSION_GAP_SECONDS, SESSION_MIN_SECONDS,
+                            SESSION_INDEX_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_TABLE = 'driving_sessions'
+SESSION_RANGES_TABLE = 'driving_session_ranges'
+SESSION_STATE_TABLE = 'session_index_state'
+SESSION_CURSORS_TABLE = 'session_range_cursors'
+
+# Rows read per indexing batch
+INDEX_BATCH_SIZE = 5000
+
+# Batches per table in one run; while a backlog remains the indexer runs again after INDEX_BACKLOG_PAUSE seconds
+INDEX_MAX_BATCHES = 20
+INDEX_BACKLOG_PAUSE = 1
+
+# Sessions are detected from the vehicle table's velocity
+VEHICLE = get_table('vehicle_data')
+
+
+class SessionIndexer:
+    """Incrementally detects driving sessions and records per-table id ranges"""
+
+    def _ensure_tables(self, cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{SESSIONS_TABLE}` (
+                id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                started_at DATETIME NOT NULL,
+                ended_at DATETIME NOT NULL,
+                status VARCHAR(8) NOT NULL,
+                INDEX idx_started_at (started_at)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{SESSION_RANGES_TABLE}` (
+                session_id INT UNSIGNED NOT NULL,
+                table_key VARCHAR(16) NOT NULL,
+                min_id BIGINT NULL,
+                max_id BIGINT NULL,
+                min_timestamp DATETIME NULL,
+                max_timestamp DATETIME NULL,
+                PRIMARY KEY (session_id, table_key)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{SESSION_STATE_TABLE}` (
+                id TINYINT NOT NULL PRIMARY KEY,
+                last_vehicle_id BIGINT NOT NULL
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{SESSION_CURSORS_TABLE}` (
+                table_key VARCHAR(16) NOT NULL PRIMARY KEY,
+                last_id BIGINT NOT NULL
+            )
+        """)
+
+    def _open_session(self, cursor):
+        cursor.execute(f"SELECT id, started_at, ended_at FROM `{SESSIONS_TABLE}` WHERE status = 'open' "
+                       f"ORDER BY id DESC LIMIT 1")
+        return cursor.fetchone()
+
+    def _merge_range(self, cursor, session_id, key, bounds):
+        """Widen a session's recorded range of one table to include bounds"""
+        cursor.execute(f"""
+            INSERT INTO `{SESSION_RANGES_TABLE}`
+            (session_id, table_key, min_id, max_id, min_timestamp, max_timestamp)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                min_id = LEAST(COALESCE(min_id, VALUES(min_id)), VALUES(min_id)),
+                max_id = GREATEST(COALESCE(max_id, VALUES(max_id)), VALUES(max_id)),
+                min_timestamp = LEAST(COALESCE(min_timestamp, VALUES(min_timestamp)), VALUES(min_timestamp)),
+                max_timestamp = GREATEST(COALESCE(max_timestamp, VALUES(max_timestamp)), VALUES(max_timestamp))
+        """, (session_id, key, bounds['min_id'], bounds['max_id'], bounds['min_timestamp'], bounds['max_timestamp']))
+
+    def _update_ranges(self, cursor, frontier):
+        """
+        Fold rows past each table's cursor into the sessions they fall in
+
+        Every query is bounded by a primary-key range of at most
+        INDEX_BATCH_SIZE rows. Rows stamped after `frontier` may still join a
+        session, so a table's cursor stops before the first of them.
+
+        Returns:
+            bool: True if a table has more rows to walk than this run allowed
+        """
+        cursor.execute(f"SELECT table_key, last_id FROM `{SESSION_CURSORS_TABLE}`")
+        cursors = {row['table_key']: row['last_id'] for row in cursor.fetchall()}
+        more = False
+
+        for key, (table, _, _) in TELEMETRY_TABLES.items():
+            last_id = cursors.get(key, 0)
+            for _ in range(INDEX_MAX_BATCHES):
+                cursor.execute(f"""
+                    SELECT MAX(id) AS upper FROM (
+                        SELECT id FROM `{table}` WHERE id > %s ORDER BY id LIMIT %s
+                    ) AS batch
+                """, (last_id, INDEX_BATCH_SIZE))
+                upper = cursor.fetchone()['upper']
+                if upper is None:
+                    break
+
+                cursor.execute(f"SELECT MIN(id) AS held FROM `{table}` WHERE id > %s AND id <= %s AND timestamp > %s",
+                               (last_id, upper, frontier))
+                held = cursor.fetchone()['held']
+                if held is not None:
+                    upper = held - 1
+                if upper > last_id:
+                    cursor.execute(f"SELECT MIN(timestamp) AS lo, MAX(timestamp) AS hi FROM `{table}` "
+                                   f"WHERE id > %s AND id <= %s", (last_id, upper))
+                    span = cursor.fetchone()
+                    cursor.execute(f"SELECT id, started_at, ended_at FROM `{SESSIONS_TABLE}` "
+                                   f"WHERE started_at <= %s AND ended_at >= %s", (span['hi'], span['lo']))
+                    for session in cursor.fetchall():
+                        cursor.execute(f"""
+                            SELECT MIN(id) AS min_id, MAX(id) AS max_id,
+                                   MIN(timestamp) AS min_timestamp, MAX(timestamp) AS max_timestamp
+                            FROM `{table}` WHERE id > %s AND id <= %s AND timestamp BETWEEN %s AND %s
+                        """, (last_id, upper, session['started_at'], session['ended_at']))
+                        bounds = cursor.fetchone()
+                        if bounds['min_id'] is not None:
+                            self._merge_range(cursor, session['id'], key, bounds)
+                    last_id = upper
+                if held is not None:
+                    break
+            else:
+                more = True
+
+            cursor.execute(f"""
+                INSERT INTO `{SESSION_CURSORS_TABLE}` (table_key, last_id) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)
+            """, (key, last_id))
+        return more
+
+    def _close(self, cursor, session):
+        duration = (session['ended_at'] - session['started_at']).total_seconds()
+        if duration < SESSION_MIN_SECONDS:
+            # Shunting around the pits is not a driving session
+            cursor.execute(f"DELETE FROM `{SESSION_RANGES_TABLE}` WHERE session_id = %s", (session['id'],))
+            cursor.execute(f"DELETE FROM `{SESSIONS_TABLE}` WHERE id = %s", (session['id'],))
+            logger.debug(f"Discarded {duration:.0f}s session {session['id']}")
+            return
+        cursor.execute(f"UPDATE `{SESSIONS_TABLE}` SET status = 'closed', ended_at = %s WHERE id = %s",
+                       (session['ended_at'], session['id']))
+        logger.info(f"Driving session {session['id']} closed: {session['started_at']} - {session['ended_at']}")
+
+    def index(self):
+        """
+        Process vehicle rows added since the last run, then update session ranges
+
+        Returns:
+            dict: Rows scanned, sessions opened and closed, and whether a backlog remains
+        """
+        result = {'rows_scanned': 0, 'sessions_opened': 0, 'sessions_closed': 0, 'more': False}
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    self._ensure_tables(cursor)
+                    cursor.execute(f"SELECT last_vehicle_id FROM `{SESSION_STATE_TABLE}` WHERE id = 1")
+                    state = cursor.fetchone()
+                    last_id = state['last_vehicle_id'] if state else 0
+                    session = self._open_session(cursor)
+                    last_seen = None
+
+                    for _ in range(INDEX_MAX_BATCHES):
+                        cursor.execute(f"""
+                            SELECT {VEHICLE.select_list(['velocity'])} FROM `{VEHICLE.name}`
+                            WHERE id > %s ORDER BY id LIMIT %s
+                        """, (last_id, INDEX_BATCH_SIZE))
+                        rows = cursor.fetchall()
+                        if not rows:
+                            break
+
+                        for row in rows:
+                            stamp = row['timestamp']
+                            last_seen = stamp
+                            if session and (stamp - session['ended_at']).total_seconds() > SESSION_GAP_SECONDS:
+                                self._close(cursor, session)
+                                result['sessions_closed'] += 1
+                                session = None
+
+                            if (row['velocity'] or 0) > SESSION_MIN_VELOCITY:
+                                if session is None:
+                                    cursor.execute(f"""
+                                        INSERT INTO `{SESSIONS_TABLE}` (started_at, ended_at, status)
+                                        VALUES (%s, %s, 'open')
+                                    """, (stamp, stamp))
+                                    session = {'id': cursor.lastrowid, 'started_at': stamp, 'ended_at': stamp}
+                                    result['sessions_opened'] += 1
+                                elif stamp > session['ended_at']:
+                                    session['ended_at'] = stamp
+
+                        last_id = rows[-1]['id']
+                        result['rows_scanned'] += len(rows)
+                        if len(rows) < INDEX_BATCH_SIZE:
+                            break
+                    else:
+                        result['more'] = True
+
+                    if session:
+                        cursor.execute(f"UPDATE `{SESSIONS_TABLE}` SET ended_at = %s WHERE id = %s",
+                                       (session['ended_at'], session['id']))
+                        # Close once the car has been still past the gap; with no new rows
+                        # at all (logger off) measure the gap against the clock
+                        reference = last_seen or datetime.now()
+                        if (reference - session['ended_at']).total_seconds() > SESSION_GAP_SECONDS:
+                            self._close(cursor, session)
+                            result['sessions_closed'] += 1
+                            session = None
+
+                    cursor.execute(f"""
+                        INSERT INTO `{SESSION_STATE_TABLE}` (id, last_vehicle_id) VALUES (1, %s)
+                        ON DUPLICATE KEY UPDATE last_vehicle_id = VALUES(last_vehicle_id)
+                    """, (last_id,))
+
+                    # Rows up to the open session's end are settled; later ones may still join it
+                    if session:
+                        frontier = session['ended_at']
+                    else:
+                        cursor.execute(f"SELECT timestamp FROM `{VEHICLE.name}` WHERE id = %s", (last_id,))
+                        row = cursor.fetchone()
+                        frontier = row['timestamp'] if row else None
+                    if frontier is not None and self._update_ranges(cursor, frontier):
+                        result['more'] = True
+                conn.commit()
+
+            if result['sessions_opened'] or result['sessions_closed']:
+                logger.info(f"Session index: {result['rows_scanned']} rows, "
+                            f"{result['sessions_opened']} opened, {result['sessions_closed']} closed")
+            return result
+
+        except Exception as e:
+            logger.error(f"Session indexing failed: {e}")
+            return {'error': str(e)}
+
+    def rebuild(self):
+        """Drop all sessions and re-index from the first vehicle row"""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_tables(cursor)
+                cursor.execute(f"DELETE FROM `{SESSION_RANGES_TABLE}`")
+                cursor.execute(f"DELETE FROM `{SESSIONS_TABLE}`")
+                cursor.execute(f"DELETE FROM `{SESSION_STATE_TABLE}`")
+                cursor.execute(f"DELETE FROM `{SESSION_CURSORS_TABLE}`")
+            conn.commit()
+        return self.index()
+
+    def list_sessions(self, limit=50):
+        """Most recent sessions with their per-table id ranges"""
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_tables(cursor)
+                cursor.execute(f"SELECT id, started_at, ended_at, status FROM `{SESSIONS_TABLE}` "
+                               f"ORDER BY id DESC LIMIT %s", (limit,))
+                sessions = cursor.fetchall()
+                if not sessions:
+                    return []
+
+                ids = [s['id'] for s in sessions]
+                placeholders = ",".join(["%s"] * len(ids))
+                cursor.execute(f"SELECT * FROM `{SESSION_RANGES_TABLE}` WHERE session_id IN ({placeholders})",
+                               tuple(ids))
+                ranges = cursor.fetchall()
+
+        by_session = {}
+        for r in ranges:
+            by_session.setdefault(r['session_id'], {})[r['table_key']] = {
+                'min_id': r['min_id'],
+                'max_id': r['max_id'],
+                'min_timestamp': r['min_timestamp'].isoformat() if r['min_timestamp'] else None,
+                'max_timestamp': r['max_timestamp'].isoformat() if r['max_timestamp'] else None
+            }
+        for s in sessions:
+            s['duration_seconds'] = (s['ended_at'] - s['started_at']).total_seconds()
+            s['started_at'] = s['started_at'].isoformat()
+            s['ended_at'] = s['ended_at'].isoformat()
+            s['tables'] = by_session.get(s['id'], {})
+        return sessions
+
+    def fetch_session_rows(self, session_id, key, limit=5000, after_id=None):
+        """
+        Rows of one table inside a session, read by primary-key range
+
+        Pages run oldest-first; pass the returned `next` cursor's after_id to
+        continue where a page stopped.
+
+        Returns:
+            dict: {'rows': [...], 'next': {'after_id': n} or None}, or None for an unknown session
+        """
+        table, columns, valid_filter = TELEMETRY_TABLES[key]
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_tables(cursor)
+                cursor.execute(f"SELECT min_id, max_id FROM `{SESSION_RANGES_TABLE}` "
+                               f"WHERE session_id = %s AND table_key = %s", (session_id, key))
+                bounds = cursor.fetchone()
+                if bounds is None:
+                    return None
+                if bounds['min_id'] is None:
+                    return {'rows': [], 'next': None}
+                first_id = bounds['min_id'] if after_id is None else max(bounds['min_id'], after_id + 1)
+                cursor.execute(f"""
+                    SELECT {columns} FROM `{table}`
+                    WHERE id BETWEEN %s AND %s AND ({valid_filter})
+                    ORDER BY id LIMIT %s
+                """, (first_id, bounds['max_id'], limit + 1))
+                rows = ts(cursor.fetchall())
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = {'after_id': rows[-1]['id']}
+        return {'rows': rows, 'next': next_cursor}
+
+
+# Global instance
+session_indexer = SessionIndexer()
+
+def index_sessions():
+    """Index driving sessions from vehicle rows added since the last run"""
+    return session_indexer.index()
+
+def get_sessions(limit=50):
+    """Get recent driving sessions with per-table id ranges"""
+    return session_indexer.list_sessions(limit=limit)
+
+def get_session_rows(session_id, key, limit=5000, after_id=None):
+    """Get a page of one table's rows for a session (None if the session is unknown)"""
+    return session_indexer.fetch_session_rows(session_id, key, limit=limit, after_id=after_id)
+
+def run_session_indexer(socketio, stop_event):
+    """Background task re-indexing sessions every SESSION_INDEX_INTERVAL seconds"""
+    logger.info(f"Session indexer started (every {SESSION_INDEX_INTERVAL}s)")
+    while not stop_event.is_set():
+        backlog = False
+        # With several workers only the polling leader indexes
+        if is_poller_leader():
+            try:
+                backlog = run_in_lane(HEAVY, index_sessions).get('more', False)
+            except LaneBusy as e:
+                logger.info(f"Session indexing deferred: {e}")
+        socketio.sleep(INDEX_BACKLOG_PAUSE if backlog else SESSION_INDEX_INTERVAL)
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+    from backend.config import configure_logging, validate_config
+
+    configure_logging()
+    validate_config()
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Driving Session Index')
+    parser.add_argument('--index', action='store_true', help='Index new vehicle rows')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the session index from scratch')
+    parser.add_argument('--list', action='store_true', help='List recent sessions')
+
+    args = parser.parse_args()
+
+    if args.rebuild or args.index:
+        result = session_indexer.rebuild() if args.rebuild else index_sessions()
+        # Work off the whole backlog, one bounded run at a time
+        while result.get('more'):
+            more = index_sessions()
+            result = {k: result[k] + more.get(k, 0) for k in ('rows_scanned', 'sessions_opened', 'sessions_closed')}
+            result.update({k: more[k] for k in ('more', 'error') if k in more})
+        if 'error' in result:
+            print(f"❌ Indexing failed: {result['error']}")
+        else:
+            print(f"✅ Scanned {result['rows_scanned']:,} rows, "
+                  f"{result['sessions_opened']} sessions opened, {result['sessions_closed']} closed")
+    else:
+        print("🏁 Driving sessions:")
+        for s in get_sessions():
+            print(f"  #{s['id']:<5} {s['started_at']} → {s['ended_at']} "
+                  f"({s['duration_seconds'] / 60:.0f} min, {s['status']})")
@@ -0,0 +1,142 @@
+"""
+HUST Solar Car Shared Engine State
+==================================
+Makes the leader's derived metrics, rolling statistics and active alerts
+readable on every Socket.IO worker.
+
+Only the poller leader feeds the engines (see leader.py), so with several
+workers the followers' engines stay empty. The leader publishes a JSON
+snapshot of each engine to the `engine_state` table every
+LEADER_STATE_INTERVAL seconds; followers serve /derived, /stats/rolling,
+/alerts and `alerts_snapshot` from that table, cached for the same interval.
+Without leader election the local engines are used directly.
+"""
+
+import json
+import logging
+import time
+from datetime import datetime
+from threading import Lock
+from backend.helpers import get_db_connection
+from backend.db_executor import run_in_lane, INTERACTIVE
+from backend.derived_metrics import derived_metrics_engine
+from backend.rolling_stats import rolling_stats_engine
+from backend.alerts import alert_engine
+from backend.config import LEADER_STATE_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+STATE_TABLE = 'engine_state'
+
+
+class SharedEngineState:
+    """Publishes engine snapshots on the leader and reads them on followers"""
+
+    def __init__(self, interval=LEADER_STATE_INTERVAL):
+        self.interval = interval
+        self.table_ready = False
+        self.last_published = 0.0
+        self.cache = {}
+        self.cache_time = 0.0
+        self.lock = Lock()
+
+    def _ensure_table(self, cursor):
+        if self.table_ready:
+            return
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{STATE_TABLE}` (
+                name VARCHAR(64) NOT NULL PRIMARY KEY,
+                payload MEDIUMTEXT NOT NULL,
+                updated_at DATETIME NOT NULL
+            )
+        """)
+        self.table_ready = True
+
+    @staticmethod
+    def local_snapshot():
+        """Snapshots of this worker's engines, keyed by state name"""
+        return {
+            'derived': derived_metrics_engine.snapshot(),
+            'rolling': rolling_stats_engine.export(),
+            'alerts': alert_engine.active_alerts()
+        }
+
+    def _write(self, snapshot):
+        now = datetime.now()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                cursor.executemany(
+                    f"INSERT INTO `{STATE_TABLE}` (name, payload, updated_at) VALUES (%s, %s, %s) "
+                    f"ON DUPLICATE KEY UPDATE payload = VALUES(payload), updated_at = VALUES(updated_at)",
+                    [(name, json.dumps(payload, default=str), now) for name, payload in snapshot.items()]
+                )
+            conn.commit()
+
+    def publish_if_due(self):
+        """Leader: write the engine snapshots at most every LEADER_STATE_INTERVAL seconds"""
+        now = time.time()
+        if now - self.last_published < self.interval:
+            return
+        self.last_published = now
+        try:
+            run_in_lane(INTERACTIVE, self._write, self.local_snapshot())
+        except Exception as e:
+            logger.error(f"Failed to publish engine state: {e}")
+
+    def _read(self):
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                cursor.execute(f"SELECT name, payload FROM `{STATE_TABLE}`")
+                return {row['name']: json.loads(row['payload']) for row in cursor.fetchall()}
+
+    def get(self, name):
+        """Follower: the leader's latest snapshot of one engine (local engine if none published)"""
+        with self.lock:
+            if time.time() - self.cache_time >= self.interval:
+                try:
+                    self.cache = run_in_lane(INTERACTIVE, self._read)
+                except Exception as e:
+                    logger.error(f"Failed to read engine state: {e}")
+                self.cache_time = time.time()
+            state = self.cache.get(name)
+        return state if state is not None else self.local_snapshot()[name]
+
+
+# Global instance
+shared_state = SharedEngineState()
+
+def _is_follower():
+    from backend.leader import leader_elector
+    return leader_elector is not None and not leader_elector.is_leader
+
+def publish_engine_state():
+    """Called by the leader's fetcher loop; no-op without leader election"""
+    from backend.leader import leader_elector
+    if leader_elector is not None:
+        shared_state.publish_if_due()
+
+def get_derived_metrics():
+    """Current derived energy metrics (the leader's, on a follower)"""
+    if _is_follower():
+        return shared_state.get('derived')
+    return derived_metrics_engine.snapshot()
+
+def get_rolling_stats(metric, window):
+    """Rolling statistics for a metric over a window in seconds, or None if unknown"""
+    if not _is_follower():
+        return rolling_stats_engine.get(metric, window)
+    return shared_state.get('rolling')['stats'].get(metric, {}).get(str(window))
+
+def get_rolling_stats_catalog():
+    """Metrics and windows that rolling statistics are kept for"""
+    if _is_follower():
+        return shared_state.get('rolling')['catalog']
+    return rolling_stats_engine.available()
+
+def get_active_alerts():
+    """Currently raised alerts"""
+    if _is_follower():
+        return shared_state.get('alerts')
+    return alert_engine.active_alerts()
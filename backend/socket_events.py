@@ -1,10 +1,128 @@
-from flask_socketio import SocketIO
+import logging
+from threading import Lock
+from flask import request
+from flask_socketio import SocketIO, join_room, leave_room, emit
+from backend.compression import PLAIN_ROOM, COMPRESSED_ROOM, set_client_projection, clear_client_projection
+from backend.tables import resolve_fields
+from backend.backpressure import flow_controller
+from backend.config import SOCKETIO_MESSAGE_QUEUE, COMPRESSION_ENABLED
+from backend.shared_state import get_active_alerts
+from backend.replay import start_replay, control_replay, stop_replay
+from backend.resume import fetch_missed_rows
+from backend.db_executor import run_in_lane, INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# Connected Socket.IO clients, used by the background fetcher to suspend when nobody is watching
+connected_clients = set()
+clients_lock = Lock()
+
+def get_client_count():
+    """Number of currently connected Socket.IO clients"""
+    with clients_lock:
+        return len(connected_clients)
 
 def register_socketio_events(socketio: SocketIO):
     @socketio.on("connect")
     def on_connect():
-        print("Client connected")
+        with clients_lock:
+            connected_clients.add(request.sid)
+            count = len(connected_clients)
+        join_room(PLAIN_ROOM)
+        # New clients get the current alert state; afterwards only transitions are pushed
+        emit("alerts_snapshot", get_active_alerts())
+        logger.info(f"Client connected ({count} connected)")
 
     @socketio.on("disconnect")
     def on_disconnect():
-        print("Client disconnected")
+        with clients_lock:
+            connected_clients.discard(request.sid)
+            count = len(connected_clients)
+        stop_replay(socketio, request.sid)
+        clear_client_projection(request.sid)
+        flow_controller.unregister(request.sid)
+        logger.info(f"Client disconnected ({count} connected)")
+
+    @socketio.on("set_compression")
+    def on_set_compression(data):
+        """Switch this client between plain and pre-compressed telemetry broadcasts"""
+        enabled = bool(data.get("enabled")) if isinstance(data, dict) else False
+        # With compression disabled nothing is sent to COMPRESSED_ROOM, so stay on plain frames
+        enabled = enabled and COMPRESSION_ENABLED
+        # Compressed and projected streams are exclusive; switching drops the projection
+        projection_room = clear_client_projection(request.sid)
+        if projection_room:
+            leave_room(projection_room)
+        if enabled:
+            leave_room(PLAIN_ROOM)
+            join_room(COMPRESSED_ROOM)
+        else:
+            leave_room(COMPRESSED_ROOM)
+            join_room(PLAIN_ROOM)
+        return {"compressed": enabled}
+
+    @socketio.on("set_fields")
+    def on_set_fields(data):
+        """Receive only some fields on the live stream: {"fields": ["battery_volt", "velocity"]}, [] for all"""
+        fields = data.get("fields") if isinstance(data, dict) else None
+        if not isinstance(fields, list):
+            return {"error": "fields must be a list"}
+        try:
+            projection = resolve_fields([str(f) for f in fields])
+        except ValueError as e:
+            return {"error": str(e)}
+
+        # Only the polling leader broadcasts, and it only knows its own clients' projections
+        if projection and SOCKETIO_MESSAGE_QUEUE:
+            return {"fields": None, "error": "Field projection is not available with multiple workers"}
+
+        previous = clear_client_projection(request.sid)
+        if previous:
+            leave_room(previous)
+        leave_room(COMPRESSED_ROOM)
+        if projection:
+            leave_room(PLAIN_ROOM)
+            join_room(set_client_projection(request.sid, projection))
+        else:
+            join_room(PLAIN_ROOM)
+        return {"fields": {key: list(f) for key, f in projection.items()} or None}
+
+    @socketio.on("set_flow_control")
+    def on_set_flow_control(data):
+        """Opt in to paced delivery: {"enabled": true}; the client must acknowledge each new_data frame"""
+        enabled = bool(data.get("enabled")) if isinstance(data, dict) else False
+        # Only the polling leader's own clients can be paced with a message queue
+        if enabled and SOCKETIO_MESSAGE_QUEUE:
+            return {"flow_control": False, "error": "Flow control is not available with multiple workers"}
+        if enabled:
+            flow_controller.register(request.sid)
+        else:
+            flow_controller.unregister(request.sid)
+        return {"flow_control": enabled}
+
+    @socketio.on("replay_start")
+    def on_replay_start(data):
+        """Replay a past range to this client: {"from": iso, "to": iso, "speed": 1-50}"""
+        return start_replay(socketio, request.sid, data if isinstance(data, dict) else {})
+
+    @socketio.on("replay_control")
+    def on_replay_control(data):
+        """Control this client's replay: {"action": "pause"|"resume"|"seek"|"speed", ...}"""
+        data = data if isinstance(data, dict) else {}
+        return control_replay(request.sid, data.get("action"), data)
+
+    @socketio.on("replay_stop")
+    def on_replay_stop():
+        return stop_replay(socketio, request.sid)
+
+    @socketio.on("resume")
+    def on_resume(data):
+        """Return the rows missed since {"last_ids": {"battery_data": id, ...}}"""
+        last_ids = data.get("last_ids") if isinstance(data, dict) else None
+        if not isinstance(last_ids, dict):
+            return {"error": "last_ids is required"}
+        try:
+            return run_in_lane(INTERACTIVE, fetch_missed_rows, last_ids)
+        except Exception as e:
+            logger.error(f"Resume failed: {e}")
+            return {"error": "Resume failed"}
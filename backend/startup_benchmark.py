@@ -0,0 +1,110 @@
+"""
+HUST Solar Car Startup Benchmark
+================================
+Measures how long the server takes from a cold interpreter to its first
+responses, as seen on the car's single-board computer.
+
+Each run starts a fresh Python process that imports `backend.app` and then
+requests the dashboard (`/`) and `/health` through the Flask test client. The
+slowest imports of the first run are reported from `-X importtime`.
+
+Usage:
+    python -m backend.startup_benchmark --runs 5
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in a fresh interpreter for every run
+PROBE = """
+import json, time
+start = time.perf_counter()
+from backend.app import app
+imported = time.perf_counter()
+client = app.test_client()
+ui = client.get('/')
+ui_done = time.perf_counter()
+health = client.get('/health')
+health_done = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'ui_first_response_seconds': ui_done - imported,
+    'ui_status': ui.status_code,
+    'health_first_response_seconds': health_done - ui_done,
+    'health_status': health.status_code,
+    'total_seconds': health_done - start
+}))
+"""
+
+
+def _parse_importtime(stderr, top=10):
+    """Slowest modules by cumulative import time from -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # "import time:   self_us |   cumulative_us |   module"
+        self_part, cumulative_us, name = line.split('|', 2)
+        try:
+            modules.append((int(cumulative_us), int(self_part.split(':')[1]), name.strip()))
+        except ValueError:
+            continue
+    modules.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': round(cum / 1000, 1), 'self_ms': round(own / 1000, 1)}
+            for cum, own, name in modules[:top]]
+
+def run_once(importtime=False):
+    """One cold start; returns the probe timings (and slowest imports if requested)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE]
+    result = subprocess.run(command, cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=300)
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe failed: {result.stderr.strip()[-500:]}")
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    if importtime:
+        timings['slowest_imports'] = _parse_importtime(result.stderr)
+    return timings
+
+def benchmark(runs=5):
+    """Run several cold starts and summarize the timings"""
+    samples = [run_once(importtime=(i == 0)) for i in range(runs)]
+    summary = {}
+    for key in ('import_seconds', 'ui_first_response_seconds', 'health_first_response_seconds', 'total_seconds'):
+        values = sorted(sample[key] for sample in samples)
+        summary[key] = {
+            'min': round(values[0], 3),
+            'median': round(values[len(values) // 2], 3),
+            'max': round(values[-1], 3)
+        }
+    summary['ui_status'] = samples[-1]['ui_status']
+    summary['health_status'] = samples[-1]['health_status']
+    summary['slowest_imports'] = samples[0]['slowest_imports']
+    return summary
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Startup Benchmark')
+    parser.add_argument('--runs', type=int, default=5, help='Number of cold starts')
+    parser.add_argument('--json', action='store_true', help='Print raw JSON')
+
+    args = parser.parse_args()
+    summary = benchmark(runs=args.runs)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"🚀 Startup over {args.runs} cold start(s) (min / median / max seconds):")
+        for key in ('import_seconds', 'ui_first_response_seconds', 'health_first_response_seconds', 'total_seconds'):
+            t = summary[key]
+            print(f"  {key:<32} {t['min']:>7} / {t['median']:>7} / {t['max']:>7}")
+        print(f"  UI status {summary['ui_status']}, /health status {summary['health_status']}")
+        print("🐢 Slowest imports (cumulative ms):")
+        for item in summary['slowest_imports']:
+            print(f"  {item['cumulative_ms']:>8}  {item['module']}")
@@ -0,0 +1,168 @@
+"""
+HUST Solar Car Static Asset Serving
+===================================
+Cache-friendly, precompressed serving of the built dashboard.
+
+Vite emits content-hashed bundles (`index-CKOiMtgh.js`), so a file name never
+changes content. The build step below writes `.gz` and `.br` siblings of
+every compressible asset once, and the static route serves the best variant
+the client accepts without compressing anything per request:
+
+- hashed assets under `assets/`: `Cache-Control: public, max-age=1 year, immutable`, so a
+  reload on a pit-wall tablet does not touch the network for them
+- other static files and the HTML shell: short `max-age` with
+  `must-revalidate` and an ETag, so a new build is picked up within
+  HTML_CACHE_SECONDS and unchanged files cost a 304
+
+Usage:
+    python -m backend.static_assets --precompress
+"""
+
+import gzip
+import logging
+import mimetypes
+import os
+import re
+from flask import request, send_file, abort
+from werkzeug.security import safe_join
+from backend.config import STATIC_CACHE_SECONDS, HTML_CACHE_SECONDS
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Vite's default output: assets/name-<8 char hash>.ext
+HASHED_ASSET_DIR = 'assets'
+HASHED_ASSET = re.compile(r'-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+
+COMPRESSIBLE_EXTENSIONS = {'.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.wasm'}
+
+# Files smaller than this are served as-is
+PRECOMPRESS_MIN_SIZE = 512
+
+# Accept-Encoding token -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def is_hashed(filename):
+    """True for content-hashed build output that may be cached forever"""
+    directory, name = os.path.split(filename.replace('\\', '/'))
+    return directory == HASHED_ASSET_DIR and bool(HASHED_ASSET.search(name))
+
+def _write_if_stale(source, target, compress):
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return None
+    with open(source, 'rb') as f:
+        data = compress(f.read())
+    with open(target, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+def precompress_assets(directory, min_size=PRECOMPRESS_MIN_SIZE):
+    """
+    Write .gz (and .br when brotli is installed) next to every compressible file
+
+    Files whose variants are newer than the source are skipped, so the step
+    can run after every build.
+
+    Returns:
+        dict: {'files': n, 'written': n, 'bytes_in': n, 'gzip_bytes': n, 'brotli_bytes': n}
+    """
+    summary = {'files': 0, 'written': 0, 'bytes_in': 0, 'gzip_bytes': 0, 'brotli_bytes': 0}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            size = os.path.getsize(path)
+            if size < min_size:
+                continue
+
+            summary['files'] += 1
+            summary['bytes_in'] += size
+            gz_size = _write_if_stale(path, path + '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))
+            if gz_size is not None:
+                summary['written'] += 1
+            summary['gzip_bytes'] += os.path.getsize(path + '.gz')
+
+            if brotli is not None:
+                br_size = _write_if_stale(path, path + '.br', lambda data: brotli.compress(data, quality=11))
+                if br_size is not None:
+                    summary['written'] += 1
+                summary['brotli_bytes'] += os.path.getsize(path + '.br')
+    return summary
+
+def _accepted_variant(path):
+    """(path, encoding) of the best precompressed file the client accepts"""
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+        if accepted[encoding] > 0 and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+def _cache_headers(response, filename):
+    if is_hashed(filename):
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_CACHE_SECONDS
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = HTML_CACHE_SECONDS
+        response.cache_control.must_revalidate = True
+    return response
+
+def init_static_assets(app):
+    """Replace Flask's static view with the precompressed, cache-aware one"""
+
+    def serve_static(filename):
+        path = safe_join(app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        variant, encoding = _accepted_variant(path)
+        response = send_file(variant, mimetype=mimetype, conditional=True, etag=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return _cache_headers(response, filename)
+
+    app.view_functions['static'] = serve_static
+    logger.info(f"Static assets: hashed files cached {STATIC_CACHE_SECONDS}s (immutable), "
+                f"others {HTML_CACHE_SECONDS}s with revalidation")
+
+def html_response(response):
+    """Short revalidating cache headers and an ETag for the HTML shell"""
+    response.add_etag()
+    response.cache_control.public = True
+    response.cache_control.max_age = HTML_CACHE_SECONDS
+    response.cache_control.must_revalidate = True
+    return response.make_conditional(request)
+
+
+# For direct script execution
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='HUST Solar Car Static Asset Serving')
+    parser.add_argument('--precompress', action='store_true', help='Write .gz/.br variants of the built assets')
+    parser.add_argument('--dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='Directory to precompress (default: backend/static)')
+
+    args = parser.parse_args()
+
+    if args.precompress:
+        summary = precompress_assets(args.dir)
+        print(f"📦 {summary['files']} file(s), {summary['written']} variant(s) written")
+        if summary['bytes_in']:
+            print(f"  Original: {summary['bytes_in'] / 1024:>8.1f} KB")
+            print(f"  gzip:     {summary['gzip_bytes'] / 1024:>8.1f} KB")
+            if brotli is not None:
+                print(f"  brotli:   {summary['brotli_bytes'] / 1024:>8.1f} KB")
+            else:
+                print("  brotli:   not installed, skipped")
+    else:
+        parser.print_help()
@@ -0,0 +1,267 @@
+"""
+HUST Solar Car Telemetry Table Registry
+=======================================
+Single declaration of every telemetry table the dashboard reads.
+
+Each entry lists the table's columns with the field names they are exposed
+as, the predicate that marks a row as valid, its retention settings and the
+fields written to CSV exports. The live SELECTs, exports, cleanup statements,
+migrations and display names are all generated from this registry, so adding
+a sensor table means adding one `register(TelemetryTable(...))` entry below.
+
+Generated statements are cached per (table, field selection).
+"""
+
+from functools import lru_cache
+from backend.config import (BATTERY_RETENTION_DAYS, MOTOR_RETENTION_DAYS, MPPT_RETENTION_DAYS,
+                            VEHICLE_RETENTION_DAYS, LATEST_BATTERY_PRESERVE, LATEST_MOTOR_PRESERVE,
+                            LATEST_MPPT_PRESERVE, LATEST_VEHICLE_PRESERVE)
+
+# Fields every projection returns, needed for ordering and resume
+KEY_FIELDS = ('id', 'timestamp')
+
+# Generated flag column added by schema migration 2, indexed as (valid_row, id)
+VALID_ROW_COLUMN = 'valid_row'
+
+
+class TelemetryTable:
+    """
+    Declaration of one telemetry table
+
+    Args:
+        key (str): Payload key, e.g. 'battery_data'
+        name (str): MySQL table name
+        label (str): Human-readable name for reports
+        columns (list): [(SQL column, output field)] excluding id and timestamp
+        valid_filter (str): SQL predicate selecting valid rows
+        retention_days (int): Age after which rows may be cleaned up
+        min_records (int): Never clean up a table smaller than this
+        latest_preserve (int): Newest rows always kept regardless of age
+        export_fields (tuple): Fields written to CSV exports, in column order
+        export_name (str): Value of the CSV "Table" column (defaults to the capitalized short name)
+    """
+
+    def __init__(self, key, name, label, columns, valid_filter, retention_days,
+                 min_records, latest_preserve, export_fields, export_name=None):
+        self.key = key
+        self.name = name
+        self.label = label
+        self.columns = list(columns)
+        self.valid_filter = valid_filter
+        self.retention_days = retention_days
+        self.min_records = min_records
+        self.latest_preserve = latest_preserve
+        self.export_fields = tuple(export_fields)
+        self.export_name = export_name or self.short_name.capitalize()
+        # Set once the migrated valid_row column is known to match valid_filter
+        self.has_valid_row = False
+
+        # output field -> SQL expression
+        self.fields = {field: field for field in KEY_FIELDS}
+        self.fields.update({field: column for column, field in self.columns})
+        unknown = [f for f in self.export_fields if f not in self.fields]
+        if unknown:
+            raise ValueError(f"Unknown export fields for {key}: {', '.join(unknown)}")
+
+    @property
+    def row_filter(self):
+        """Predicate used by live queries: the indexed valid_row flag when migrated, else valid_filter"""
+        return f"{VALID_ROW_COLUMN} = 1" if self.has_valid_row else self.valid_filter
+
+    @property
+    def short_name(self):
+        """'battery' for 'battery_data', as used by ?table= parameters"""
+        return self.key[:-len('_data')] if self.key.endswith('_data') else self.key
+
+    def select_list(self, fields=None):
+        """SELECT list for all fields or a subset (id and timestamp are always included)"""
+        if not fields:
+            selected = list(self.fields)
+        else:
+            unknown = [f for f in fields if f not in self.fields]
+            if unknown:
+                raise ValueError(f"Unknown fields for {self.key}: {', '.join(unknown)}")
+            selected = list(dict.fromkeys(KEY_FIELDS + tuple(fields)))
+        return ", ".join(
+            self.fields[f] if self.fields[f] == f else f"{self.fields[f]} AS {f}"
+            for f in selected
+        )
+
+
+# payload key -> TelemetryTable, in display order
+TABLE_REGISTRY = {}
+
+def register(table):
+    """Add a table to the registry; field names must be unique across tables"""
+    if table.key in TABLE_REGISTRY:
+        raise ValueError(f"Table {table.key} is already registered")
+    for other in TABLE_REGISTRY.values():
+        shared = (set(table.fields) & set(other.fields)) - set(KEY_FIELDS)
+        if shared:
+            raise ValueError(f"Fields of {table.key} already used by {other.key}: {', '.join(sorted(shared))}")
+    TABLE_REGISTRY[table.key] = table
+    return table
+
+
+register(TelemetryTable(
+    key='battery_data',
+    name='Battery Data Table',
+    label='Battery',
+    columns=[
+        ('Battery_Volt', 'battery_volt'),
+        ('Battery_Current', 'battery_current'),
+        ('Battery_Cell_Low_Volt', 'battery_cell_low_volt'),
+        ('Battery_Cell_High_Volt', 'battery_cell_high_volt'),
+        ('Battery_Cell_Average_Volt', 'battery_cell_average_volt'),
+        ('Battery_Cell_Low_Temp', 'battery_cell_low_temp'),
+        ('Battery_Cell_High_Temp', 'battery_cell_high_temp'),
+        ('Battery_Cell_Average_Temp', 'battery_cell_average_temp'),
+        ('Battery_Cell_High_Temp_ID', 'battery_cell_high_temp_ID'),
+        ('Battery_Cell_Low_Temp_ID', 'battery_cell_low_temp_ID'),
+    ],
+    valid_filter='Battery_Volt <> 0',
+    retention_days=BATTERY_RETENTION_DAYS,
+    min_records=1000,
+    latest_preserve=LATEST_BATTERY_PRESERVE,
+    export_fields=('battery_volt', 'battery_current')
+))
+
+register(TelemetryTable(
+    key='motor_data',
+    name='Motor Data Table',
+    label='Motor',
+    columns=[
+        ('Motor_Current', 'motor_current'),
+        ('Motor_Temp', 'motor_temp'),
+        ('Motor_Controller_Temp', 'motor_controller_temp'),
+    ],
+    valid_filter='Motor_Temp <> 0 OR Motor_Current <> 0',
+    retention_days=MOTOR_RETENTION_DAYS,
+    min_records=1000,
+    latest_preserve=LATEST_MOTOR_PRESERVE,
+    export_fields=('motor_current', 'motor_temp')
+))
+
+register(TelemetryTable(
+    key='mppt_data',
+    name='MPPT Data Table',
+    label='Solar (MPPT)',
+    columns=[
+        ('MPPT1_Watt', 'MPPT1_watt'),
+        ('MPPT2_Watt', 'MPPT2_watt'),
+        ('MPPT3_Watt', 'MPPT3_watt'),
+        ('MPPT_Total_Watt', 'MPPT_total_watt'),
+    ],
+    valid_filter='MPPT_Total_Watt <> 0',
+    retention_days=MPPT_RETENTION_DAYS,
+    min_records=1000,
+    latest_preserve=LATEST_MPPT_PRESERVE,
+    export_fields=('MPPT_total_watt', 'MPPT1_watt'),
+    export_name='MPPT'
+))
+
+register(TelemetryTable(
+    key='vehicle_data',
+    name='Vehicle Data Table',
+    label='Vehicle',
+    columns=[
+        ('Velocity', 'velocity'),
+        ('Distance_Travelled', 'distance_travelled'),
+    ],
+    valid_filter='Velocity <> 0',
+    retention_days=VEHICLE_RETENTION_DAYS,
+    min_records=500,
+    latest_preserve=LATEST_VEHICLE_PRESERVE,
+    export_fields=('velocity', 'distance_travelled')
+))
+
+
+# ----- lookups -----
+
+def get_table(key):
+    """Registry entry by payload key ('battery_data') or short name ('battery')"""
+    table = TABLE_REGISTRY.get(key) or TABLE_REGISTRY.get(f"{key}_data")
+    if table is None:
+        raise KeyError(f"Unknown telemetry table: {key}")
+    return table
+
+def table_by_name(name):
+    """Registry entry by MySQL table name, or None"""
+    for table in TABLE_REGISTRY.values():
+        if table.name == name:
+            return table
+    return None
+
+def table_label(name):
+    """Display name for a MySQL table name (the name itself if unregistered)"""
+    table = table_by_name(name)
+    return table.label if table else name
+
+def resolve_fields(fields):
+    """
+    Group requested field names by the table that owns them
+
+    Args:
+        fields (list): Field names such as ['battery_volt', 'velocity']
+
+    Returns:
+        dict: {payload key: tuple of fields}, in registry order
+
+    Raises:
+        ValueError: If a field belongs to no table
+    """
+    by_table = {}
+    unknown = []
+    for field in dict.fromkeys(fields):
+        if field in KEY_FIELDS:
+            continue
+        owner = next((t for t in TABLE_REGISTRY.values() if field in t.fields), None)
+        if owner is None:
+            unknown.append(field)
+        else:
+            by_table.setdefault(owner.key, []).append(field)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {key: tuple(by_table[key]) for key in TABLE_REGISTRY if key in by_table}
+
+def export_projection():
+    """{payload key: export fields} for CSV exports"""
+    return {key: table.export_fields for key, table in TABLE_REGISTRY.items()}
+
+def use_valid_row_flag(keys):
+    """Filter the given tables on the valid_row column (all others on valid_filter)"""
+    for key, table in TABLE_REGISTRY.items():
+        table.has_valid_row = key in keys
+    latest_statement.cache_clear()
+
+
+# ----- generated statements -----
+
+@lru_cache(maxsize=256)
+def latest_statement(key, fields=None):
+    """Newest valid rows of a table, optionally projected; takes LIMIT %s"""
+    table = TABLE_REGISTRY[key]
+    return (f"SELECT {table.select_list(fields)} FROM `{table.name}` "
+            f"WHERE {table.row_filter} ORDER BY id DESC LIMIT %s")
+
+@lru_cache(maxsize=None)
+def cleanup_statements(key):
+    """
+    Statements used by the retention cleanup of one table
+
+    'count_old' and the two DELETEs contain a `{preserve_ids}` slot for the
+    ids of the newest rows, filled in with str.format at run time.
+    """
+    name = TABLE_REGISTRY[key].name
+    return {
+        'count': f"SELECT COUNT(*) as count FROM `{name}`",
+        'latest_ids': f"SELECT id FROM `{name}` ORDER BY timestamp DESC LIMIT %s",
+        'count_old': (f"SELECT COUNT(*) as count FROM `{name}` "
+                      f"WHERE timestamp < %s AND id NOT IN ({{preserve_ids}})"),
+        'delete_old': (f"DELETE FROM `{name}` "
+                       f"WHERE timestamp < %s AND id NOT IN ({{preserve_ids}})"),
+        'delete_oldest': (f"DELETE FROM `{name}` WHERE id IN ("
+                          f"SELECT id FROM (SELECT id FROM `{name}` WHERE id NOT IN ({{preserve_ids}}) "
+                          f"ORDER BY timestamp ASC LIMIT %s) as temp)"),
+        'optimize': f"OPTIMIZE TABLE `{name}`"
+    }
@@ -1,16 +1,176 @@
 import time
+import logging
+from collections import deque
 from threading import Event
 from flask_socketio import SocketIO
 
 from backend.helpers import fetch_all_data
+from backend.compression import broadcast_telemetry
+from backend.derived_metrics import derived_metrics_engine
+from backend.rolling_stats import rolling_stats_engine
+from backend.alerts import alert_engine
+from backend.resume import sequence_ids
+from backend.leader import is_poller_leader, get_cluster_client_count
+from backend.shared_state import publish_engine_state
+from backend.db_executor import run_in_lane, LaneBusy, INTERACTIVE
+from backend.segment_log import schedule_replay
+from backend.config import (POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, POLL_DEFAULT_INTERVAL,
+                            CHANGE_CAPTURE_ENABLED, CHANGE_LOG_POLL_INTERVAL, SEGMENT_LOG_ENABLED)
 
+logger = logging.getLogger(__name__)
 
 thread_stop_event = Event()
 
-def background_data_fetcher(socketio: SocketIO):
+# How quickly the poll interval reacts to new data / idle tables
+SPEEDUP_FACTOR = 0.5
+BACKOFF_FACTOR = 1.5
+# Window (seconds) over which the effective poll and row rates are reported
+RATE_WINDOW_SECONDS = 60
+
+fetcher_stats = {
+    'state': 'stopped',
+    'mode': 'polling',
+    'interval': POLL_DEFAULT_INTERVAL,
+    'clients': 0,
+    'polls_per_minute': 0.0,
+    'rows_per_second': 0.0,
+    'last_poll': None
+}
+
+def get_fetcher_stats():
+    """Current state, interval and effective rates of the background fetcher"""
+    return dict(fetcher_stats)
+
+def _collect_new_rows(latest_data, last_ids):
+    """Rows newer than the last seen id per table (oldest first); advances last_ids"""
+    new_rows = {}
+    for key, rows in latest_data.items():
+        if not rows:
+            continue
+        previous = last_ids.get(key)
+        fresh = [row for row in rows if previous is None or row['id'] > previous]
+        if fresh:
+            new_rows[key] = sorted(fresh, key=lambda row: row['id'])
+        last_ids[key] = max(row['id'] for row in rows)
+    return new_rows
+
+def _next_interval(interval, new_rows, limit):
+    """Poll faster while rows are arriving, back off while the tables are idle"""
+    if new_rows >= limit:
+        # Window saturated, we are falling behind - go straight to the fastest rate
+        return POLL_MIN_INTERVAL
+    if new_rows > 0:
+        return max(POLL_MIN_INTERVAL, interval * SPEEDUP_FACTOR)
+    return min(POLL_MAX_INTERVAL, interval * BACKOFF_FACTOR)
+
+def _create_change_feed(limit):
+    """Return a ChangeFeed if change capture is enabled and installed, else None"""
+    if not CHANGE_CAPTURE_ENABLED:
+        return None
+
+    from backend.change_capture import ChangeFeed, change_capture_installed
+    if not change_capture_installed():
+        logger.warning("CHANGE_CAPTURE_ENABLED is set but triggers are not installed, falling back to polling")
+        return None
+
+    logger.info("Data fetcher using trigger-fed change log")
+    return ChangeFeed(window_size=limit)
+
+def background_data_fetcher(socketio: SocketIO, limit=20):
+    change_feed = _create_change_feed(limit)
+    fetcher_stats['mode'] = 'change_capture' if change_feed else 'polling'
+    interval = CHANGE_LOG_POLL_INTERVAL if change_feed else POLL_DEFAULT_INTERVAL
+    last_ids = {}
+    # (poll time, new rows) samples for effective rate reporting
+    samples = deque()
+    last_report = time.time()
+
     while not thread_stop_event.is_set():
-        time.sleep(2)
-        latest_data = fetch_all_data(limit=20)
-        if any(latest_data.values()):
-            socketio.emit("new_data", latest_data)
-#
\ No newline at end of file
+        if not is_poller_leader():
+            # Another worker polls and broadcasts through the message queue
+            if fetcher_stats['state'] != 'standby':
+                logger.info("Not the poller leader, data fetcher on standby")
+                fetcher_stats['state'] = 'standby'
+                last_ids.clear()
+                if change_feed:
+                    change_feed.reset()
+            socketio.sleep(1)
+            continue
+
+        clients = get_cluster_client_count()
+        fetcher_stats['clients'] = clients
+
+        if clients == 0:
+            # Nobody is watching - suspend DB polling until a client connects
+            if fetcher_stats['state'] != 'suspended':
+                logger.info("No clients connected, suspending data fetcher")
+                fetcher_stats['state'] = 'suspended'
+                # Push the first window immediately when a client returns
+                last_ids.clear()
+                if change_feed:
+                    change_feed.reset()
+                else:
+                    interval = POLL_DEFAULT_INTERVAL
+            socketio.sleep(1)
+            continue
+
+        if fetcher_stats['state'] != 'running':
+            logger.info(f"Data fetcher running for {clients} client(s)")
+            fetcher_stats['state'] = 'running'
+
+        socketio.sleep(interval)
+        if change_feed:
+            try:
+                latest_data, new_by_table = run_in_lane(INTERACTIVE, change_feed.poll)
+            except LaneBusy as e:
+                logger.warning(f"Skipping poll: {e}")
+                continue
+            except Exception as e:
+                logger.error(f"Change feed poll failed: {e}")
+                change_feed.reset()
+                continue
+        else:
+            try:
+                latest_data = run_in_lane(INTERACTIVE, fetch_all_data, limit=limit)
+            except LaneBusy as e:
+                logger.warning(f"Skipping poll: {e}")
+                continue
+            new_by_table = _collect_new_rows(latest_data, last_ids)
+
+        new_rows = sum(len(rows) for rows in new_by_table.values())
+        if SEGMENT_LOG_ENABLED:
+            # Rows buffered during an outage are written back once MySQL answers again
+            schedule_replay(socketio)
+        if not change_feed:
+            interval = _next_interval(interval, new_rows, limit)
+
+        if new_rows > 0:
+            # Per-table sequence ids let clients resume without gaps after a reconnect
+            broadcast_telemetry(socketio, "new_data", {**latest_data, 'seq': sequence_ids(latest_data)})
+            derived_metrics_engine.ingest(new_by_table)
+            rolling_stats_engine.ingest(new_by_table)
+        # Every poll, so a rules reload clears dropped alerts while no rows arrive
+        alert_engine.ingest(new_by_table, socketio)
+
+        derived_metrics_engine.publish_if_due(socketio)
+        # Followers serve /derived, /stats/rolling and /alerts from the published state
+        publish_engine_state()
+
+        now = time.time()
+        samples.append((now, new_rows))
+        while samples and samples[0][0] < now - RATE_WINDOW_SECONDS:
+            samples.popleft()
+
+        span = max(now - samples[0][0], interval) if samples else RATE_WINDOW_SECONDS
+        fetcher_stats['interval'] = interval
+        fetcher_stats['polls_per_minute'] = round(len(samples) * 60 / span, 1)
+        fetcher_stats['rows_per_second'] = round(sum(n for _, n in samples) / span, 2)
+        fetcher_stats['last_poll'] = now
+
+        if now - last_report >= RATE_WINDOW_SECONDS:
+            logger.info(f"Data fetcher: {fetcher_stats['polls_per_minute']} polls/min, "
+                        f"{fetcher_stats['rows_per_second']} rows/s, interval {interval:.2f}s, "
+                        f"{clients} client(s)")
+            last_report = now
+
+    fetcher_stats['state'] = 'stopped'
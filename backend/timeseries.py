@@ -0,0 +1,142 @@
+"""
+HUST Solar Car Time-Aligned Telemetry
+=====================================
+As-of join of the four telemetry tables onto a common time grid.
+
+Battery, motor, MPPT and vehicle rows have independent ids and timestamps.
+`iter_joined_chunks` reads a time range chunk by chunk (using the timestamp
+indexes), aligns every table onto a regular grid with a vectorized pandas
+as-of merge, and yields one DataFrame per chunk so long ranges can be
+streamed without holding the whole race in memory. Each chunk is loaded in
+the heavy DB lane on its own connection, so no pooled connection is held
+while the caller consumes a chunk.
+"""
+
+import logging
+from datetime import timedelta
+from backend.helpers import get_db_connection, TELEMETRY_TABLES
+from backend.db_executor import run_in_lane, HEAVY
+from backend.config import JOINED_CHUNK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Alignment methods: last value at or before the grid point, closest value, or time interpolation
+JOIN_METHODS = ('backward', 'nearest', 'interpolate')
+
+
+def _read_table(cursor, key, start, end):
+    """Read valid rows of one table in [start, end) as a DataFrame sorted by timestamp"""
+    import pandas as pd
+
+    table, columns, valid_filter = TELEMETRY_TABLES[key]
+    cursor.execute(
+        f"SELECT {columns} FROM `{table}` "
+        f"WHERE ({valid_filter}) AND timestamp >= %s AND timestamp < %s ORDER BY timestamp",
+        (start, end)
+    )
+    df = pd.DataFrame(cursor.fetchall())
+    if df.empty:
+        return df
+
+    df = df.drop(columns=['id'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    value_columns = [c for c in df.columns if c != 'timestamp']
+    df[value_columns] = df[value_columns].apply(pd.to_numeric, errors='coerce')
+    # Several rows per second are common; keep the last one per timestamp
+    return df.drop_duplicates('timestamp', keep='last').reset_index(drop=True)
+
+
+def _align(grid, df, tolerance, method):
+    """Align one table's rows onto the grid; returns a DataFrame indexed like grid"""
+    import pandas as pd
+
+    grid_df = pd.DataFrame({'timestamp': grid})
+    if df.empty:
+        return grid_df
+
+    if method != 'interpolate':
+        return pd.merge_asof(grid_df, df, on='timestamp', direction=method, tolerance=tolerance)
+
+    indexed = df.set_index('timestamp')
+    values = (indexed.reindex(indexed.index.union(grid))
+              .interpolate(method='time', limit_area='inside')
+              .reindex(grid))
+
+    # Do not interpolate across gaps: blank grid points with no sample within tolerance
+    nearest = pd.merge_asof(grid_df, pd.DataFrame({'timestamp': df['timestamp'], 'source': df['timestamp']}),
+                            on='timestamp', direction='nearest')
+    too_far = ((nearest['source'] - nearest['timestamp']).abs() > tolerance) | nearest['source'].isna()
+    values.loc[too_far.values, :] = float('nan')
+
+    values.index.name = 'timestamp'
+    return values.reset_index()
+
+
+def _load_chunk(grid, freq_delta, tolerance, method):
+    """Read and align every table for one chunk of the grid"""
+    import pandas as pd
+
+    # Read a tolerance margin on both sides so edge grid points have neighbours
+    read_start = (grid[0] - tolerance).to_pydatetime()
+    read_end = (grid[-1] + freq_delta + tolerance).to_pydatetime()
+
+    joined = pd.DataFrame({'timestamp': grid})
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            frames = [_read_table(cursor, key, read_start, read_end) for key in TELEMETRY_TABLES]
+    for df in frames:
+        joined = joined.merge(_align(grid, df, tolerance, method), on='timestamp', how='left')
+    return joined
+
+
+def iter_joined_chunks(start, end, freq='1s', tolerance='5s', method='backward', chunk_seconds=None):
+    """
+    Yield time-aligned DataFrames of all four tables for [start, end)
+
+    Args:
+        start, end (datetime): Time range
+        freq (str): Grid frequency (pandas offset alias, e.g. '1s', '500ms', '1min')
+        tolerance (str): Maximum distance between a grid point and the sample used for it
+        method (str): 'backward', 'nearest' or 'interpolate'
+        chunk_seconds (int): Length of each chunk read from MySQL
+
+    Yields:
+        pandas.DataFrame: One row per grid point with columns from every table
+
+    Raises:
+        LaneBusy: If the heavy lane refuses a chunk
+    """
+    import pandas as pd
+
+    if method not in JOIN_METHODS:
+        raise ValueError(f"method must be one of {', '.join(JOIN_METHODS)}")
+
+    tolerance = pd.Timedelta(tolerance)
+    freq_delta = pd.Timedelta(pd.tseries.frequencies.to_offset(freq))
+    if freq_delta <= pd.Timedelta(0):
+        raise ValueError("freq must be a positive fixed frequency")
+
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    # Every chunk's grid is start + k * freq, so chunk boundaries never shift the points
+    total_points = max(0, -(-(end - start) // freq_delta))
+    points_per_chunk = max(1, timedelta(seconds=chunk_seconds or JOINED_CHUNK_SECONDS) // freq_delta)
+
+    for first in range(0, total_points, points_per_chunk):
+        periods = min(points_per_chunk, total_points - first)
+        grid = pd.date_range(start + first * freq_delta, periods=periods, freq=freq_delta)
+        yield run_in_lane(HEAVY, _load_chunk, grid, freq_delta, tolerance, method)
+
+
+def join_telemetry(start, end, freq='1s', tolerance='5s', method='backward'):
+    """
+    Time-aligned DataFrame of all four tables for [start, end)
+
+    Convenience wrapper around iter_joined_chunks for analysis in pandas.
+    """
+    import pandas as pd
+
+    chunks = list(iter_joined_chunks(start, end, freq=freq, tolerance=tolerance, method=method))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
@@ -10,6 +10,7 @@ Usage:
     python cleanup_utility.py --stats
     python cleanup_utility.py --dry-run
     python cleanup_utility.py --execute
+    python cleanup_utility.py --execute --parallel 4
     python cleanup_utility.py --recommendations
 """
 
@@ -26,10 +27,13 @@ sys.path.append(str(Path(__file__).parent))
 try:
     from backend.database_cleanup import (
         run_cleanup,
+        estimate_cleanup,
         get_database_stats,
         get_cleanup_recommendations
     )
+    from backend.tables import table_label
     from backend.config import (
+        validate_config,
         BATTERY_RETENTION_DAYS,
         MOTOR_RETENTION_DAYS,
         MPPT_RETENTION_DAYS,
@@ -83,12 +87,7 @@ def print_stats(stats):
     print("-" * 40)
     
     for table_name, table_stats in stats['table_stats'].items():
-        display_name = {
-            'Battery Data Table': 'Battery',
-            'Motor Data Table': 'Motor', 
-            'MPPT Data Table': 'Solar (MPPT)',
-            'Vehicle Data Table': 'Vehicle'
-        }.get(table_name, table_name)
+        display_name = table_label(table_name)
         
         print(f"{display_name:<15} | {table_stats['total_records']:>8,} total | {table_stats['records_to_delete']:>8,} deletable | {table_stats['retention_days']:>2}d retention")
         
@@ -125,6 +124,12 @@ def print_recommendations(recommendations):
         print("✅ DATABASE HEALTHY")
         print(f"Only {total_deletable:,} old records available for cleanup.")
     
+    capacity = recommendations.get('capacity') or {}
+    if capacity and 'error' not in capacity:
+        print(f"Storage: {capacity['used_mb']} MB of {capacity['budget_mb']} MB budget ({capacity['used_percent']}%)")
+        if capacity['hours_to_full'] is not None:
+            print(f"Projected full in {capacity['hours_to_full']} hours ({capacity['projected_full_at']})")
+    
     print()
     
     # Urgent cleanup table analysis
@@ -132,12 +137,7 @@ def print_recommendations(recommendations):
         print("⚠️  TABLES NEEDING URGENT ATTENTION:")
         for table, analysis in recommendations['table_analysis'].items():
             if analysis['recommendation'] in ['cleanup_urgent', 'cleanup_recommended']:
-                display_name = {
-                    'Battery Data Table': 'Battery',
-                    'Motor Data Table': 'Motor',
-                    'MPPT Data Table': 'Solar',
-                    'Vehicle Data Table': 'Vehicle'
-                }.get(table, table)
+                display_name = table_label(table)
                 print(f"  • {display_name}: {analysis['record_count']:,} records ({analysis['deletable_count']:,} deletable)")
         print()
 
@@ -147,26 +147,29 @@ def print_cleanup_result(result):
         print(f"❌ Cleanup failed: {result['error']}")
         return
     
+    estimated = result.get('mode') == 'estimate'
     action = "WOULD DELETE" if result['dry_run'] else "DELETED"
-    print(f"✅ CLEANUP {'PREVIEW' if result['dry_run'] else 'COMPLETED'}")
+    print(f"✅ CLEANUP {'ESTIMATE' if estimated else 'PREVIEW' if result['dry_run'] else 'COMPLETED'}")
     print("-" * 40)
-    print(f"{action}: {result['total_deleted']:,} records")
+    print(f"{action}: {'~' if estimated else ''}{result['total_deleted']:,} records")
+    if estimated:
+        print(f"Confidence: {result['confidence']} (use --dry-run without --estimate for exact counts)")
     
     if not result['dry_run']:
         print(f"Duration: {result['duration']:.2f} seconds")
+    if result.get('parallel', 1) > 1:
+        print(f"Parallel: {result['parallel']} tables at a time")
     
     print()
     print("📋 TABLE BREAKDOWN:")
     
     for table_name, table_result in result['tables_processed'].items():
-        display_name = {
-            'Battery Data Table': 'Battery',
-            'Motor Data Table': 'Motor',
-            'MPPT Data Table': 'Solar (MPPT)',
-            'Vehicle Data Table': 'Vehicle'
-        }.get(table_name, table_name)
+        display_name = table_label(table_name)
         
-        print(f"  {display_name:<15} | {table_result['records_deleted']:>8,} records")
+        duration = table_result.get('duration')
+        timing = f" | {duration:>7.2f}s" if duration is not None else ""
+        confidence = f" | {table_result['confidence']}" if 'confidence' in table_result else ""
+        print(f"  {display_name:<15} | {table_result['records_deleted']:>8,} records{timing}{confidence}")
     
     print()
 
@@ -195,8 +198,10 @@ Examples:
   %(prog)s --stats                    # Show database statistics
   %(prog)s --recommendations         # Show cleanup recommendations  
   %(prog)s --dry-run                 # Preview what would be deleted
+  %(prog)s --dry-run --estimate      # Fast preview from index statistics
   %(prog)s --execute                 # Execute cleanup (with confirmation)
   %(prog)s --execute --force         # Execute cleanup without confirmation
+  %(prog)s --execute --parallel 4    # Clean all four tables concurrently
   %(prog)s --execute --force --quiet # Silent cleanup execution
         """
     )
@@ -207,8 +212,12 @@ Examples:
                        help='Show cleanup recommendations')
     parser.add_argument('--dry-run', action='store_true',
                        help='Show what would be deleted without deleting')
+    parser.add_argument('--estimate', action='store_true',
+                       help='With --dry-run: estimate from index statistics (fast, approximate)')
     parser.add_argument('--execute', action='store_true',
                        help='Execute actual cleanup')
+    parser.add_argument('--parallel', type=int, metavar='N',
+                       help='Clean up to N tables concurrently on separate connections')
     parser.add_argument('--force', action='store_true',
                        help='Skip confirmation prompts')
     parser.add_argument('--quiet', action='store_true',
@@ -227,6 +236,15 @@ Examples:
     if not args.quiet:
         print_banner()
     
+    if args.parallel is not None and args.parallel < 1:
+        parser.error('--parallel must be at least 1')
+    
+    try:
+        validate_config()
+    except ValueError as e:
+        print(f"❌ Configuration error: {e}")
+        return 1
+    
     # If no action specified, show help
     if not any([args.stats, args.recommendations, args.dry_run, args.execute]):
         parser.print_help()
@@ -280,7 +298,10 @@ Examples:
                 print()
             
             # Run cleanup
-            result = run_cleanup(dry_run=dry_run)
+            if dry_run and args.estimate:
+                result = estimate_cleanup()
+            else:
+                result = run_cleanup(dry_run=dry_run, parallel=args.parallel)
             
             if args.json:
                 print(json.dumps(result, indent=2, default=str))
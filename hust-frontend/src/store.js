@@ -2,6 +2,24 @@ import { defineStore } from "pinia";
 import { io } from "socket.io-client";
 import axios from "axios";
 
+// Row listeners (charts): called with ({ table: new rows oldest first }, reset) for live, resumed
+// and replayed rows; reset means the rows replace what was shown before.
+// Kept outside the state so Pinia does not make them reactive.
+const rowListeners = new Set();
+
+const TABLE_KEYS = ["battery_data", "motor_data", "mppt_data", "vehicle_data"];
+
+function notifyRows(rowsByTable, reset = false) {
+  if (!reset && !Object.values(rowsByTable).some(rows => rows.length)) return;
+  for (const listener of rowListeners) {
+    try {
+      listener(rowsByTable, reset);
+    } catch (error) {
+      console.error("Row listener failed:", error);
+    }
+  }
+}
+
 export const useTelemStore = defineStore("telem", {
   state: () => ({
     raw: { battery_data: [], motor_data: [], mppt_data: [], vehicle_data: [] },
@@ -13,7 +31,12 @@ export const useTelemStore = defineStore("telem", {
     retryCount: 0,
     maxRetries: 3,
     lastSuccessfulData: null, // Cache last successful data fetch
-    hasEverConnected: false   // Track if we've ever successfully connected
+    hasEverConnected: false,  // Track if we've ever successfully connected
+    serverAlerts: null,       // Alerts raised by the backend rule engine (null = not supported)
+    replay: null,             // Replay status while a historical replay is running
+    lastSeq: null,            // Newest id per table seen on the live stream (for resume)
+    replaySeq: null,          // Newest id per table seen in the running replay (null = live)
+    resetCharts: false        // Next live frame replaces the charts (after a replay)
   }),
   
   getters: {
@@ -66,6 +89,25 @@ export const useTelemStore = defineStore("telem", {
           this.connectionStatus = 'connected';
           this.retryCount = 0;
           this.error = null;
+
+          // A replay does not survive a reconnect (the server stops it on disconnect)
+          if (this.replaySeq) {
+            this.replay = null;
+            this.endReplay();
+          }
+
+          // Receive pre-compressed broadcasts when the browser can inflate them
+          if (typeof DecompressionStream !== 'undefined') {
+            this.socket.emit("set_compression", { enabled: true });
+          }
+
+          // Paced delivery: the server coalesces frames while this client is behind
+          this.socket.emit("set_flow_control", { enabled: true });
+
+          // Fetch exactly the rows missed while disconnected
+          if (this.lastSeq) {
+            this.socket.emit("resume", { last_ids: this.lastSeq }, (result) => this.applyResume(result));
+          }
         });
         
         this.socket.on("disconnect", (reason) => {
@@ -84,14 +126,43 @@ export const useTelemStore = defineStore("telem", {
           this.error = "Connection error";
         });
         
-        this.socket.on("new_data", (payload) => {
-          if (this.live && payload) {
-            this.raw = payload;
-            this.lastSuccessfulData = payload; // Cache successful WebSocket data
-            this.hasEverConnected = true;
-            this.lastFetch = Date.now();
-            this.error = null;
-            console.log("📊 Received new data:", this.totalDataPoints, "points");
+        // Frames were dropped while this client was behind: fetch the rows they carried
+        this.socket.on("frames_coalesced", () => {
+          if (this.lastSeq && !this.replaySeq) {
+            this.socket.emit("resume", { last_ids: this.lastSeq }, (result) => this.applyResume(result));
+          }
+        });
+
+        this.socket.on("new_data", (payload, ack) => {
+          this.applyLiveData(payload);
+          if (typeof ack === "function") ack();
+        });
+
+        // Server-side alert engine: full state on connect, then transitions only
+        this.socket.on("alerts_snapshot", (alerts) => {
+          this.serverAlerts = alerts || [];
+        });
+        this.socket.on("alert_raised", (alert) => {
+          this.serverAlerts = [...(this.serverAlerts || []).filter(a => a.id !== alert.id), alert];
+        });
+        this.socket.on("replay_status", (status) => {
+          this.replay = status;
+          // The server returns a finished replay to the live stream
+          if (status?.state === 'finished') this.endReplay();
+        });
+        this.socket.on("alert_cleared", (alert) => {
+          this.serverAlerts = (this.serverAlerts || []).filter(a => a.id !== alert.id);
+        });
+
+        this.socket.on("new_data_z", async (buffer, ack) => {
+          try {
+            const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream("deflate"));
+            const text = await new Response(stream).text();
+            this.applyLiveData(JSON.parse(text));
+          } catch (error) {
+            console.error("Failed to decompress telemetry:", error);
+          } finally {
+            if (typeof ack === "function") ack();
           }
         });
         
@@ -102,6 +173,125 @@ export const useTelemStore = defineStore("telem", {
       }
     },
     
+    onRows(listener) {
+      rowListeners.add(listener);
+      return () => rowListeners.delete(listener);
+    },
+    
+    applyLiveData(payload) {
+      if (!payload) return;
+      if (this.replaySeq) {
+        // Replay frames carry no seq; live frames still in flight are dropped
+        if (!payload.seq) this.applyReplayData(payload);
+        return;
+      }
+      if (this.resetCharts) {
+        // Back from a replay: the live window replaces the replayed rows
+        this.resetCharts = false;
+        const rows = {};
+        for (const key of TABLE_KEYS) {
+          rows[key] = (Array.isArray(payload[key]) ? payload[key] : []).slice().sort((a, b) => a.id - b.id);
+        }
+        notifyRows(rows, true);
+      }
+      // Rows newer than the last ones seen, so charts append each row exactly once
+      const fresh = {};
+      const seq = { ...this.lastSeq };
+      for (const key of TABLE_KEYS) {
+        const rows = Array.isArray(payload[key]) ? payload[key] : [];
+        const last = this.lastSeq?.[key];
+        fresh[key] = rows.filter(r => last == null || r.id > last).sort((a, b) => a.id - b.id);
+        const newest = payload.seq?.[key] ?? fresh[key].at(-1)?.id;
+        if (newest != null) seq[key] = Math.max(newest, last ?? newest);
+      }
+      this.lastSeq = seq;
+      notifyRows(fresh);
+
+      if (this.live && payload) {
+        this.raw = payload;
+        this.lastSuccessfulData = payload; // Cache successful WebSocket data
+        this.hasEverConnected = true;
+        this.lastFetch = Date.now();
+        this.error = null;
+        console.log("📊 Received new data:", this.totalDataPoints, "points");
+      }
+    },
+    
+    applyReplayData(payload) {
+      // Replayed rows are older than the live cursor, so they get their own; a seek back restarts it
+      const rows = {};
+      let reset = Object.keys(this.replaySeq).length === 0;
+      for (const key of TABLE_KEYS) {
+        rows[key] = (Array.isArray(payload[key]) ? payload[key] : []).slice().sort((a, b) => a.id - b.id);
+        const last = this.replaySeq[key];
+        const newest = rows[key].at(-1)?.id;
+        if (last != null && newest != null && newest < last) reset = true;
+      }
+      const fresh = {};
+      const seq = {};
+      for (const key of TABLE_KEYS) {
+        const last = this.replaySeq[key];
+        fresh[key] = reset ? rows[key] : rows[key].filter(r => last == null || r.id > last);
+        const newest = rows[key].at(-1)?.id ?? (reset ? undefined : last);
+        if (newest != null) seq[key] = newest;
+      }
+      this.replaySeq = seq;
+      notifyRows(fresh, reset);
+
+      if (this.live) {
+        this.raw = payload;
+        this.lastFetch = Date.now();
+      }
+    },
+
+    endReplay() {
+      // lastSeq was left untouched during the replay, so live frames and resume carry on from it
+      if (!this.replaySeq) return;
+      this.replaySeq = null;
+      this.resetCharts = true;
+    },
+
+    applyResume(result) {
+      if (!result || result.error) {
+        console.error("❌ Resume failed:", result?.error);
+        return;
+      }
+      // Keep every missed row: the next live window replaces raw anyway, and the
+      // charts receive the full set through the row listeners
+      const merged = { ...this.raw };
+      const missed = {};
+      for (const [key, rows] of Object.entries(result.rows)) {
+        if (!rows.length) continue;
+        const byId = new Map([...(merged[key] || []), ...rows].map(r => [r.id, r]));
+        merged[key] = [...byId.values()].sort((a, b) => b.id - a.id);
+        missed[key] = [...rows].sort((a, b) => a.id - b.id);
+      }
+      this.raw = merged;
+      this.lastSeq = { ...this.lastSeq, ...result.seq };
+      notifyRows(missed);
+      this.lastFetch = Date.now();
+      console.log("🔁 Resumed after reconnect:", result.downsampled);
+      if (result.reload?.length) this.reloadTables(result.reload);
+    },
+
+    async reloadTables(keys) {
+      // Too far behind to resume: start these tables over from the latest rows
+      console.log("🔁 Too far behind to resume, reloading:", keys);
+      try {
+        await this.refresh();
+      } catch (error) {
+        return;
+      }
+      const rows = {};
+      const seq = { ...this.lastSeq };
+      for (const key of keys) {
+        rows[key] = [...(this.raw[key] || [])].sort((a, b) => a.id - b.id);
+        if (rows[key].length) seq[key] = Math.max(rows[key].at(-1).id, seq[key] ?? 0);
+      }
+      this.lastSeq = seq;
+      notifyRows(rows, true);
+    },
+    
     async refresh(limit = 20) {
       this.loading = true;
       this.error = null;
@@ -157,6 +347,31 @@ export const useTelemStore = defineStore("telem", {
       await this.refresh();
     },
     
+    startReplay(from, to, speed = 1) {
+      return new Promise((resolve) => {
+        this.socket.emit("replay_start", { from, to, speed }, (result) => {
+          if (result?.success) this.replaySeq = {};
+          resolve(result);
+        });
+      });
+    },
+    
+    controlReplay(action, args = {}) {
+      return new Promise((resolve) => {
+        this.socket.emit("replay_control", { action, ...args }, resolve);
+      });
+    },
+    
+    stopReplay() {
+      return new Promise((resolve) => {
+        this.socket.emit("replay_stop", (result) => {
+          this.replay = null;
+          this.endReplay();
+          resolve(result);
+        });
+      });
+    },
+    
     disconnect() {
       if (this.socket) {
         this.socket.disconnect();